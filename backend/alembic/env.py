@@ -1,27 +1,31 @@
+import asyncio
 from logging.config import fileConfig
 
-from sqlalchemy import engine_from_config, pool
+from sqlalchemy import pool
+from sqlalchemy.engine import Connection
+from sqlalchemy.ext.asyncio import async_engine_from_config
 from sqlmodel import SQLModel
 
 from alembic import context
 from src.auth.models import *  # noqa: F403 # to import all tables automatically
 from src.config import settings
 from src.ferron.models import *  # noqa: F403 # to import all tables automatically
+from src.ferron.models import HOST_SEARCH_TABLE
 
 # this is the Alembic Config object, which provides
 # access to the values within the .ini file in use.
 config = context.config
 
 # specifying this here instead of alembic.ini because if in future I change my db url in env vars, I do not have to
-# change it in alembic.ini too
-database_url = settings.database_url
-database_url = database_url.replace("sqlite+aiosqlite://", "sqlite://")
-config.set_main_option("sqlalchemy.url", database_url)
+# change it in alembic.ini too. Migrations run through the same async driver as the app, so that no other driver is
+# needed for each database
+config.set_main_option("sqlalchemy.url", settings.database_url.replace("%", "%%"))
 
 # Interpret the config file for Python logging.
 # This line sets up loggers basically.
 if config.config_file_name is not None:
-    fileConfig(config.config_file_name)
+    # loggers of the app are created before migrations run on startup and must keep working
+    fileConfig(config.config_file_name, disable_existing_loggers=False)
 
 # add your model's MetaData object here
 # for 'autogenerate' support
@@ -29,6 +33,12 @@ if config.config_file_name is not None:
 # target_metadata = mymodel.Base.metadata
 target_metadata = SQLModel.metadata
 
+
+def include_name(name: str | None, type_: str, parent_names: dict[str, str | None]) -> bool:
+    # the host search table and the tables FTS5 creates for it aren't in the metadata, autogenerate would drop them
+    return not (type_ == "table" and name is not None and name.startswith(HOST_SEARCH_TABLE))
+
+
 # other values from the config, defined by the needs of env.py,
 # can be acquired:
 # my_important_option = config.get_main_option("my_important_option")
@@ -53,34 +63,47 @@ def run_migrations_offline() -> None:
         target_metadata=target_metadata,
         literal_binds=True,
         dialect_opts={"paramstyle": "named"},
+        include_name=include_name,
     )
 
     with context.begin_transaction():
         context.run_migrations()
 
 
-def run_migrations_online() -> None:
-    """Run migrations in 'online' mode.
+def do_run_migrations(connection: Connection) -> None:
+    context.configure(
+        connection=connection,
+        target_metadata=target_metadata,
+        render_as_batch=True,  # https://stackoverflow.com/a/32510603
+        include_name=include_name,
+    )
 
-    In this scenario we need to create an Engine
-    and associate a connection with the context.
+    with context.begin_transaction():
+        context.run_migrations()
 
-    """
-    connectable = engine_from_config(
+
+async def run_async_migrations() -> None:
+    connectable = async_engine_from_config(
         config.get_section(config.config_ini_section, {}),
         prefix="sqlalchemy.",
         poolclass=pool.NullPool,
     )
 
-    with connectable.connect() as connection:
-        context.configure(
-            connection=connection,
-            target_metadata=target_metadata,
-            render_as_batch=True,  # https://stackoverflow.com/a/32510603
-        )
+    async with connectable.connect() as connection:
+        await connection.run_sync(do_run_migrations)
+
+    await connectable.dispose()
+
+
+def run_migrations_online() -> None:
+    """Run migrations in 'online' mode.
 
-        with context.begin_transaction():
-            context.run_migrations()
+    In this scenario we need to create an Engine
+    and associate a connection with the context. It runs in an event loop of its own, so alembic commands must not
+    be called from a running one.
+
+    """
+    asyncio.run(run_async_migrations())
 
 
 if context.is_offline_mode():
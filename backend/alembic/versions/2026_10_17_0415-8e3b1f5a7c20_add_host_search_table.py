@@ -0,0 +1,192 @@
+"""add host search table
+
+Revision ID: 8e3b1f5a7c20
+Revises: c4d9bc698795
+Create Date: 2026-10-17 04:15:12.304118
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = "8e3b1f5a7c20"
+down_revision: Union[str, Sequence[str], None] = "c4d9bc698795"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# backends of a host, {id} is replaced with the expression of the virtual host id
+BACKENDS = """
+    trim(
+        coalesce((SELECT backend_url FROM ferron_reverse_proxy_config WHERE virtual_host_id = {id}), '') || ' ' ||
+        coalesce(
+            (SELECT group_concat(backend_url, ' ') FROM ferron_load_balancer_backend_url WHERE virtual_host_id = {id}),
+            ''
+        ) || ' ' ||
+        coalesce((SELECT static_files_dir FROM ferron_static_file_config WHERE virtual_host_id = {id}), '')
+    )
+"""
+# postgresql calls group_concat string_agg
+POSTGRESQL_BACKENDS = BACKENDS.replace("group_concat(", "string_agg(")
+
+# tables whose rows are part of the backends of a host, and the column of each which is indexed
+BACKEND_TABLES = {
+    "ferron_reverse_proxy_config": "backend_url",
+    "ferron_load_balancer_backend_url": "backend_url",
+    "ferron_static_file_config": "static_files_dir",
+}
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    if op.get_bind().dialect.name == "postgresql":
+        upgrade_postgresql()
+        return
+
+    # the trigram tokenizer indexes every 3 characters, so any substring of 3 or more characters can be searched for
+    op.execute("CREATE VIRTUAL TABLE ferron_host_search USING fts5(virtual_host_name, backends, tokenize='trigram')")
+    # matches in virtual host names rank higher than matches in backends
+    op.execute("INSERT INTO ferron_host_search (ferron_host_search, rank) VALUES ('rank', 'bm25(10.0, 1.0)')")
+    op.execute(
+        "INSERT INTO ferron_host_search (rowid, virtual_host_name, backends) "
+        f"SELECT id, virtual_host_name, {BACKENDS.format(id='ferron_virtual_host.id')} FROM ferron_virtual_host"
+    )
+
+    # tables with these triggers must not be recreated by batch migrations, which would drop the triggers
+    op.execute(
+        """
+        CREATE TRIGGER ferron_host_search_virtual_host_insert AFTER INSERT ON ferron_virtual_host BEGIN
+            INSERT INTO ferron_host_search (rowid, virtual_host_name, backends)
+            VALUES (new.id, new.virtual_host_name, '');
+        END
+        """
+    )
+    op.execute(
+        """
+        CREATE TRIGGER ferron_host_search_virtual_host_update AFTER UPDATE OF virtual_host_name ON ferron_virtual_host
+        BEGIN
+            UPDATE ferron_host_search SET virtual_host_name = new.virtual_host_name WHERE rowid = new.id;
+        END
+        """
+    )
+    op.execute(
+        """
+        CREATE TRIGGER ferron_host_search_virtual_host_delete AFTER DELETE ON ferron_virtual_host BEGIN
+            DELETE FROM ferron_host_search WHERE rowid = old.id;
+        END
+        """
+    )
+
+    for table, column in BACKEND_TABLES.items():
+        op.execute(
+            f"""
+            CREATE TRIGGER {table}_search_insert AFTER INSERT ON {table} BEGIN
+                UPDATE ferron_host_search SET backends = {BACKENDS.format(id="new.virtual_host_id")}
+                WHERE rowid = new.virtual_host_id;
+            END
+            """
+        )
+        # a row moved to another virtual host changes backends of both
+        op.execute(
+            f"""
+            CREATE TRIGGER {table}_search_update AFTER UPDATE OF {column}, virtual_host_id ON {table} BEGIN
+                UPDATE ferron_host_search SET backends = {BACKENDS.format(id="old.virtual_host_id")}
+                WHERE rowid = old.virtual_host_id AND old.virtual_host_id != new.virtual_host_id;
+                UPDATE ferron_host_search SET backends = {BACKENDS.format(id="new.virtual_host_id")}
+                WHERE rowid = new.virtual_host_id;
+            END
+            """
+        )
+        op.execute(
+            f"""
+            CREATE TRIGGER {table}_search_delete AFTER DELETE ON {table} BEGIN
+                UPDATE ferron_host_search SET backends = {BACKENDS.format(id="old.virtual_host_id")}
+                WHERE rowid = old.virtual_host_id;
+            END
+            """
+        )
+
+
+def upgrade_postgresql() -> None:
+    # a regular table, searched with ILIKE. Trigram indexes of pg_trgm make searching for any substring of 3 or more
+    # characters fast, without them every search reads the whole table
+    op.execute(
+        """
+        CREATE TABLE ferron_host_search (
+            rowid INTEGER PRIMARY KEY,
+            virtual_host_name TEXT NOT NULL,
+            backends TEXT NOT NULL DEFAULT ''
+        )
+        """
+    )
+    op.execute(
+        "INSERT INTO ferron_host_search (rowid, virtual_host_name, backends) "
+        f"SELECT id, virtual_host_name, {POSTGRESQL_BACKENDS.format(id='ferron_virtual_host.id')} "
+        "FROM ferron_virtual_host"
+    )
+
+    # pg_trgm ships with PostgreSQL but may not be installed along with it
+    has_pg_trgm = op.get_bind().exec_driver_sql("SELECT 1 FROM pg_available_extensions WHERE name = 'pg_trgm'")
+    if has_pg_trgm.first() is not None:
+        op.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+        for column in ["virtual_host_name", "backends"]:
+            op.execute(
+                f"CREATE INDEX ix_ferron_host_search_{column} ON ferron_host_search USING gin ({column} gin_trgm_ops)"
+            )
+
+    op.execute(
+        """
+        CREATE FUNCTION ferron_host_search_virtual_host() RETURNS trigger AS $$
+        BEGIN
+            IF TG_OP = 'INSERT' THEN
+                INSERT INTO ferron_host_search (rowid, virtual_host_name) VALUES (NEW.id, NEW.virtual_host_name);
+            ELSIF TG_OP = 'UPDATE' THEN
+                UPDATE ferron_host_search SET virtual_host_name = NEW.virtual_host_name WHERE rowid = NEW.id;
+            ELSE
+                DELETE FROM ferron_host_search WHERE rowid = OLD.id;
+            END IF;
+            RETURN NULL;
+        END
+        $$ LANGUAGE plpgsql
+        """
+    )
+    op.execute(
+        """
+        CREATE TRIGGER ferron_host_search_virtual_host
+        AFTER INSERT OR UPDATE OF virtual_host_name OR DELETE ON ferron_virtual_host
+        FOR EACH ROW EXECUTE FUNCTION ferron_host_search_virtual_host()
+        """
+    )
+
+    # a row moved to another virtual host changes backends of both
+    op.execute(
+        f"""
+        CREATE FUNCTION ferron_host_search_backends() RETURNS trigger AS $$
+        BEGIN
+            IF TG_OP IN ('UPDATE', 'DELETE') THEN
+                UPDATE ferron_host_search SET backends = {POSTGRESQL_BACKENDS.format(id="OLD.virtual_host_id")}
+                WHERE rowid = OLD.virtual_host_id;
+            END IF;
+            IF TG_OP IN ('INSERT', 'UPDATE') THEN
+                UPDATE ferron_host_search SET backends = {POSTGRESQL_BACKENDS.format(id="NEW.virtual_host_id")}
+                WHERE rowid = NEW.virtual_host_id;
+            END IF;
+            RETURN NULL;
+        END
+        $$ LANGUAGE plpgsql
+        """
+    )
+    for table, column in BACKEND_TABLES.items():
+        op.execute(
+            f"""
+            CREATE TRIGGER {table}_search
+            AFTER INSERT OR UPDATE OF {column}, virtual_host_id OR DELETE ON {table}
+            FOR EACH ROW EXECUTE FUNCTION ferron_host_search_backends()
+            """
+        )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    raise RuntimeError("Downgrades are not supported. Restore from backup.")
@@ -0,0 +1,69 @@
+import json
+import os
+import platform
+import statistics
+import subprocess
+from datetime import datetime, timezone
+from typing import Any
+
+# settings are read when `src` is imported, so this module has to be imported before it. Benchmarks don't need a
+# ferron container and use databases of their own
+os.environ.setdefault("DATABASE_URL", "sqlite+aiosqlite:///:memory:")
+os.environ.setdefault("DATABASE_ECHO", "false")
+os.environ.setdefault("FERRON_CONTAINER_NAME", "ferron")
+os.environ.setdefault("AUTH_SECRET_KEY", "benchmark")
+os.environ.setdefault("AUTH_REFRESH_SECRET_KEY", "benchmark")
+os.environ.setdefault("AUTH_SIGNUP_DISABLED", "true")
+
+
+def summarize(latencies: list[float]) -> dict[str, float]:
+    """
+    latency percentiles in milliseconds
+    """
+    latencies_ms = sorted(latency * 1000 for latency in latencies)
+    if len(latencies_ms) == 1:
+        quantiles = latencies_ms * 99
+    else:
+        quantiles = statistics.quantiles(latencies_ms, n=100, method="inclusive")
+
+    return {
+        "count": len(latencies_ms),
+        "mean_ms": statistics.fmean(latencies_ms),
+        "p50_ms": quantiles[49],
+        "p90_ms": quantiles[89],
+        "p99_ms": quantiles[98],
+        "max_ms": latencies_ms[-1],
+    }
+
+
+def git_commit() -> str | None:
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def create_report(benchmark: str, **fields: Any) -> dict[str, Any]:
+    """
+    results of a benchmark along with what they were measured on, so that runs can be compared between commits
+    """
+    return {
+        "benchmark": benchmark,
+        "commit": git_commit(),
+        "created_at": datetime.now(timezone.utc).isoformat(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        **fields,
+    }
+
+
+def write_report(report: dict[str, Any], output: str | None) -> None:
+    """
+    writes `report` as JSON to `output`, or to stdout if it's None
+    """
+    text = json.dumps(report, indent=2)
+    if output:
+        with open(output, "w") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
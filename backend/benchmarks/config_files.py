@@ -0,0 +1,227 @@
+"""
+Benchmarks rendering host configs and writing them to config files.
+
+Synthetic reverse proxy, load balancer and static file hosts are generated in equal shares for every corpus size,
+and the following are measured for each size:
+
+- render: throughput of `render_template()` over the whole corpus
+- write: latency of rendering a host and `write_*_config_to_file()` updating it, with every other host of the corpus
+  already on disk
+- main_config_growth: latency of rendering a new host and `write_*_config_to_file()` adding it, which also adds an
+  include to main.kdl, along with the size of main.kdl
+
+Config files are written to a temporary directory, on tmpfs (/dev/shm) when it is available so that the disk doesn't
+dominate the results. Results are written as JSON so that they can be compared between commits.
+
+Run from the backend directory:
+
+    python -m benchmarks.config_files --sizes 100 10000 100000 --output benchmark.json
+"""
+
+import argparse
+import asyncio
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+from collections.abc import Awaitable, Callable
+from typing import Any
+from unittest import mock
+
+# imported before `src`, it sets up the environment settings are read from
+from benchmarks.common import create_report, summarize, write_report
+from src.ferron import utils
+from src.ferron.constants import HOST_TEMPLATE_TYPES, ConfigLayoutType, HostType
+from src.ferron.layout import get_layout
+from src.ferron.registry import IncludeRegistry
+from src.ferron.schemas import UpdateLoadBalancerConfig, UpdateReverseProxyConfig, UpdateStaticFileConfig
+from src.ferron.utils import HostTemplateConfig, load_templates, render_template, render_template_sync
+from src.ferron.writer import ConfigWriter
+
+DEFAULT_SIZES = [100, 10_000, 100_000]
+
+_WRITE_FUNCTIONS: dict[HostType, Callable[[int, str], Awaitable[bool]]] = {
+    HostType.REVERSE_PROXY: utils.write_reverse_proxy_config_to_file,
+    HostType.LOAD_BALANCER: utils.write_load_balancer_config_to_file,
+    HostType.STATIC_FILE: utils.write_static_file_config_to_file,
+}
+
+
+def generate_host(host_type: HostType, host_id: int, rng: random.Random) -> HostTemplateConfig:
+    virtual_host_name = f"host-{host_id}.{host_type.value.replace('_', '-')}.example.com"
+    cache = rng.random() < 0.5
+
+    match host_type:
+        case HostType.REVERSE_PROXY:
+            return UpdateReverseProxyConfig(
+                id=host_id,
+                virtual_host_name=virtual_host_name,
+                backend_url=f"http://backend-{host_id}:{rng.randint(1024, 65535)}",
+                preserve_host_header=rng.random() < 0.5,
+                cache=cache,
+            )
+        case HostType.LOAD_BALANCER:
+            return UpdateLoadBalancerConfig(
+                id=host_id,
+                virtual_host_name=virtual_host_name,
+                backend_urls=[f"http://backend-{host_id}-{i}:8080" for i in range(rng.randint(2, 5))],
+                lb_health_check=rng.random() < 0.5,
+                cache=cache,
+            )
+        case HostType.STATIC_FILE:
+            return UpdateStaticFileConfig(
+                id=host_id,
+                virtual_host_name=virtual_host_name,
+                static_files_dir=f"/srv/www/{host_id}",
+                use_spa=rng.random() < 0.5,
+                directory_listing=rng.random() < 0.5,
+                cache=cache,
+            )
+
+
+def generate_corpus(size: int, seed: int = 0) -> list[tuple[HostType, HostTemplateConfig]]:
+    """
+    `size` hosts split equally between host types, the same seed always gives the same corpus
+    """
+    rng = random.Random(seed)
+    host_types = list(HostType)
+    return [
+        (host_types[i % len(host_types)], generate_host(host_types[i % len(host_types)], i + 1, rng))
+        for i in range(size)
+    ]
+
+
+async def benchmark_render(corpus: list[tuple[HostType, HostTemplateConfig]]) -> dict[str, Any]:
+    start_time = time.perf_counter()
+    for host_type, host_config in corpus:
+        await render_template(HOST_TEMPLATE_TYPES[host_type], host_config)
+    seconds = time.perf_counter() - start_time
+
+    return {"hosts": len(corpus), "seconds": seconds, "hosts_per_second": len(corpus) / seconds}
+
+
+async def benchmark_writes(
+    corpus: list[tuple[HostType, HostTemplateConfig]], root: str, layout_type: ConfigLayoutType, samples: int
+) -> dict[str, Any]:
+    registry = IncludeRegistry(os.path.join(root, "main.kdl"))
+    writer = ConfigWriter(
+        registry,
+        get_layout(layout_type, shard_count=16),
+        root,
+        max_queue_size=1000,
+        max_batch_size=100,
+    )
+    await writer.load()
+    writer.start()
+
+    rng = random.Random(1)
+    try:
+        # `write_*_config_to_file()` write through the module's writer, which is pointed at the temporary root
+        with mock.patch.object(utils, "config_writer", writer):
+            # every host of the corpus but the ones added below is written at once, the way reconciling does
+            added_hosts = corpus[-samples:]
+            existing_hosts = corpus[: len(corpus) - len(added_hosts)]
+
+            start_time = time.perf_counter()
+            await writer.replace_host_configs(
+                {
+                    (host_type, host_config.id): render_template_sync(HOST_TEMPLATE_TYPES[host_type], host_config)
+                    for host_type, host_config in existing_hosts
+                },
+                [],
+            )
+            initial_write_seconds = time.perf_counter() - start_time
+
+            # updates change a host's config without changing includes of main.kdl
+            update_latencies = []
+            for host_type, host_config in rng.sample(existing_hosts, min(samples, len(existing_hosts))):
+                updated_config = host_config.model_copy(update={"cache": not host_config.cache})
+                start_time = time.perf_counter()
+                await _WRITE_FUNCTIONS[host_type](
+                    updated_config.id, utils.render_host_config(host_type, updated_config)
+                )
+                update_latencies.append(time.perf_counter() - start_time)
+
+            # new hosts are included in main.kdl, which is rewritten with every include already in it
+            main_config_size_before = len(registry.render().encode())
+            add_latencies = []
+            for host_type, host_config in added_hosts:
+                start_time = time.perf_counter()
+                await _WRITE_FUNCTIONS[host_type](host_config.id, utils.render_host_config(host_type, host_config))
+                add_latencies.append(time.perf_counter() - start_time)
+    finally:
+        await writer.stop()
+
+    return {
+        "initial_write_seconds": initial_write_seconds,
+        "write": summarize(update_latencies),
+        "main_config_growth": {
+            **summarize(add_latencies),
+            "includes": len(registry),
+            "main_config_bytes_before": main_config_size_before,
+            "main_config_bytes": len(registry.render().encode()),
+            "files": len(os.listdir(root)),
+        },
+    }
+
+
+def default_root_parent() -> str | None:
+    # tmpfs keeps disk latency out of the results
+    return "/dev/shm" if os.path.isdir("/dev/shm") else None
+
+
+async def run(sizes: list[int], layout_type: ConfigLayoutType, samples: int, root_parent: str | None) -> dict[str, Any]:
+    # templates are compiled up front so that compiling them isn't measured as rendering
+    load_templates()
+
+    results = []
+    for size in sizes:
+        corpus = generate_corpus(size)
+
+        root = tempfile.mkdtemp(prefix="ferron-benchmark-", dir=root_parent)
+        try:
+            render_result = await benchmark_render(corpus)
+            write_result = await benchmark_writes(corpus, root, layout_type, min(samples, size // 2))
+        finally:
+            shutil.rmtree(root, ignore_errors=True)
+
+        results.append({"size": size, "render": render_result, **write_result})
+        print(
+            f"{size} hosts: {render_result['hosts_per_second']:.0f} renders/s, "
+            f"update p50 {write_result['write']['p50_ms']:.2f} ms, "
+            f"add p50 {write_result['main_config_growth']['p50_ms']:.2f} ms",
+            file=sys.stderr,
+        )
+
+    return create_report(
+        "config_files",
+        layout=layout_type.value,
+        root=root_parent or tempfile.gettempdir(),
+        results=results,
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Benchmark rendering and writing host config files")
+    parser.add_argument("--sizes", type=int, nargs="+", default=DEFAULT_SIZES, help="numbers of hosts to benchmark")
+    parser.add_argument(
+        "--layout",
+        choices=[layout_type.value for layout_type in ConfigLayoutType],
+        default=ConfigLayoutType.PER_HOST.value,
+    )
+    parser.add_argument("--samples", type=int, default=200, help="number of timed writes for each size")
+    parser.add_argument(
+        "--root", default=default_root_parent(), help="directory to create temporary config roots in (default: tmpfs)"
+    )
+    parser.add_argument("--output", help="file to write JSON results to (default: stdout)")
+    args = parser.parse_args()
+
+    report = asyncio.run(run(args.sizes, ConfigLayoutType(args.layout), args.samples, args.root))
+
+    write_report(report, args.output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,180 @@
+"""
+Benchmarks the endpoints listing every host config of a type, against the ORM path they used to take.
+
+A temporary SQLite database is migrated to head and filled with synthetic reverse proxy, load balancer and static
+file hosts. For every host type, whole responses of the following are requested through the ASGI app:
+
+- orm: `selectinload()` of SQLModel objects, `model_validate(..., from_attributes=True)` of every row and FastAPI's
+  validation and serialization of the response model, the way /configs/*/all used to work
+- core: /configs/*/all as they are now, one Core query of the needed columns serialized as it is read
+
+and for both the following are reported:
+
+- latency and rows_per_second of whole requests
+- peak_memory_bytes: peak of memory allocated by Python while answering a request, measured by tracemalloc in a
+  request of its own since tracing slows requests down
+
+Run from the backend directory:
+
+    python -m benchmarks.config_lists --hosts 50000 --output benchmark.json
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+from collections.abc import AsyncGenerator
+from typing import Annotated, Any
+
+import httpx
+from fastapi import Depends, FastAPI
+from sqlalchemy import Select, event, select
+from sqlalchemy.ext.asyncio import create_async_engine
+from sqlalchemy.orm import selectinload
+from sqlmodel import SQLModel
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+# imported before `src`, it sets up the environment settings are read from
+from benchmarks.common import create_report, summarize, write_report
+from benchmarks.database_indexes import BACKENDS_PER_LOAD_BALANCER, migrate, seed
+from src.auth.dependencies import get_current_user
+from src.database import get_session, set_sqlite_pragma
+from src.ferron import models, schemas
+from src.ferron.constants import HostType
+from src.ferron.router import router
+
+_PATHS = {
+    HostType.REVERSE_PROXY: "reverse-proxy",
+    HostType.LOAD_BALANCER: "load-balancer",
+    HostType.STATIC_FILE: "static-file",
+}
+
+
+def create_app(database_path: str) -> FastAPI:
+    engine = create_async_engine(f"sqlite+aiosqlite:///{database_path}")
+    event.listen(engine.sync_engine, "connect", set_sqlite_pragma)
+
+    async def get_benchmark_session() -> AsyncGenerator[AsyncSession, None]:
+        async with AsyncSession(engine) as session:
+            yield session
+
+    app = FastAPI()
+    app.include_router(router, prefix="/api")
+    app.dependency_overrides[get_session] = get_benchmark_session
+    app.dependency_overrides[get_current_user] = lambda: None
+
+    @app.get("/orm/reverse-proxy")
+    async def read_all_reverse_proxy_config_orm(
+        session: Annotated[AsyncSession, Depends(get_session)],
+    ) -> list[schemas.UpdateReverseProxyConfig]:
+        statement = select_with_virtual_host(models.ReverseProxyConfig)
+        configs = (await session.exec(statement)).scalars().all()
+        return [schemas.UpdateReverseProxyConfig.model_validate(config, from_attributes=True) for config in configs]
+
+    @app.get("/orm/load-balancer")
+    async def read_all_load_balancer_config_orm(
+        session: Annotated[AsyncSession, Depends(get_session)],
+    ) -> list[schemas.UpdateLoadBalancerConfig]:
+        statement = select_with_virtual_host(models.LoadBalancerConfig).options(
+            selectinload(models.LoadBalancerConfig.backend_urls_relationship)
+        )
+        configs = (await session.exec(statement)).scalars().all()
+        return [schemas.UpdateLoadBalancerConfig.model_validate(config, from_attributes=True) for config in configs]
+
+    @app.get("/orm/static-file")
+    async def read_all_static_file_config_orm(
+        session: Annotated[AsyncSession, Depends(get_session)],
+    ) -> list[schemas.UpdateStaticFileConfig]:
+        statement = select_with_virtual_host(models.StaticFileConfig)
+        configs = (await session.exec(statement)).scalars().all()
+        return [schemas.UpdateStaticFileConfig.model_validate(config, from_attributes=True) for config in configs]
+
+    app.state.engine = engine
+    return app
+
+
+def select_with_virtual_host(model: type[SQLModel]) -> Select:
+    return select(model).options(selectinload(model.virtual_host))
+
+
+async def measure(client: httpx.AsyncClient, url: str, repeats: int) -> tuple[dict[str, Any], bytes]:
+    latencies = []
+    for _ in range(repeats):
+        start_time = time.perf_counter()
+        response = await client.get(url)
+        latencies.append(time.perf_counter() - start_time)
+        response.raise_for_status()
+
+    tracemalloc.start()
+    try:
+        tracemalloc.reset_peak()
+        response = await client.get(url)
+        _, peak_memory = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    rows = len(response.json())
+    latency = summarize(latencies)
+    return {
+        **latency,
+        "rows": rows,
+        "rows_per_second": rows / (latency["p50_ms"] / 1000),
+        "peak_memory_bytes": peak_memory,
+    }, response.content
+
+
+async def run(hosts: int, repeats: int) -> dict[str, Any]:
+    directory = tempfile.mkdtemp(prefix="ferron-benchmark-")
+    database_path = os.path.join(directory, "benchmark.db")
+    try:
+        await asyncio.to_thread(migrate, database_path, "head")
+        seed(database_path, hosts)
+
+        app = create_app(database_path)
+        results: dict[str, Any] = {}
+        try:
+            async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as client:
+                for host_type, path in _PATHS.items():
+                    orm, orm_body = await measure(client, f"/orm/{path}", repeats)
+                    core, core_body = await measure(client, f"/api/configs/{path}/all", repeats)
+                    results[host_type.value] = {
+                        "orm": orm,
+                        "core": core,
+                        "identical_responses": json.loads(orm_body) == json.loads(core_body),
+                    }
+                    print(
+                        f"{host_type.value}: {orm['rows_per_second']:.0f} -> {core['rows_per_second']:.0f} rows/s, "
+                        f"peak memory {orm['peak_memory_bytes'] / 2**20:.1f} -> "
+                        f"{core['peak_memory_bytes'] / 2**20:.1f} MiB",
+                        file=sys.stderr,
+                    )
+        finally:
+            await app.state.engine.dispose()
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+    return create_report(
+        "config_lists",
+        hosts=hosts,
+        backends_per_load_balancer=BACKENDS_PER_LOAD_BALANCER,
+        results=results,
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Benchmark listing host configs through the ORM and Core paths")
+    parser.add_argument("--hosts", type=int, default=50_000, help="number of hosts in the database")
+    parser.add_argument("--repeats", type=int, default=5, help="number of timed requests of every list")
+    parser.add_argument("--output", help="file to write JSON results to (default: stdout)")
+    args = parser.parse_args()
+
+    write_report(asyncio.run(run(args.hosts, args.repeats)), args.output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,205 @@
+"""
+Benchmarks reading and deleting hosts before and after the foreign key and lookup indexes migration.
+
+A temporary SQLite database is migrated to head, filled with synthetic reverse proxy, load balancer and static file
+hosts, and measured with the indexes added by the migration dropped. They are then created again and the same rows are
+measured again, so the difference is down to the indexes alone. For every host type it measures:
+
+- read_all: latency of `read_all_*_config()`
+- delete: latency of deleting a host along with everything cascading from it and committing
+
+Run from the backend directory:
+
+    python -m benchmarks.database_indexes --hosts 50000 --output benchmark.json
+"""
+
+import argparse
+import asyncio
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+from collections.abc import Awaitable, Callable
+from typing import Any
+
+from alembic.config import Config
+from sqlalchemy import Connection, create_engine, event, insert
+from sqlalchemy.ext.asyncio import AsyncEngine, create_async_engine
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from alembic import command
+
+# imported before `src`, it sets up the environment settings are read from
+from benchmarks.common import create_report, summarize, write_report
+from src.config import settings
+from src.database import set_sqlite_pragma
+from src.ferron import models, service
+from src.ferron.constants import HostType
+
+BACKENDS_PER_LOAD_BALANCER = 3
+# indexes of host tables added by migration c4d9bc698795. The rest of the schema has to be at head, since deleting a
+# host records it in tables added later
+_MIGRATION_INDEXES = [
+    index
+    for model in (
+        models.ReverseProxyConfig,
+        models.LoadBalancerConfig,
+        models.StaticFileConfig,
+        models.LoadBalancerBackendURL,
+    )
+    for index in model.__table__.indexes
+    if index.name
+    in {
+        "ix_ferron_reverse_proxy_config_virtual_host_id",
+        "ix_ferron_load_balancer_config_virtual_host_id",
+        "ix_ferron_static_file_config_virtual_host_id",
+        "ix_ferron_load_balancer_backend_url_virtual_host_id",
+        "ix_ferron_load_balancer_backend_url_used_in_load_balancer",
+    }
+]
+
+_READ_ALL_FUNCTIONS: dict[HostType, Callable[[AsyncSession], Awaitable[list[Any]]]] = {
+    HostType.REVERSE_PROXY: service.read_all_reverse_proxy_config,
+    HostType.LOAD_BALANCER: service.read_all_load_balancer_config,
+    HostType.STATIC_FILE: service.read_all_static_file_config,
+}
+_DELETE_FUNCTIONS: dict[HostType, Callable[[int, AsyncSession], Awaitable[Any]]] = {
+    HostType.REVERSE_PROXY: service._delete_reverse_proxy_config_record,
+    HostType.LOAD_BALANCER: service._delete_load_balancer_config_record,
+    HostType.STATIC_FILE: service._delete_static_file_config_record,
+}
+
+
+def migrate(database_path: str, revision: str) -> None:
+    # alembic's env reads the database url from settings. It migrates in an event loop of its own, so this is called
+    # in a thread from async code
+    settings.database_url = f"sqlite+aiosqlite:///{database_path}"
+    command.upgrade(Config("alembic.ini"), revision)
+
+
+def drop_indexes(connection: Connection) -> None:
+    for index in _MIGRATION_INDEXES:
+        index.drop(connection)
+
+
+def create_indexes(connection: Connection) -> None:
+    for index in _MIGRATION_INDEXES:
+        index.create(connection)
+
+
+def seed(database_path: str, hosts: int) -> dict[HostType, list[int]]:
+    """
+    inserts `hosts` hosts split equally between host types. Returns ids of the configs of each host type
+    """
+    engine = create_engine(f"sqlite:///{database_path}")
+    host_types = list(HostType)
+
+    virtual_hosts = [{"id": i + 1, "virtual_host_name": f"host-{i + 1}.example.com"} for i in range(hosts)]
+    configs: dict[HostType, list[dict[str, Any]]] = {host_type: [] for host_type in host_types}
+    for virtual_host in virtual_hosts:
+        host_type = host_types[virtual_host["id"] % len(host_types)]
+        config = {"id": len(configs[host_type]) + 1, "virtual_host_id": virtual_host["id"], "cache": False}
+        match host_type:
+            case HostType.REVERSE_PROXY:
+                config["backend_url"] = f"http://backend-{virtual_host['id']}:8080/"
+            case HostType.STATIC_FILE:
+                config["static_files_dir"] = f"/srv/www/{virtual_host['id']}"
+        configs[host_type].append(config)
+
+    backend_urls = [
+        {
+            "virtual_host_id": config["virtual_host_id"],
+            "used_in_load_balancer": config["id"],
+            "backend_url": f"http://backend-{config['virtual_host_id']}-{i}:8080/",
+        }
+        for config in configs[HostType.LOAD_BALANCER]
+        for i in range(BACKENDS_PER_LOAD_BALANCER)
+    ]
+
+    with engine.begin() as connection:
+        connection.execute(insert(models.VirtualHost), virtual_hosts)
+        connection.execute(insert(models.ReverseProxyConfig), configs[HostType.REVERSE_PROXY])
+        connection.execute(insert(models.LoadBalancerConfig), configs[HostType.LOAD_BALANCER])
+        connection.execute(insert(models.StaticFileConfig), configs[HostType.STATIC_FILE])
+        connection.execute(insert(models.LoadBalancerBackendURL), backend_urls)
+    engine.dispose()
+
+    return {host_type: [config["id"] for config in configs[host_type]] for host_type in host_types}
+
+
+async def measure(engine: AsyncEngine, deleted_ids: dict[HostType, list[int]], repeats: int) -> dict[str, Any]:
+    results: dict[str, Any] = {}
+    for host_type in HostType:
+        read_all_latencies = []
+        for _ in range(repeats):
+            async with AsyncSession(engine) as session:
+                start_time = time.perf_counter()
+                await _READ_ALL_FUNCTIONS[host_type](session)
+                read_all_latencies.append(time.perf_counter() - start_time)
+
+        delete_latencies = []
+        for config_id in deleted_ids[host_type]:
+            async with AsyncSession(engine) as session:
+                start_time = time.perf_counter()
+                await _DELETE_FUNCTIONS[host_type](config_id, session)
+                await session.commit()
+                delete_latencies.append(time.perf_counter() - start_time)
+
+        results[host_type.value] = {"read_all": summarize(read_all_latencies), "delete": summarize(delete_latencies)}
+
+    return results
+
+
+async def run(hosts: int, deletes: int, repeats: int) -> dict[str, Any]:
+    directory = tempfile.mkdtemp(prefix="ferron-benchmark-")
+    database_path = os.path.join(directory, "benchmark.db")
+    try:
+        await asyncio.to_thread(migrate, database_path, "head")
+        config_ids = seed(database_path, hosts)
+
+        # hosts deleted before and after the migration are different ones, picked the same way
+        rng = random.Random(0)
+        picked_ids = {host_type: rng.sample(ids, min(2 * deletes, len(ids))) for host_type, ids in config_ids.items()}
+
+        engine = create_async_engine(f"sqlite+aiosqlite:///{database_path}")
+        event.listen(engine.sync_engine, "connect", set_sqlite_pragma)
+        try:
+            async with engine.begin() as connection:
+                await connection.run_sync(drop_indexes)
+
+            before = await measure(engine, {host_type: ids[::2] for host_type, ids in picked_ids.items()}, repeats)
+            print("measured without indexes", file=sys.stderr)
+
+            async with engine.begin() as connection:
+                await connection.run_sync(create_indexes)
+
+            after = await measure(engine, {host_type: ids[1::2] for host_type, ids in picked_ids.items()}, repeats)
+            print("measured with indexes", file=sys.stderr)
+        finally:
+            await engine.dispose()
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+    return create_report(
+        "database_indexes",
+        hosts=hosts,
+        backends_per_load_balancer=BACKENDS_PER_LOAD_BALANCER,
+        results={"before": before, "after": after},
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Benchmark reading and deleting hosts before and after indexes")
+    parser.add_argument("--hosts", type=int, default=50_000, help="number of hosts in the database")
+    parser.add_argument("--deletes", type=int, default=20, help="number of hosts of each type deleted")
+    parser.add_argument("--repeats", type=int, default=3, help="number of times every host type is read")
+    parser.add_argument("--output", help="file to write JSON results to (default: stdout)")
+    args = parser.parse_args()
+
+    write_report(asyncio.run(run(args.hosts, args.deletes, args.repeats)), args.output)
+
+
+if __name__ == "__main__":
+    main()
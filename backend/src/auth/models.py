@@ -17,6 +17,6 @@ class RefreshToken(SQLModel, table=True):
 
     id: int | None = Field(default=None, primary_key=True)
     token: str = Field(unique=True, index=True)
-    user_id: int = Field(foreign_key="auth_users.id")
-    expires_at: datetime
+    user_id: int = Field(foreign_key="auth_users.id", index=True)
+    expires_at: datetime = Field(index=True)
     created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
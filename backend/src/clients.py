@@ -0,0 +1,39 @@
+"""
+Long-lived clients shared by all requests. They are created once in the lifespan of the app so that their connection
+pools are reused instead of being set up and torn down on every call.
+"""
+
+import aiodocker
+import aiohttp
+import httpx
+from starlette.requests import Request
+
+from src.config import settings
+
+
+def create_docker_client() -> aiodocker.Docker:
+    timeout = aiohttp.ClientTimeout(total=settings.docker_timeout_seconds)
+    if not settings.docker_host.startswith("unix://"):
+        # aiodocker turns tcp:// into http(s):// and sets up TLS from DOCKER_TLS_VERIFY and DOCKER_CERT_PATH, which it
+        # skips when it is given a connector. Its connector isn't limited to `docker_max_connections`
+        return aiodocker.Docker(url=settings.docker_host, timeout=timeout)
+
+    connector = aiohttp.UnixConnector(
+        path=settings.docker_host.removeprefix("unix://"), limit=settings.docker_max_connections
+    )
+    # the socket path is given to the connector, aiodocker only needs a dummy hostname to compose urls
+    return aiodocker.Docker(url="unix://localhost", connector=connector, timeout=timeout)
+
+
+def create_http_client() -> httpx.AsyncClient:
+    return httpx.AsyncClient(
+        limits=httpx.Limits(
+            max_connections=settings.http_max_connections,
+            max_keepalive_connections=settings.http_max_keepalive_connections,
+        ),
+        timeout=httpx.Timeout(settings.http_timeout_seconds),
+    )
+
+
+def get_http_client(request: Request) -> httpx.AsyncClient:
+    return request.app.state.http_client
@@ -1,3 +1,6 @@
+from typing import Literal
+
+from pydantic import Field
 from pydantic_settings import BaseSettings, SettingsConfigDict
 
 
@@ -9,8 +12,74 @@ class Settings(BaseSettings):
 
     database_url: str
     database_echo: bool
+    # connection pool of server databases such as PostgreSQL. SQLite databases are files of this process and don't use
+    # these. Config files are written by a single instance of the app, a second one using the same database won't
+    # start
+    database_pool_size: int = Field(default=5, ge=1)
+    # connections opened on top of the pool when all of its connections are in use, closed once they are returned
+    database_max_overflow: int = Field(default=10, ge=0)
+    # how long a request waits for a free connection before failing
+    database_pool_timeout_seconds: float = Field(default=30.0, gt=0)
+    # connections older than this are replaced, so that connections closed by the server or a proxy in between aren't
+    # handed out. -1 never replaces them
+    database_pool_recycle_seconds: int = Field(default=1800, ge=-1)
+
+    # sqlite is tuned on every new connection. WAL lets readers go on while a write is in progress, and with WAL a
+    # synchronous level of NORMAL only syncs on checkpoints while still never corrupting the database
+    sqlite_journal_mode: Literal["WAL", "DELETE", "TRUNCATE", "PERSIST", "MEMORY"] = "WAL"
+    sqlite_synchronous: Literal["OFF", "NORMAL", "FULL", "EXTRA"] = "NORMAL"
+    # page cache per connection, negative values are in KiB and positive values in pages
+    sqlite_cache_size: int = -16000
+    sqlite_mmap_size: int = Field(default=128 * 1024 * 1024, ge=0)
+    sqlite_temp_store: Literal["DEFAULT", "FILE", "MEMORY"] = "MEMORY"
+    # how long a connection waits for a lock held by another one before failing with "database is locked"
+    sqlite_busy_timeout_ms: int = Field(default=5000, ge=0)
 
     ferron_container_name: str
+    # reload requests made within this window are coalesced into a single reload of ferron
+    ferron_reload_window_ms: int = Field(default=250, ge=0)
+
+    # config changes waiting to be written, requests wait for free space once the queue is full
+    config_writer_queue_size: int = Field(default=1000, ge=1)
+    # config changes waiting in the queue are written together, up to this many at once
+    config_writer_max_batch_size: int = Field(default=100, ge=1)
+
+    # how host configs are laid out in files: a file per host, `config_layout_shard_count` shared files or a single
+    # file. Files of other layouts are migrated to this one on startup
+    config_layout: Literal["per_host", "sharded", "monolithic"] = "per_host"
+    config_layout_shard_count: int = Field(default=16, ge=1)
+
+    # every batch of config changes is written as a new generation directory which Ferron is switched to at once,
+    # the last `config_generations_keep` generations are kept to roll back to
+    config_generations_enabled: bool = False
+    config_generations_keep: int = Field(default=5, ge=1)
+
+    # every change of a host is kept in the config history as the fields which changed, with the whole config of the
+    # host stored again every `config_history_snapshot_interval` changes so that rebuilding it reads only a few of them.
+    # The newest `config_history_keep` changes are kept, older ones are compacted away and can't be rolled back to
+    config_history_keep: int = Field(default=10000, ge=1)
+    config_history_snapshot_interval: int = Field(default=10, ge=1)
+
+    # regenerate all config files from the database on startup, only files which differ are written
+    reconcile_on_startup: bool = True
+    # number of partitions of host configs rendered in worker threads while more are fetched from the database
+    reconcile_render_concurrency: int = Field(default=4, ge=1)
+
+    # config files are compared with the database this often, 0 disables periodic checks
+    drift_check_interval_seconds: int = Field(default=300, ge=0)
+    # config files which drifted are regenerated from the database right away
+    drift_auto_repair: bool = False
+
+    # compiled templates are cached in this directory, so that they aren't compiled again on every start
+    template_bytecode_cache_dir: str | None = None
+
+    docker_host: str = "unix:///var/run/docker.sock"
+    docker_max_connections: int = Field(default=4, ge=1)
+    docker_timeout_seconds: float = Field(default=10.0, gt=0)
+
+    http_max_connections: int = Field(default=10, ge=1)
+    http_max_keepalive_connections: int = Field(default=5, ge=0)
+    http_timeout_seconds: float = Field(default=5.0, gt=0)
 
     model_config = SettingsConfigDict(
         extra="ignore",
@@ -1,9 +1,9 @@
-from typing import AsyncGenerator
+from typing import Any, AsyncGenerator
 
 from alembic.config import Config
-from sqlalchemy import event
+from sqlalchemy import event, func, make_url, select
 from sqlalchemy.dialects.sqlite.aiosqlite import AsyncAdapt_aiosqlite_connection
-from sqlalchemy.ext.asyncio import create_async_engine
+from sqlalchemy.ext.asyncio import AsyncConnection, AsyncEngine, create_async_engine
 from sqlalchemy.pool.base import _ConnectionRecord
 from sqlmodel.ext.asyncio.session import AsyncSession as SQLModelAsyncSession
 
@@ -12,14 +12,43 @@ from src.config import settings
 
 database_url = settings.database_url
 
+
+def get_engine_options(url: str) -> dict[str, Any]:
+    """
+    pool settings of server databases. SQLite uses pools of its own, in-memory databases can't have a pool of several
+    connections
+    """
+    if make_url(url).get_backend_name() == "sqlite":
+        return {}
+
+    return {
+        "pool_size": settings.database_pool_size,
+        "max_overflow": settings.database_max_overflow,
+        "pool_timeout": settings.database_pool_timeout_seconds,
+        "pool_recycle": settings.database_pool_recycle_seconds,
+    }
+
+
 engine = create_async_engine(
     database_url,
     echo=settings.database_echo,
+    **get_engine_options(database_url),
 )
 
 
+# applied in this order on every new connection. busy_timeout comes first so that switching the journal mode waits
+# for other connections instead of failing
+SQLITE_PRAGMAS = {
+    "busy_timeout": settings.sqlite_busy_timeout_ms,
+    "journal_mode": settings.sqlite_journal_mode,
+    "synchronous": settings.sqlite_synchronous,
+    "cache_size": settings.sqlite_cache_size,
+    "mmap_size": settings.sqlite_mmap_size,
+    "temp_store": settings.sqlite_temp_store,
+}
+
+
 # enable foreign keys for on delete cascade
-@event.listens_for(engine.sync_engine, "connect")
 def set_sqlite_pragma(
     # I got types for these two parameters by debug printing them
     dbapi_conn: AsyncAdapt_aiosqlite_connection,
@@ -27,9 +56,73 @@ def set_sqlite_pragma(
 ) -> None:
     cursor = dbapi_conn.cursor()
     cursor.execute("PRAGMA foreign_keys=ON")
+    for name, value in SQLITE_PRAGMAS.items():
+        cursor.execute(f"PRAGMA {name}={value}")
     cursor.close()
 
 
+# other databases enforce foreign keys and are tuned on the server
+if engine.dialect.name == "sqlite":
+    event.listen(engine.sync_engine, "connect", set_sqlite_pragma)
+
+
+# sqlite reports these pragmas as numbers
+_SQLITE_PRAGMA_VALUE_NAMES = {
+    "synchronous": ["OFF", "NORMAL", "FULL", "EXTRA"],
+    "temp_store": ["DEFAULT", "FILE", "MEMORY"],
+}
+
+
+async def read_sqlite_pragmas() -> dict[str, Any]:
+    """
+    effective values of `SQLITE_PRAGMAS`, which may differ from the configured ones, e.g. an in-memory database
+    can't use WAL
+    """
+    values = {}
+    async with engine.connect() as connection:
+        for name in SQLITE_PRAGMAS:
+            value = (await connection.exec_driver_sql(f"PRAGMA {name}")).scalar_one()
+            if name in _SQLITE_PRAGMA_VALUE_NAMES:
+                value = _SQLITE_PRAGMA_VALUE_NAMES[name][value]
+            values[name] = value
+
+    return values
+
+
+# key of the PostgreSQL advisory lock held by the instance of the app which writes config files
+CONFIG_FILES_LOCK_KEY = 0x4650_4D43
+
+
+async def lock_config_files(engine: AsyncEngine) -> AsyncConnection | None:
+    """
+    takes the lock which only one instance of the app sharing a PostgreSQL database may hold. Includes, host names and
+    file contents are kept in memory by the instance writing config files, so a second one would overwrite its
+    changes. The returned connection holds the lock until it's released with `unlock_config_files()`. SQLite
+    databases aren't shared and aren't locked
+    """
+    if engine.dialect.name != "postgresql":
+        return None
+
+    connection = await engine.connect()
+    locked = (await connection.execute(select(func.pg_try_advisory_lock(CONFIG_FILES_LOCK_KEY)))).scalar_one()
+    # the lock belongs to the session, the transaction is ended so that the connection isn't left idle in it
+    await connection.commit()
+    if not locked:
+        await connection.close()
+        raise RuntimeError(
+            "Another instance of the app is running against this database, only one instance may write config files"
+        )
+
+    return connection
+
+
+async def unlock_config_files(connection: AsyncConnection) -> None:
+    # the connection goes back to the pool, which would keep the lock of its session
+    await connection.execute(select(func.pg_advisory_unlock(CONFIG_FILES_LOCK_KEY)))
+    await connection.commit()
+    await connection.close()
+
+
 def run_migrations() -> None:
     cfg = Config("alembic.ini")
     command.upgrade(cfg, "head")
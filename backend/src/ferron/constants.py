@@ -34,6 +34,60 @@ class TemplateType(Enum):
     STATIC_FILE_CONFIG = "static_file.j2"
 
 
+class HostType(Enum):
+    REVERSE_PROXY = "reverse_proxy"
+    LOAD_BALANCER = "load_balancer"
+    STATIC_FILE = "static_file"
+
+
+HOST_TEMPLATE_TYPES = {
+    HostType.REVERSE_PROXY: TemplateType.REVERSE_PROXY_CONFIG,
+    HostType.LOAD_BALANCER: TemplateType.LOAD_BALANCER_CONFIG,
+    HostType.STATIC_FILE: TemplateType.STATIC_FILE_CONFIG,
+}
+
+
+class ConfigLayoutType(Enum):
+    PER_HOST = "per_host"
+    SHARDED = "sharded"
+    MONOLITHIC = "monolithic"
+
+
+# space between positions of load balancer backends, so that backends can be inserted between others
+LOAD_BALANCER_BACKEND_POSITION_STEP = 1024
+
+# upper limit on the number of operations in a single request to /configs/batch
+MAX_BATCH_OPERATIONS = 1000
+
+
+class HostSortKey(Enum):
+    NAME = "name"
+    CREATED = "created"
+
+
+class SortOrder(Enum):
+    ASC = "asc"
+    DESC = "desc"
+
+
+# page sizes of /configs/hosts
+DEFAULT_HOSTS_PAGE_SIZE = 50
+MAX_HOSTS_PAGE_SIZE = 500
+
+# hosts are searched through a trigram index, shorter queries can't be looked up in it
+MIN_SEARCH_QUERY_LENGTH = 3
+
+
+class ConfigChangeOperation(Enum):
+    CREATE = "create"
+    UPDATE = "update"
+    DELETE = "delete"
+
+
+# page sizes of /configs/history
+DEFAULT_HISTORY_PAGE_SIZE = 50
+MAX_HISTORY_PAGE_SIZE = 500
+
 SUB_CONFIG_PATH = "/etc/ferron-proxy-manager"
 
 
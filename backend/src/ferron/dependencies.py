@@ -0,0 +1,37 @@
+from typing import Annotated
+
+from fastapi import Depends, Request, Response
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from src.database import get_session
+from src.ferron import service
+from src.ferron.exceptions import ConfigNotModified
+
+
+def etag_matches(etag: str, if_none_match: str) -> bool:
+    """
+    whether an If-None-Match header matches `etag`, compared weakly as RFC 9110 requires
+    """
+    if if_none_match.strip() == "*":
+        return True
+
+    return any(tag.strip().removeprefix("W/") == etag for tag in if_none_match.split(","))
+
+
+async def check_config_revision(
+    request: Request,
+    response: Response,
+    session: Annotated[AsyncSession, Depends(get_session)],
+) -> None:
+    """
+    tags responses of config reads with the config revision, and answers 304 Not Modified before anything else is
+    read if the client already has the response of the current revision. The revision is read before the config, so a
+    write in between makes the tag older than the response, never newer
+    """
+    etag = f'"{await service.read_config_revision(session)}"'
+
+    if_none_match = request.headers.get("If-None-Match")
+    if if_none_match is not None and etag_matches(etag, if_none_match):
+        raise ConfigNotModified(etag)
+
+    response.headers["ETag"] = etag
@@ -0,0 +1,178 @@
+import asyncio
+import contextlib
+import logging
+import os
+from datetime import datetime, timezone
+
+from aiofiles import os as aiofiles_os
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from src.config import settings
+from src.database import engine
+from src.ferron import schemas
+from src.ferron.files import current_config_hashes, hash_config
+from src.ferron.layout import HostKey, owning_layout
+from src.ferron.reconcile import reconcile_configs, render_all_configs
+from src.ferron.writer import ConfigWriter, config_writer
+
+logger = logging.getLogger(__name__)
+
+
+class DriftDetector:
+    """
+    periodically compares config files on disk with the hashes the config writer expects them to have, which are
+    rendered from the database only when the writer hasn't written every host yet
+    """
+
+    def __init__(self, writer: ConfigWriter, interval_seconds: float, auto_repair: bool) -> None:
+        self.writer = writer
+        self.interval_seconds = interval_seconds
+        self.auto_repair = auto_repair
+        self.last_report: schemas.DriftReport | None = None
+
+        self._task: asyncio.Task[None] | None = None
+        self._check_lock = asyncio.Lock()
+
+    def start(self) -> None:
+        # an interval of 0 disables periodic checks, checks can still be made through the api
+        if self.interval_seconds > 0:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is None:
+            return
+
+        self._task.cancel()
+        with contextlib.suppress(asyncio.CancelledError):
+            await self._task
+        self._task = None
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.interval_seconds)
+            try:
+                report = await self.check()
+            except Exception as e:
+                logger.error("Failed to check config files for drift: %s", e)
+            else:
+                if report.has_drift:
+                    logger.warning(
+                        "Config files have drifted: %d modified, %d missing, %d orphaned, %d dangling includes",
+                        len(report.modified),
+                        len(report.missing),
+                        len(report.orphaned),
+                        len(report.dangling_includes),
+                    )
+
+    async def check(self, repair: bool | None = None) -> schemas.DriftReport:
+        """
+        checks config files for drift and repairs it by regenerating config files if `repair`, or auto repair when
+        `repair` is None, is enabled
+        """
+        async with self._check_lock:
+            if not self.writer.has_baseline:
+                await self._record_baseline()
+
+            # files aren't compared while the writer is halfway through changing them
+            async with self.writer.idle():
+                report = await self._scan()
+
+            if report.has_drift and (self.auto_repair if repair is None else repair):
+                async with AsyncSession(engine) as session:
+                    await reconcile_configs(session)
+                report.repaired = True
+
+            self.last_report = report
+            return report
+
+    async def _record_baseline(self) -> None:
+        # checks are reached from GET requests, configs rendered again are stored by the next write or reconcile
+        async with AsyncSession(engine) as session:
+            rendered = await render_all_configs(session, store=False)
+
+        layout = self.writer.layout
+        if layout.shared_files:
+            files: dict[str, dict[HostKey, str]] = {}
+            for key, text in rendered.hosts.items():
+                files.setdefault(layout.file_name(key), {})[key] = text
+
+            hashes = {
+                self.writer.host_file_path(file_name): hash_config(layout.render_file(file_name, sections))
+                for file_name, sections in files.items()
+            }
+        else:
+            # files of hosts have just their configs, whose hashes were stored with them
+            hashes = {
+                self.writer.host_file_path(layout.file_name(key)): digest for key, digest in rendered.hashes.items()
+            }
+        for mutation in rendered.files:
+            hashes[mutation.path] = hash_config(mutation.text)
+
+        self.writer.record_baseline(hashes)
+
+    async def _scan(self) -> schemas.DriftReport:
+        root = self.writer.root
+        registry = self.writer.registry
+        expected_hashes = self.writer.expected_hashes()
+
+        # with generations, files are in the current generation but are reported by their path under `root`
+        host_file_paths = {
+            os.path.join(root, file_name)
+            for file_name in await aiofiles_os.listdir(self.writer.storage_dir())
+            if owning_layout(file_name) is not None
+        }
+        main_config_path, main_config_text = self.writer.main_config()
+
+        modified: list[str] = []
+        missing: list[str] = []
+        orphaned: list[str] = []
+
+        checked_paths = host_file_paths | {path for path, digest in expected_hashes.items() if digest is not None}
+        # every file is stat'ed in a single job of the thread pool, including the main config
+        current_hashes = await current_config_hashes(
+            [self.writer.storage_path(path) for path in sorted(checked_paths)] + [main_config_path]
+        )
+
+        for path in sorted(checked_paths):
+            expected_hash = expected_hashes.get(path)
+            current_hash = current_hashes[self.writer.storage_path(path)]
+
+            if expected_hash is None:
+                if current_hash is not None:
+                    orphaned.append(path)
+            elif current_hash is None:
+                missing.append(path)
+            elif current_hash != expected_hash:
+                modified.append(path)
+
+        # includes of files inside the sub config directory which aren't expected to exist. Includes of other files
+        # were added by hand and are left alone
+        dangling_includes = [
+            path
+            for path in registry.paths()
+            if os.path.dirname(path) == root
+            and expected_hashes.get(path) is None
+            and (path in expected_hashes or owning_layout(os.path.basename(path)) is not None)
+        ]
+
+        main_config_modified = current_hashes[main_config_path] != hash_config(main_config_text)
+
+        return schemas.DriftReport(
+            checked_at=datetime.now(timezone.utc),
+            has_drift=bool(modified or missing or orphaned or dangling_includes or main_config_modified),
+            modified=modified,
+            missing=missing,
+            orphaned=orphaned,
+            dangling_includes=dangling_includes,
+            main_config_modified=main_config_modified,
+            # the main config is checked too
+            files_checked=len(checked_paths) + 1,
+            repaired=False,
+        )
+
+
+drift_detector = DriftDetector(
+    config_writer,
+    interval_seconds=settings.drift_check_interval_seconds,
+    auto_repair=settings.drift_auto_repair,
+)
@@ -35,6 +35,36 @@ class VirtualHostNameAlreadyExists(FerronException):
         )
 
 
+class LoadBalancerBackendAlreadyExists(FerronException):
+    def __init__(self, backend_url: str = "<backend_url>") -> None:
+        super().__init__(
+            status_code=status.HTTP_409_CONFLICT,
+            detail={
+                "error_code": "load_balancer_backend_already_exists",
+                "msg": f"{backend_url} is already a backend of the load balancer",
+            },
+        )
+
+
+class BatchOperationFailed(FerronException):
+    def __init__(self, index: int, error: HTTPException) -> None:
+        error_msg = error.detail["msg"] if isinstance(error.detail, dict) else str(error.detail)
+        super().__init__(
+            status_code=error.status_code,
+            detail={
+                "error_code": "batch_operation_failed",
+                "msg": f"Operation {index} failed: {error_msg}",
+                "index": index,
+                "error": error.detail,
+            },
+        )
+
+
+class ConfigNotModified(HTTPException):
+    def __init__(self, etag: str) -> None:
+        super().__init__(status_code=status.HTTP_304_NOT_MODIFIED, headers={"ETag": etag})
+
+
 class TemplateConfigAndTemplateTypeMismatch(HTTPException):
     def __init__(self, template_name: TemplateType, config: TemplateConfig) -> None:
         super().__init__(
@@ -67,3 +97,64 @@ class FileNotFound(FileSystemException):
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail={"error_code": "file_not_found", "msg": f"File '{file_name}' not found"},
         )
+
+
+class GenerationNotFound(FerronException):
+    def __init__(self, generation: int | None = None) -> None:
+        super().__init__(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail={
+                "error_code": "generation_not_found",
+                "msg": (
+                    f"Config generation {generation} not found"
+                    if generation is not None
+                    else "No earlier config generation to roll back to"
+                ),
+            },
+        )
+
+
+class GenerationsDisabled(FerronException):
+    def __init__(self) -> None:
+        super().__init__(
+            status_code=status.HTTP_409_CONFLICT,
+            detail={"error_code": "generations_disabled", "msg": "Config generations are not enabled"},
+        )
+
+
+class InvalidConfig(FerronException):
+    def __init__(self, config_name: str = "<config>", reason: str = "it is not valid KDL") -> None:
+        super().__init__(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail={"error_code": "invalid_config", "msg": f"Rendered config of {config_name} is invalid: {reason}"},
+        )
+
+
+class InvalidCursor(FerronException):
+    def __init__(self) -> None:
+        super().__init__(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail={"error_code": "invalid_cursor", "msg": "Cursor is invalid or belongs to a different query"},
+        )
+
+
+class ChangesNotAvailable(FerronException):
+    def __init__(self, since: int = 0) -> None:
+        super().__init__(
+            status_code=status.HTTP_410_GONE,
+            detail={
+                "error_code": "changes_not_available",
+                "msg": f"Changes since revision {since} are no longer available, all configs have to be read again",
+            },
+        )
+
+
+class HistoryEntryNotFound(FerronException):
+    def __init__(self, history_id: int = 0) -> None:
+        super().__init__(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail={
+                "error_code": "history_entry_not_found",
+                "msg": f"Config history entry {history_id} not found, it may have been compacted away",
+            },
+        )
@@ -0,0 +1,172 @@
+import asyncio
+import contextlib
+import hashlib
+import os
+import tempfile
+
+import aiofiles
+
+from src.ferron.exceptions import FileNotFound
+
+
+def hash_config(text: str) -> str:
+    return hashlib.sha256(text.encode()).hexdigest()
+
+
+# hash of the content last written to or read from each config file, along with the file's (mtime_ns, size) at that
+# time. The stat lets unchanged files be compared without reading them back, while still catching edits made by hand
+_config_file_hashes: dict[str, tuple[str, int, int]] = {}
+
+
+def _current_config_hash(path: str) -> str | None:
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return None
+
+    cached = _config_file_hashes.get(path)
+    if cached is not None and cached[1:] == (stat.st_mtime_ns, stat.st_size):
+        return cached[0]
+
+    with open(path, "r") as f:
+        digest = hash_config(f.read())
+
+    _config_file_hashes[path] = (digest, stat.st_mtime_ns, stat.st_size)
+    return digest
+
+
+def forget_config_hashes(directory: str) -> None:
+    """
+    drops cached hashes of files in `directory`, once it has been removed
+    """
+    for path in [path for path in _config_file_hashes if os.path.dirname(path) == directory]:
+        del _config_file_hashes[path]
+
+
+def fsync_directory(path: str) -> None:
+    fd = os.open(path, os.O_RDONLY | os.O_DIRECTORY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def write_configs_sync(files: dict[str, str], only_changed: bool) -> list[str]:
+    """
+    blocking version of `write_configs()` and `write_configs_if_changed()`
+    """
+    # temp files are written in the same directory as their targets to avoid cross-device link errors
+    temp_files: list[tuple[str, str, str]] = []
+    try:
+        for path, text in files.items():
+            digest = hash_config(text)
+            if only_changed and _current_config_hash(path) == digest:
+                continue
+
+            target_dir = os.path.dirname(path)
+            os.makedirs(target_dir, exist_ok=True)
+
+            fd, temp_path = tempfile.mkstemp(dir=target_dir)
+            temp_files.append((temp_path, path, digest))
+            with os.fdopen(fd, "w") as f:
+                f.write(text)
+                f.flush()
+                # data has to be on disk before the rename, otherwise a power loss can leave an empty config behind
+                os.fsync(f.fileno())
+
+            # permissions are being set to 644 so that ferron can read the config files
+            os.chmod(temp_path, 0o644)
+
+        for temp_path, path, digest in temp_files:
+            os.replace(temp_path, path)
+
+            stat = os.stat(path)
+            _config_file_hashes[path] = (digest, stat.st_mtime_ns, stat.st_size)
+    finally:
+        # temp files of a failed batch, renamed ones don't exist anymore
+        for temp_path, _path, _digest in temp_files:
+            with contextlib.suppress(FileNotFoundError):
+                os.remove(temp_path)
+
+    # one fsync per directory makes all renames of the batch durable
+    for directory in {os.path.dirname(path) for _temp_path, path, _digest in temp_files}:
+        fsync_directory(directory)
+
+    return [path for _temp_path, path, _digest in temp_files]
+
+
+async def write_configs(files: dict[str, str]) -> None:
+    """
+    atomically and durably writes text of every file in `files` to its path with 644 permissions. All files are
+    written in a single job of the thread pool
+    """
+    await asyncio.to_thread(write_configs_sync, files, False)
+
+
+async def write_configs_if_changed(files: dict[str, str]) -> list[str]:
+    """
+    writes files in `files` like `write_configs()` except for those which already have the exact same content.
+    Returns paths of the files which were written
+    """
+    return await asyncio.to_thread(write_configs_sync, files, True)
+
+
+async def write_config(path: str, text: str) -> None:
+    """
+    atomically writes `text` to file at `path` with 644 permissions
+    """
+    await write_configs({path: text})
+
+
+async def write_config_if_changed(path: str, text: str) -> bool:
+    """
+    writes `text` to file at `path` using `write_config()` unless the file already has the exact same content.
+    Returns whether the file was written
+    """
+    return bool(await write_configs_if_changed({path: text}))
+
+
+async def current_config_hashes(paths: list[str]) -> dict[str, str | None]:
+    """
+    hashes of the current content of files at `paths`, a file is read only if its stat changed since it was last
+    hashed. Hash of a file which doesn't exist is None
+    """
+
+    def hash_files() -> dict[str, str | None]:
+        return {path: _current_config_hash(path) for path in paths}
+
+    return await asyncio.to_thread(hash_files)
+
+
+def _remove_configs(paths: list[str]) -> list[str]:
+    removed_paths = []
+    for path in paths:
+        _config_file_hashes.pop(path, None)
+        with contextlib.suppress(FileNotFoundError):
+            os.remove(path)
+            removed_paths.append(path)
+
+    for directory in {os.path.dirname(path) for path in removed_paths}:
+        fsync_directory(directory)
+
+    return removed_paths
+
+
+async def remove_configs(paths: list[str]) -> list[str]:
+    """
+    removes files at `paths` in a single job of the thread pool. Returns paths of the files which existed
+    """
+    return await asyncio.to_thread(_remove_configs, paths)
+
+
+async def remove_config(path: str) -> None:
+    if not await remove_configs([path]):
+        raise FileNotFoundError(path)
+
+
+async def read_config(path: str) -> str:
+    try:
+        async with aiofiles.open(path, "r") as f:
+            return await f.read()
+    except FileNotFoundError:
+        raise FileNotFound(path)
@@ -0,0 +1,224 @@
+import asyncio
+import contextlib
+import os
+import re
+import shutil
+
+from src.ferron.exceptions import GenerationNotFound
+from src.ferron.files import forget_config_hashes, fsync_directory, write_configs_sync
+from src.ferron.registry import IncludeRegistry, include_line
+
+_GENERATION_DIR_PATTERN = re.compile(r"^gen-(\d+)$")
+_MAIN_CONFIG_FILE_NAME = "main.kdl"
+
+
+class GenerationStore:
+    """
+    keeps every version of the config files in `generations/gen-N` under `root`, with `current` a symlink to the
+    latest one. Flipping the symlink switches every file at once
+    """
+
+    def __init__(self, root: str, keep: int) -> None:
+        self.root = root
+        self.keep = keep
+        self.generations_dir = os.path.join(root, "generations")
+        self.current_link = os.path.join(root, "current")
+        self.current: int | None = None
+
+    def generation_dir(self, generation: int) -> str:
+        return os.path.join(self.generations_dir, f"gen-{generation}")
+
+    def generations(self) -> list[int]:
+        try:
+            file_names = os.listdir(self.generations_dir)
+        except FileNotFoundError:
+            return []
+
+        return sorted(
+            int(match.group(1)) for match in map(_GENERATION_DIR_PATTERN.match, file_names) if match is not None
+        )
+
+    def storage_path(self, path: str) -> str:
+        """
+        path of file at `path` directly under `root` in the current generation
+        """
+        if self.current is None:
+            return path
+
+        return os.path.join(self.generation_dir(self.current), os.path.relpath(path, self.root))
+
+    def render_main_config(self, registry: IncludeRegistry, generation: int) -> str:
+        # includes of files under root point into the generation itself
+        return registry.render().replace(f'include "{self.root}/', f'include "{self.generation_dir(generation)}/')
+
+    async def load(self, registry: IncludeRegistry) -> None:
+        """
+        loads includes of the current generation into `registry`. Files included directly under `root` become the
+        first generation if there isn't one yet
+        """
+        self.current = await asyncio.to_thread(self._read_current)
+
+        if self.current is None:
+            await registry.load()
+            await asyncio.to_thread(self._adopt, registry)
+        else:
+            text = await asyncio.to_thread(self._read_main_config, self.current)
+            registry.load_text(text.replace(f'include "{self.generation_dir(self.current)}/', f'include "{self.root}/'))
+
+    def _read_main_config(self, generation: int) -> str:
+        try:
+            with open(os.path.join(self.generation_dir(generation), _MAIN_CONFIG_FILE_NAME), "r") as f:
+                return f.read()
+        except FileNotFoundError:
+            return ""
+
+    def _read_current(self) -> int | None:
+        try:
+            target = os.readlink(self.current_link)
+        except FileNotFoundError:
+            return None
+
+        match = _GENERATION_DIR_PATTERN.match(os.path.basename(target))
+        return int(match.group(1)) if match is not None else None
+
+    def _adopt(self, registry: IncludeRegistry) -> None:
+        generation = max(self.generations(), default=0) + 1
+        generation_dir = self.generation_dir(generation)
+        os.makedirs(generation_dir)
+
+        adopted_paths = [path for path in registry.paths() if os.path.dirname(path) == self.root]
+        for path in adopted_paths:
+            with contextlib.suppress(FileNotFoundError):
+                os.link(path, os.path.join(generation_dir, os.path.basename(path)))
+
+        write_configs_sync(
+            {os.path.join(generation_dir, _MAIN_CONFIG_FILE_NAME): self.render_main_config(registry, generation)},
+            only_changed=False,
+        )
+        self._activate(generation)
+
+        write_configs_sync(
+            {registry.path: f"{include_line(os.path.join(self.current_link, _MAIN_CONFIG_FILE_NAME))}\n"},
+            only_changed=True,
+        )
+        for path in adopted_paths:
+            with contextlib.suppress(FileNotFoundError):
+                os.remove(path)
+
+    async def commit(self, files: dict[str, str], removed_paths: list[str], registry: IncludeRegistry) -> list[str]:
+        """
+        creates a new generation out of the current one with `files` written, `removed_paths` left out and the
+        includes of `registry`, and makes it the current one. Returns paths of the removed files which existed
+        """
+        return await asyncio.to_thread(self._commit, files, removed_paths, registry)
+
+    def _commit(self, files: dict[str, str], removed_paths: list[str], registry: IncludeRegistry) -> list[str]:
+        generation = max(self.generations(), default=0) + 1
+        generation_dir = self.generation_dir(generation)
+        os.makedirs(generation_dir)
+
+        skipped_file_names = {os.path.relpath(path, self.root) for path in [*files, *removed_paths]}
+        skipped_file_names.add(_MAIN_CONFIG_FILE_NAME)
+
+        existing_removed_paths = []
+        if self.current is not None:
+            current_dir = self.generation_dir(self.current)
+            # unchanged files are hard linked, so that a generation costs only the files which changed
+            for file_name in os.listdir(current_dir):
+                if file_name not in skipped_file_names:
+                    os.link(os.path.join(current_dir, file_name), os.path.join(generation_dir, file_name))
+
+            existing_removed_paths = [
+                path
+                for path in removed_paths
+                if os.path.exists(os.path.join(current_dir, os.path.relpath(path, self.root)))
+            ]
+
+        generation_files = {
+            os.path.join(generation_dir, os.path.relpath(path, self.root)): text for path, text in files.items()
+        }
+        generation_files[os.path.join(generation_dir, _MAIN_CONFIG_FILE_NAME)] = self.render_main_config(
+            registry, generation
+        )
+        write_configs_sync(generation_files, only_changed=False)
+        fsync_directory(self.generations_dir)
+
+        self._activate(generation)
+        self._collect_garbage()
+
+        return existing_removed_paths
+
+    def _activate(self, generation: int) -> None:
+        # symlink is replaced atomically by renaming a new one over it
+        temp_link = f"{self.current_link}.tmp"
+        with contextlib.suppress(FileNotFoundError):
+            os.remove(temp_link)
+        os.symlink(os.path.relpath(self.generation_dir(generation), self.root), temp_link)
+        os.replace(temp_link, self.current_link)
+        fsync_directory(self.root)
+
+        self.current = generation
+
+    def _collect_garbage(self) -> None:
+        for generation in self.generations()[: -self.keep]:
+            if generation == self.current:
+                continue
+
+            generation_dir = self.generation_dir(generation)
+            shutil.rmtree(generation_dir, ignore_errors=True)
+            forget_config_hashes(generation_dir)
+
+    async def rollback(self, generation: int | None = None) -> int:
+        """
+        makes `generation`, or the one before the current one, the current generation. Returns the new current
+        generation
+        """
+        generations = await asyncio.to_thread(self.generations)
+
+        if generation is None:
+            earlier_generations = [
+                existing_generation
+                for existing_generation in generations
+                if self.current is None or existing_generation < self.current
+            ]
+            if not earlier_generations:
+                raise GenerationNotFound()
+            generation = earlier_generations[-1]
+        elif generation not in generations:
+            raise GenerationNotFound(generation)
+
+        await asyncio.to_thread(self._activate, generation)
+        return generation
+
+
+def _release_generations(root: str, registry: IncludeRegistry) -> bool:
+    store = GenerationStore(root, keep=1)
+    store.current = store._read_current()
+    if store.current is None:
+        return False
+
+    generation_dir = store.generation_dir(store.current)
+    main_config = store._read_main_config(store.current).replace(f'include "{generation_dir}/', f'include "{root}/')
+
+    files: dict[str, str] = {}
+    for file_name in os.listdir(generation_dir):
+        if file_name != _MAIN_CONFIG_FILE_NAME:
+            with open(os.path.join(generation_dir, file_name), "r") as f:
+                files[os.path.join(root, file_name)] = f.read()
+
+    # files are back in place before the main config includes them again
+    write_configs_sync(files, only_changed=True)
+    write_configs_sync({registry.path: main_config}, only_changed=True)
+
+    os.remove(store.current_link)
+    shutil.rmtree(store.generations_dir, ignore_errors=True)
+    forget_config_hashes(generation_dir)
+    return True
+
+
+async def release_generations(root: str, registry: IncludeRegistry) -> bool:
+    """
+    moves files of the current generation back directly under `root` and removes all generations, once they have been
+    disabled. Returns whether there were any generations
+    """
+    return await asyncio.to_thread(_release_generations, root, registry)
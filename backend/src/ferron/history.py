@@ -0,0 +1,234 @@
+from typing import Any
+
+from sqlalchemy import ColumnElement, and_, delete, func, select, update
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from src.config import settings
+from src.ferron import exceptions, models
+from src.ferron.constants import ConfigChangeOperation, HostType
+from src.ferron.utils import HostTemplateConfig
+
+# old changes are compacted away once this many more than the ones kept have piled up, instead of on every change
+COMPACT_EVERY = 100
+
+Host = tuple[HostType, int]
+# fields of a host's config as JSON values, without its id
+ConfigState = dict[str, Any]
+
+
+def config_state(config: HostTemplateConfig | None) -> ConfigState | None:
+    return config.model_dump(mode="json", exclude={"id"}) if config is not None else None
+
+
+def diff_states(before: ConfigState | None, after: ConfigState | None) -> dict[str, list[Any]]:
+    """
+    fields which differ as [old, new]. Every field differs from a host which doesn't exist, which is None
+    """
+    before = before or {}
+    after = after or {}
+    return {
+        field: [before.get(field), after.get(field)]
+        for field in {**before, **after}
+        if before.get(field) != after.get(field)
+    }
+
+
+def _host_condition(host: Host) -> ColumnElement[bool]:
+    host_type, config_id = host
+    return and_(models.ConfigHistory.host_type == host_type.value, models.ConfigHistory.config_id == config_id)
+
+
+async def _read_rows_since_config(host: Host, history_id: int, session: AsyncSession) -> list[models.ConfigHistory]:
+    """
+    changes of `host` up to `history_id`, from the latest one with a whole config on. Snapshots make them at most
+    `config_history_snapshot_interval` changes however long the history of the host is
+    """
+    history = models.ConfigHistory
+    latest_config_id = (
+        select(func.max(history.id))
+        .where(_host_condition(host), history.id <= history_id, history.config.is_not(None))
+        .scalar_subquery()
+    )
+    statement = (
+        select(history)
+        .where(_host_condition(host), history.id >= latest_config_id, history.id <= history_id)
+        .order_by(history.id)
+    )
+    return list((await session.exec(statement)).scalars().all())
+
+
+def _state_after(rows: list[models.ConfigHistory]) -> ConfigState | None:
+    """
+    config of a host right after the last of `rows`, which start with the latest one with a whole config
+    """
+    if rows[-1].operation == ConfigChangeOperation.DELETE.value:
+        return None
+
+    state = dict(rows[0].config or {})
+    for row in rows[1:]:
+        for field, (_old, new) in (row.changes or {}).items():
+            state[field] = new
+    return state
+
+
+def _state_before(row: models.ConfigHistory, state_after: ConfigState | None) -> ConfigState | None:
+    match ConfigChangeOperation(row.operation):
+        case ConfigChangeOperation.CREATE:
+            return None
+        case ConfigChangeOperation.DELETE:
+            return row.config
+        case ConfigChangeOperation.UPDATE:
+            state = dict(state_after or {})
+            for field, (old, _new) in (row.changes or {}).items():
+                state[field] = old
+            return state
+
+
+async def record_config_change(
+    host_type: HostType,
+    previous: HostTemplateConfig | None,
+    current: HostTemplateConfig | None,
+    session: AsyncSession,
+) -> None:
+    """
+    appends a change of a host from `previous` to `current` to the history, in the transaction of the change. None is
+    a host which doesn't exist, and saving a host without changing anything is no change
+    """
+    config = current if current is not None else previous
+    if config is None:
+        return
+
+    host = (host_type, config.id)
+    before, after = config_state(previous), config_state(current)
+    changes = None
+
+    if before is None:
+        operation, whole_config = ConfigChangeOperation.CREATE, after
+    elif after is None:
+        operation, whole_config = ConfigChangeOperation.DELETE, before
+    else:
+        changes = diff_states(before, after)
+        if not changes:
+            return
+        operation, whole_config = ConfigChangeOperation.UPDATE, None
+
+        # changes since the latest whole config of the host, none if it is the first change of a host which existed
+        # before it had a history
+        history = models.ConfigHistory
+        latest_config_id = (
+            select(func.max(history.id)).where(_host_condition(host), history.config.is_not(None)).scalar_subquery()
+        )
+        statement = select(func.count()).where(_host_condition(host), history.id >= latest_config_id)
+        changes_since_config = (await session.exec(statement)).scalar_one()
+        if changes_since_config == 0 or changes_since_config >= settings.config_history_snapshot_interval:
+            whole_config = after
+
+    row = models.ConfigHistory(
+        host_type=host_type.value,
+        config_id=config.id,
+        operation=operation.value,
+        changes=changes,
+        config=whole_config,
+    )
+    # read in the insert, after the change has been flushed and triggers have incremented the revision
+    revision = select(models.ConfigRevision.revision).where(models.ConfigRevision.id == 1).scalar_subquery()
+    row.revision = func.coalesce(revision, 0)
+    session.add(row)
+    await session.flush()
+
+    # compaction keeps ids from the newest one minus `config_history_keep` on, ids skipped by the sequence count as
+    # changes so that it is still triggered when the id it would have been triggered at is never used
+    oldest_id = (await session.exec(select(func.min(models.ConfigHistory.id)))).scalar_one()
+    if row.id - oldest_id + 1 >= settings.config_history_keep + COMPACT_EVERY:
+        await compact_config_history(session)
+
+
+async def compact_config_history(session: AsyncSession, keep: int | None = None) -> int:
+    """
+    deletes all but the newest `keep` changes, `config_history_keep` by default. The oldest change kept of a host
+    gets its whole config, so that configs can still be rebuilt without the changes before it. Returns the number of
+    changes deleted
+    """
+    history = models.ConfigHistory
+    keep = keep or settings.config_history_keep
+
+    latest_id = (await session.exec(select(func.max(history.id)))).scalar_one()
+    if latest_id is None or latest_id <= keep:
+        return 0
+    oldest_kept_id = latest_id - keep + 1
+
+    oldest_kept = (
+        select(func.min(history.id).label("id"))
+        .where(history.id >= oldest_kept_id)
+        .group_by(history.host_type, history.config_id)
+        .subquery()
+    )
+    # creates and deletes always have whole configs
+    statement = select(history).join(oldest_kept, history.id == oldest_kept.c.id).where(history.config.is_(None))
+    for row in (await session.exec(statement)).scalars().all():
+        host = (HostType(row.host_type), row.config_id)
+        row.config = _state_after(await _read_rows_since_config(host, row.id, session))
+    await session.flush()
+
+    # clients which synced before the newest change deleted could miss it. Revisions grow with ids, so it is never
+    # older than the one of earlier compactions
+    statement = select(func.max(history.revision)).where(history.id < oldest_kept_id)
+    newest_deleted_revision = (await session.exec(statement)).scalar_one()
+    if newest_deleted_revision is not None:
+        await session.exec(
+            update(models.ConfigRevision)
+            .where(models.ConfigRevision.id == 1)
+            .values(oldest_sync_revision=newest_deleted_revision)
+        )
+
+    result = await session.exec(delete(history).where(history.id < oldest_kept_id))
+    return result.rowcount
+
+
+async def check_history_id(history_id: int, session: AsyncSession) -> int:
+    """
+    raises HistoryEntryNotFound unless configs can be rebuilt as they were right after change `history_id`, which
+    they can from the one before the oldest change kept on. 0 is before the first change. Returns the newest change
+    """
+    oldest_id, latest_id = (
+        await session.exec(select(func.min(models.ConfigHistory.id), func.max(models.ConfigHistory.id)))
+    ).one()
+    if latest_id is None:
+        # nothing changed yet, configs are the way they were before the first change
+        if history_id != 0:
+            raise exceptions.HistoryEntryNotFound(history_id)
+        return 0
+
+    if not oldest_id - 1 <= history_id <= latest_id:
+        raise exceptions.HistoryEntryNotFound(history_id)
+
+    return latest_id
+
+
+async def read_changes_between(
+    from_id: int, to_id: int, session: AsyncSession
+) -> dict[Host, tuple[ConfigState | None, ConfigState | None]]:
+    """
+    configs of hosts changed after `from_id` up to `to_id`, as they were right after each of them. None is a host
+    which didn't exist
+    """
+    history = models.ConfigHistory
+    statement = (
+        select(history.host_type, history.config_id, func.min(history.id), func.max(history.id))
+        .where(history.id > from_id, history.id <= to_id)
+        .group_by(history.host_type, history.config_id)
+        .order_by(func.min(history.id))
+    )
+
+    changes = {}
+    for host_type, config_id, first_id, last_id in (await session.exec(statement)).all():
+        host = (HostType(host_type), config_id)
+
+        first_rows = await _read_rows_since_config(host, first_id, session)
+        # configs before a change are the ones after it with old values of the fields it changed
+        before = _state_before(first_rows[-1], _state_after(first_rows))
+        last_rows = first_rows if last_id == first_id else await _read_rows_since_config(host, last_id, session)
+
+        changes[host] = (before, _state_after(last_rows))
+
+    return changes
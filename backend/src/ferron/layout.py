@@ -0,0 +1,248 @@
+import os
+import re
+import zlib
+from abc import ABC, abstractmethod
+
+import aiofiles
+from aiofiles import os as aiofiles_os
+
+from src.ferron.constants import ConfigLayoutType, HostType
+from src.ferron.files import remove_configs, write_configs_if_changed
+from src.ferron.registry import IncludeRegistry
+
+HostKey = tuple[HostType, int]
+
+_PER_HOST_FILE_NAME_PATTERN = re.compile(r"^(\d+)_(reverse_proxy|load_balancer|static_file)\.kdl$")
+_SHARD_FILE_NAME_PATTERN = re.compile(r"^shard_(\d+)\.kdl$")
+_MONOLITHIC_FILE_NAME = "hosts.kdl"
+
+# marks the start of a host's config in files holding the configs of several hosts
+_HOST_MARKER_PATTERN = re.compile(r"^// ferron-proxy-manager host (reverse_proxy|load_balancer|static_file) (\d+)$")
+
+
+def _host_marker(key: HostKey) -> str:
+    host_type, host_id = key
+    return f"// ferron-proxy-manager host {host_type.value} {host_id}"
+
+
+def _sort_key(key: HostKey) -> tuple[str, int]:
+    return key[0].value, key[1]
+
+
+def render_shared_file(sections: dict[HostKey, str]) -> str:
+    """
+    joins configs of several hosts into a single file, every config is preceded by a marker so that the file can be
+    parsed back with `parse_shared_file()`
+    """
+    parts = []
+    for key in sorted(sections, key=_sort_key):
+        text = sections[key]
+        if not text.endswith("\n"):
+            text += "\n"
+        parts.append(f"{_host_marker(key)}\n{text}")
+
+    return "".join(parts)
+
+
+def parse_shared_file(text: str) -> dict[HostKey, str]:
+    sections: dict[HostKey, str] = {}
+
+    key: HostKey | None = None
+    lines: list[str] = []
+    for line in text.splitlines(keepends=True):
+        match = _HOST_MARKER_PATTERN.match(line.rstrip("\n"))
+        if match is None:
+            # lines before the first marker don't belong to any host
+            if key is not None:
+                lines.append(line)
+            continue
+
+        if key is not None:
+            sections[key] = "".join(lines)
+        key = (HostType(match.group(1)), int(match.group(2)))
+        lines = []
+
+    if key is not None:
+        sections[key] = "".join(lines)
+
+    return sections
+
+
+class ConfigLayout(ABC):
+    """
+    how configs of hosts are laid out in files of the sub config directory, whose names are relative to it
+    """
+
+    layout_type: ConfigLayoutType
+    # whether a file can hold configs of more than one host, writing one host then needs configs of the others
+    shared_files: bool
+
+    @abstractmethod
+    def file_name(self, key: HostKey) -> str:
+        """
+        name of the file holding config of host `key`
+        """
+
+    @abstractmethod
+    def owns(self, file_name: str) -> bool:
+        """
+        whether `file_name` is a file this layout writes, regardless of its settings
+        """
+
+    @abstractmethod
+    def render_file(self, file_name: str, sections: dict[HostKey, str]) -> str:
+        """
+        content of `file_name` holding rendered configs of hosts in `sections`
+        """
+
+    @abstractmethod
+    def parse_file(self, file_name: str, text: str) -> dict[HostKey, str]:
+        """
+        rendered configs of hosts in `file_name`, reverse of `render_file()`
+        """
+
+
+class PerHostLayout(ConfigLayout):
+    """
+    one `{id}_{type}.kdl` file per host
+    """
+
+    layout_type = ConfigLayoutType.PER_HOST
+    shared_files = False
+
+    def file_name(self, key: HostKey) -> str:
+        host_type, host_id = key
+        return f"{host_id}_{host_type.value}.kdl"
+
+    def owns(self, file_name: str) -> bool:
+        return _PER_HOST_FILE_NAME_PATTERN.match(file_name) is not None
+
+    def render_file(self, file_name: str, sections: dict[HostKey, str]) -> str:
+        (text,) = sections.values()
+        return text
+
+    def parse_file(self, file_name: str, text: str) -> dict[HostKey, str]:
+        match = _PER_HOST_FILE_NAME_PATTERN.match(file_name)
+        if match is None:
+            return {}
+
+        return {(HostType(match.group(2)), int(match.group(1))): text}
+
+
+class ShardedLayout(ConfigLayout):
+    """
+    hosts are spread over `shard_count` `shard_{n}.kdl` files by a hash of their type and id, so changing a host
+    rewrites only its own shard while Ferron has just a few files to open on reload
+    """
+
+    layout_type = ConfigLayoutType.SHARDED
+    shared_files = True
+
+    def __init__(self, shard_count: int) -> None:
+        self.shard_count = shard_count
+
+    def file_name(self, key: HostKey) -> str:
+        host_type, host_id = key
+        # crc32 instead of hash() since hash() of strings changes between runs
+        shard = zlib.crc32(f"{host_type.value}:{host_id}".encode()) % self.shard_count
+        return f"shard_{shard}.kdl"
+
+    def owns(self, file_name: str) -> bool:
+        return _SHARD_FILE_NAME_PATTERN.match(file_name) is not None
+
+    def render_file(self, file_name: str, sections: dict[HostKey, str]) -> str:
+        return render_shared_file(sections)
+
+    def parse_file(self, file_name: str, text: str) -> dict[HostKey, str]:
+        return parse_shared_file(text)
+
+
+class MonolithicLayout(ConfigLayout):
+    """
+    configs of all hosts in a single `hosts.kdl` file
+    """
+
+    layout_type = ConfigLayoutType.MONOLITHIC
+    shared_files = True
+
+    def file_name(self, key: HostKey) -> str:
+        return _MONOLITHIC_FILE_NAME
+
+    def owns(self, file_name: str) -> bool:
+        return file_name == _MONOLITHIC_FILE_NAME
+
+    def render_file(self, file_name: str, sections: dict[HostKey, str]) -> str:
+        return render_shared_file(sections)
+
+    def parse_file(self, file_name: str, text: str) -> dict[HostKey, str]:
+        return parse_shared_file(text)
+
+
+def get_layout(layout_type: ConfigLayoutType, shard_count: int) -> ConfigLayout:
+    match layout_type:
+        case ConfigLayoutType.PER_HOST:
+            return PerHostLayout()
+        case ConfigLayoutType.SHARDED:
+            return ShardedLayout(shard_count)
+        case ConfigLayoutType.MONOLITHIC:
+            return MonolithicLayout()
+
+
+def owning_layout(file_name: str) -> ConfigLayout | None:
+    """
+    layout whose files are named like `file_name`, or None if it isn't a host config file
+    """
+    # shard count doesn't matter for recognizing and parsing files
+    for layout in (PerHostLayout(), ShardedLayout(1), MonolithicLayout()):
+        if layout.owns(file_name):
+            return layout
+
+    return None
+
+
+async def migrate_layout(layout: ConfigLayout, root: str, registry: IncludeRegistry) -> int:
+    """
+    moves configs of hosts found in files of any layout under `root` into the files `layout` expects them in. Files
+    left without hosts are removed along with their includes. Returns the number of hosts which were moved.
+
+    Must not run while the config writer is running.
+    """
+    files: dict[str, dict[HostKey, str]] = {}
+    for file_name in sorted(await aiofiles_os.listdir(root)):
+        source_layout = owning_layout(file_name)
+        if source_layout is None:
+            continue
+
+        async with aiofiles.open(os.path.join(root, file_name), "r") as f:
+            files[file_name] = source_layout.parse_file(file_name, await f.read())
+
+    target_files: dict[str, dict[HostKey, str]] = {}
+    moved_count = 0
+    for file_name, sections in files.items():
+        for key, text in sections.items():
+            target_file_name = layout.file_name(key)
+            target_files.setdefault(target_file_name, {})[key] = text
+            if target_file_name != file_name:
+                moved_count += 1
+
+    if moved_count == 0:
+        return 0
+
+    written_files = {
+        os.path.join(root, file_name): layout.render_file(file_name, sections)
+        for file_name, sections in target_files.items()
+    }
+    await write_configs_if_changed(written_files)
+    for path in written_files:
+        registry.add(path)
+
+    removed_paths = [os.path.join(root, file_name) for file_name in files if file_name not in target_files]
+    for path in removed_paths:
+        registry.remove(path)
+
+    # includes are removed before the files they point to, so that ferron never sees an include of a missing file
+    await registry.persist()
+
+    await remove_configs(removed_paths)
+
+    return moved_count
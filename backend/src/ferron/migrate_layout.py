@@ -0,0 +1,39 @@
+"""
+Moves host configs in the sub config directory to another layout while the app isn't running:
+
+    python -m src.ferron.migrate_layout sharded --shard-count 32
+
+Set CONFIG_LAYOUT (and CONFIG_LAYOUT_SHARD_COUNT) to the same layout before starting the app again, otherwise the
+configs are moved back to the configured layout on startup. Ferron has to be reloaded to pick up the moved configs.
+"""
+
+import argparse
+import asyncio
+
+from src.ferron.constants import SUB_CONFIG_PATH, ConfigFileLocation, ConfigLayoutType
+from src.ferron.layout import get_layout, migrate_layout
+from src.ferron.registry import IncludeRegistry
+
+
+async def main() -> None:
+    parser = argparse.ArgumentParser(description="Move host configs to another layout")
+    parser.add_argument("layout", choices=[layout_type.value for layout_type in ConfigLayoutType])
+    parser.add_argument("--shard-count", type=int, default=16, help="number of shard files of the sharded layout")
+    parser.add_argument("--root", default=SUB_CONFIG_PATH, help="sub config directory")
+    parser.add_argument("--main-config", default=ConfigFileLocation.MAIN_CONFIG.value, help="main config file")
+    args = parser.parse_args()
+
+    if args.shard_count < 1:
+        parser.error("--shard-count must be at least 1")
+
+    registry = IncludeRegistry(args.main_config)
+    await registry.load()
+
+    layout = get_layout(ConfigLayoutType(args.layout), args.shard_count)
+    moved_count = await migrate_layout(layout, args.root, registry)
+
+    print(f"Moved {moved_count} host configs to the {layout.layout_type.value} layout")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -1,7 +1,20 @@
+from datetime import datetime, timezone
 from typing import Any, List, Optional
 
 from pydantic import HttpUrl
-from sqlalchemy import Column, ForeignKey, Integer, String, TypeDecorator
+from sqlalchemy import (
+    JSON,
+    Column,
+    DateTime,
+    ForeignKey,
+    Index,
+    Integer,
+    String,
+    Text,
+    TypeDecorator,
+    column,
+    table,
+)
 from sqlalchemy.engine import Dialect
 from sqlmodel import Field, Relationship, SQLModel
 
@@ -57,6 +70,39 @@ class GlobalConfig(SQLModel, table=True):
     cache_max_entries: int = Field(default=DEFAULT_CACHE_MAX_ENTRIES)
 
 
+# single row, whose revision is incremented by triggers on every write to the other config tables, in the same
+# transaction as the write
+class ConfigRevision(SQLModel, table=True):
+    __tablename__ = "ferron_config_revision"
+
+    id: int = Field(default=None, primary_key=True)
+    revision: int = Field(default=0)
+    # changes since older revisions may have been compacted away from the history, so they can't be synced from
+    oldest_sync_revision: int = Field(default=0)
+
+
+# one change of a host's config. Rows are only appended, and compacted away once they are old. The config of a host
+# after a change is rebuilt from the latest of its rows with a whole config, applying new values of the rows after it
+class ConfigHistory(SQLModel, table=True):
+    __tablename__ = "ferron_config_history"
+    __table_args__ = (Index("ix_ferron_config_history_host", "host_type", "config_id", "id"),)
+
+    id: int = Field(default=None, primary_key=True)
+    host_type: str  # value of HostType
+    config_id: int
+    operation: str  # value of ConfigChangeOperation
+    # config revision when the change was made. Changes of a transaction may share it, but changes of later
+    # transactions always have greater ones
+    revision: int = Field(default=0, index=True)
+    # fields of updates which changed, as [old, new]
+    changes: Optional[dict[str, Any]] = Field(default=None, sa_column=Column(JSON(none_as_null=True)))
+    # whole config after creates and every few updates, and the config which was deleted for deletes
+    config: Optional[dict[str, Any]] = Field(default=None, sa_column=Column(JSON(none_as_null=True)))
+    created_at: datetime = Field(
+        default_factory=lambda: datetime.now(timezone.utc), sa_column=Column(DateTime(timezone=True), nullable=False)
+    )
+
+
 class VirtualHost(SQLModel, table=True):
     __tablename__ = "ferron_virtual_host"
 
@@ -84,12 +130,20 @@ class Cache(SQLModel):
     cache_max_age: int = Field(default=DEFAULT_CACHE_MAX_AGE)
 
 
-class StaticFileConfig(Cache, SQLModel, table=True):
+# config of a host as it was last rendered, stored with its row so that operations on all hosts read it instead of
+# rendering every host. Rows whose template_version isn't the current one are stale and rendered again when needed
+class RenderedConfig(SQLModel):
+    rendered_kdl: Optional[str] = Field(default=None, sa_type=Text)
+    rendered_hash: Optional[str] = Field(default=None)
+    template_version: Optional[str] = Field(default=None)
+
+
+class StaticFileConfig(Cache, RenderedConfig, SQLModel, table=True):
     __tablename__ = "ferron_static_file_config"
 
     id: int = Field(default=None, primary_key=True)
     virtual_host_id: int = Field(
-        sa_column=Column(Integer, ForeignKey("ferron_virtual_host.id", ondelete="CASCADE"), nullable=False)
+        sa_column=Column(Integer, ForeignKey("ferron_virtual_host.id", ondelete="CASCADE"), nullable=False, index=True)
     )
     virtual_host: VirtualHost = Relationship(
         back_populates="static_file_config",
@@ -112,12 +166,12 @@ class CommonReverseProxyConfig(Cache):
     preserve_host_header: bool = Field(default=DEFAULT_PRESERVE_HOST_HEADER)
 
 
-class ReverseProxyConfig(CommonReverseProxyConfig, SQLModel, table=True):
+class ReverseProxyConfig(CommonReverseProxyConfig, RenderedConfig, SQLModel, table=True):
     __tablename__ = "ferron_reverse_proxy_config"
 
     id: int = Field(default=None, primary_key=True)
     virtual_host_id: int = Field(
-        sa_column=Column(Integer, ForeignKey("ferron_virtual_host.id", ondelete="CASCADE"), nullable=False)
+        sa_column=Column(Integer, ForeignKey("ferron_virtual_host.id", ondelete="CASCADE"), nullable=False, index=True)
     )
     virtual_host: VirtualHost = Relationship(
         back_populates="reverse_proxy_config",
@@ -139,7 +193,7 @@ class LoadBalancerBackendURL(SQLModel, table=True):
 
     id: int = Field(default=None, primary_key=True)
     virtual_host_id: int = Field(
-        sa_column=Column(Integer, ForeignKey("ferron_virtual_host.id", ondelete="CASCADE"), nullable=False)
+        sa_column=Column(Integer, ForeignKey("ferron_virtual_host.id", ondelete="CASCADE"), nullable=False, index=True)
     )
     virtual_host: VirtualHost = Relationship(
         back_populates="load_balancer_backends",
@@ -148,19 +202,24 @@ class LoadBalancerBackendURL(SQLModel, table=True):
         sa_relationship_kwargs={"lazy": "selectin", "uselist": False},
     )
     used_in_load_balancer: int = Field(
-        sa_column=Column(Integer, ForeignKey("ferron_load_balancer_config.id", ondelete="CASCADE"), nullable=False)
+        sa_column=Column(
+            Integer, ForeignKey("ferron_load_balancer_config.id", ondelete="CASCADE"), nullable=False, index=True
+        )
     )
     backend_url: HttpUrl = Field(sa_type=HttpUrlType)
+    # order of the backend in its load balancer. Positions are spaced out, so that a backend can be inserted or moved
+    # without changing the positions of the others
+    position: int = Field(default=0)
 
     load_balancer_relationship: "LoadBalancerConfig" = Relationship(back_populates="backend_urls_relationship")
 
 
-class LoadBalancerConfig(CommonReverseProxyConfig, SQLModel, table=True):
+class LoadBalancerConfig(CommonReverseProxyConfig, RenderedConfig, SQLModel, table=True):
     __tablename__ = "ferron_load_balancer_config"
 
     id: int = Field(default=None, primary_key=True)
     virtual_host_id: int = Field(
-        sa_column=Column(Integer, ForeignKey("ferron_virtual_host.id", ondelete="CASCADE"), nullable=False)
+        sa_column=Column(Integer, ForeignKey("ferron_virtual_host.id", ondelete="CASCADE"), nullable=False, index=True)
     )
     virtual_host: VirtualHost = Relationship(
         back_populates="load_balancer_config",
@@ -170,7 +229,11 @@ class LoadBalancerConfig(CommonReverseProxyConfig, SQLModel, table=True):
     )
     backend_urls_relationship: List[LoadBalancerBackendURL] = Relationship(
         back_populates="load_balancer_relationship",
-        sa_relationship_kwargs={"cascade": "all, delete-orphan", "lazy": "selectin"},
+        sa_relationship_kwargs={
+            "cascade": "all, delete-orphan",
+            "lazy": "selectin",
+            "order_by": "(LoadBalancerBackendURL.position, LoadBalancerBackendURL.id)",
+        },
     )
     lb_health_check: bool = Field(default=DEFAULT_LB_HEALTH_CHECK)
     lb_health_check_max_fails: int = Field(default=DEFAULT_LB_HEALTH_CHECK_MAX_FAILS)
@@ -183,3 +246,17 @@ class LoadBalancerConfig(CommonReverseProxyConfig, SQLModel, table=True):
     @property
     def backend_urls(self) -> List[str]:
         return [backend.backend_url for backend in self.backend_urls_relationship]
+
+
+# FTS5 table with the trigram tokenizer that hosts are searched in, one row for every virtual host with the virtual
+# host's id as rowid. It is created along with the triggers that fill it by a migration, and isn't part of the
+# metadata since SQLModel can't create virtual tables. On PostgreSQL it is a regular table with pg_trgm indexes
+HOST_SEARCH_TABLE = "ferron_host_search"
+
+host_search = table(
+    HOST_SEARCH_TABLE,
+    column("rowid", Integer),
+    column("virtual_host_name", String),
+    # backend urls of reverse proxies and load balancers, or directory of static files, separated by spaces
+    column("backends", String),
+)
@@ -0,0 +1,240 @@
+import asyncio
+import time
+from collections.abc import AsyncIterator
+from dataclasses import dataclass
+
+from sqlalchemy import ColumnElement, bindparam, or_, select, update
+from sqlalchemy.orm import selectinload
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from src.config import settings
+from src.ferron import models, schemas
+from src.ferron.constants import ConfigFileLocation, HostType, TemplateType
+from src.ferron.files import hash_config
+from src.ferron.layout import HostKey
+from src.ferron.reload import reload_scheduler
+from src.ferron.utils import TEMPLATE_VERSION, HostTemplateConfig, render_host_config, render_template_sync
+from src.ferron.writer import WriteConfigFile, config_writer
+
+# number of rows fetched from the database at a time
+_STREAM_PARTITION_SIZE = 500
+
+_HOST_MODELS: tuple[tuple[HostType, type[models.RenderedConfig]], ...] = (
+    (HostType.REVERSE_PROXY, models.ReverseProxyConfig),
+    (HostType.LOAD_BALANCER, models.LoadBalancerConfig),
+    (HostType.STATIC_FILE, models.StaticFileConfig),
+)
+
+
+def _is_stale(model: type[models.RenderedConfig]) -> ColumnElement[bool]:
+    return or_(model.template_version.is_(None), model.template_version != TEMPLATE_VERSION)
+
+
+async def _stream_stored_configs(session: AsyncSession) -> AsyncIterator[list[tuple[HostKey, str, str]]]:
+    """
+    yields configs of hosts which were rendered by the current templates in partitions, as they were stored, with
+    their hashes
+    """
+    for host_type, model in _HOST_MODELS:
+        statement = select(model.id, model.rendered_kdl, model.rendered_hash).where(
+            model.template_version == TEMPLATE_VERSION
+        )
+        result = await session.stream(statement.execution_options(yield_per=_STREAM_PARTITION_SIZE))
+        async for partition in result.partitions():
+            yield [
+                ((host_type, config_id), rendered_kdl, rendered_hash)
+                for config_id, rendered_kdl, rendered_hash in partition
+            ]
+
+
+async def _stream_stale_host_configs(
+    session: AsyncSession,
+) -> AsyncIterator[list[tuple[HostType, HostTemplateConfig]]]:
+    """
+    yields configs of hosts which have to be rendered again in partitions, so that all rows never have to be held in
+    memory at once
+    """
+    host_queries = (
+        (
+            HostType.REVERSE_PROXY,
+            schemas.UpdateReverseProxyConfig,
+            select(models.ReverseProxyConfig)
+            .options(selectinload(models.ReverseProxyConfig.virtual_host))
+            .where(_is_stale(models.ReverseProxyConfig)),
+        ),
+        (
+            HostType.LOAD_BALANCER,
+            schemas.UpdateLoadBalancerConfig,
+            select(models.LoadBalancerConfig)
+            .options(
+                selectinload(models.LoadBalancerConfig.virtual_host),
+                selectinload(models.LoadBalancerConfig.backend_urls_relationship),
+            )
+            .where(_is_stale(models.LoadBalancerConfig)),
+        ),
+        (
+            HostType.STATIC_FILE,
+            schemas.UpdateStaticFileConfig,
+            select(models.StaticFileConfig)
+            .options(selectinload(models.StaticFileConfig.virtual_host))
+            .where(_is_stale(models.StaticFileConfig)),
+        ),
+    )
+
+    for host_type, schema, statement in host_queries:
+        result = await session.stream_scalars(statement.execution_options(yield_per=_STREAM_PARTITION_SIZE))
+        async for partition in result.partitions():
+            yield [(host_type, schema.model_validate(config, from_attributes=True)) for config in partition]
+            # rows already turned into schemas aren't needed by the session anymore
+            session.expunge_all()
+
+
+async def _store_rendered_configs(
+    rendered_hosts: dict[HostKey, str], hashes: dict[HostKey, str], session: AsyncSession
+) -> None:
+    """
+    stores configs of hosts rendered again, unless their rows were changed and rendered by a write in the meantime
+    """
+    for host_type, model in _HOST_MODELS:
+        table = model.__table__
+        parameters = [
+            {"config_id": key[1], "rendered_kdl": text, "rendered_hash": hashes[key]}
+            for key, text in rendered_hosts.items()
+            if key[0] == host_type
+        ]
+        if not parameters:
+            continue
+
+        statement = (
+            update(table)
+            .where(table.c.id == bindparam("config_id"), _is_stale(model))
+            .values(
+                rendered_kdl=bindparam("rendered_kdl"),
+                rendered_hash=bindparam("rendered_hash"),
+                template_version=TEMPLATE_VERSION,
+            )
+        )
+        await (await session.connection()).execute(statement, parameters)
+
+    await session.commit()
+
+
+@dataclass
+class RenderedConfigs:
+    hosts: dict[HostKey, str]
+    hashes: dict[HostKey, str]  # hashes of configs of `hosts`
+    # config files not belonging to a host, i.e. the global config
+    files: list[WriteConfigFile]
+    load_seconds: float
+    render_seconds: float
+    rendered_count: int  # number of hosts rendered again since their stored configs were stale
+
+
+def _render_partition(host_configs: list[tuple[HostType, HostTemplateConfig]]) -> tuple[dict[HostKey, str], float]:
+    start_time = time.perf_counter()
+    rendered_hosts = {
+        (host_type, host_config.id): render_host_config(host_type, host_config)
+        for host_type, host_config in host_configs
+    }
+    return rendered_hosts, time.perf_counter() - start_time
+
+
+async def render_all_configs(session: AsyncSession, store: bool = True) -> RenderedConfigs:
+    """
+    reads configs of the global config and every host in the database. Hosts are read as they were stored when they
+    were written, and only those rendered by templates of another version are rendered again, and stored if `store`.
+    Reads which must not change the database, like drift checks, don't store them. Partitions of them are rendered in
+    worker threads while the next ones are fetched, at most `reconcile_render_concurrency` at a time
+    """
+    load_seconds = 0.0
+    render_seconds = 0.0
+
+    files: list[WriteConfigFile] = []
+    global_config = (
+        await session.exec(select(models.GlobalConfig).where(models.GlobalConfig.id == 1))
+    ).scalar_one_or_none()
+    if global_config is not None:
+        rendered_global_config = render_template_sync(
+            TemplateType.GLOBAL_CONFIG, schemas.GlobalTemplateConfig.model_validate(global_config)
+        )
+        files.append(WriteConfigFile(ConfigFileLocation.GLOBAL_CONFIG.value, rendered_global_config))
+
+    hosts: dict[HostKey, str] = {}
+    hashes: dict[HostKey, str] = {}
+
+    phase_start_time = time.perf_counter()
+    async for stored_configs in _stream_stored_configs(session):
+        for key, rendered_kdl, rendered_hash in stored_configs:
+            hosts[key] = rendered_kdl
+            hashes[key] = rendered_hash
+
+    semaphore = asyncio.Semaphore(settings.reconcile_render_concurrency)
+    render_tasks: list[asyncio.Task[tuple[dict[HostKey, str], float]]] = []
+
+    async for host_configs in _stream_stale_host_configs(session):
+        load_seconds += time.perf_counter() - phase_start_time
+
+        # waits for a partition to be rendered before fetching more rows, so that unrendered rows don't pile up
+        await semaphore.acquire()
+        render_task = asyncio.create_task(asyncio.to_thread(_render_partition, host_configs))
+        render_task.add_done_callback(lambda _: semaphore.release())
+        render_tasks.append(render_task)
+
+        phase_start_time = time.perf_counter()
+    load_seconds += time.perf_counter() - phase_start_time
+
+    rendered_hosts: dict[HostKey, str] = {}
+    for partition_hosts, seconds in await asyncio.gather(*render_tasks):
+        rendered_hosts.update(partition_hosts)
+        render_seconds += seconds
+
+    if rendered_hosts:
+        rendered_hashes = {key: hash_config(text) for key, text in rendered_hosts.items()}
+        if store:
+            await _store_rendered_configs(rendered_hosts, rendered_hashes, session)
+        hosts.update(rendered_hosts)
+        hashes.update(rendered_hashes)
+
+    return RenderedConfigs(
+        hosts=hosts,
+        hashes=hashes,
+        files=files,
+        load_seconds=load_seconds,
+        render_seconds=render_seconds,
+        rendered_count=len(rendered_hosts),
+    )
+
+
+async def reconcile_configs(session: AsyncSession, wait_for_reload: bool = False) -> schemas.ReconcileResult:
+    """
+    regenerates every config file from the database. Files whose content is already right are left untouched, files
+    not belonging to any host are removed, the main config is rewritten at most once and Ferron is reloaded once if
+    anything changed
+    """
+    start_time = time.perf_counter()
+
+    rendered = await render_all_configs(session)
+
+    write_start_time = time.perf_counter()
+    replaced = await config_writer.replace_host_configs(rendered.hosts, rendered.files)
+
+    reload_start_time = time.perf_counter()
+    if replaced.changed:
+        await reload_scheduler.request_reload(wait=wait_for_reload)
+    end_time = time.perf_counter()
+
+    return schemas.ReconcileResult(
+        hosts=len(rendered.hosts),
+        hosts_rendered=rendered.rendered_count,
+        files_written=replaced.written_count,
+        files_unchanged=replaced.unchanged_count,
+        files_removed=replaced.removed_count,
+        reloaded=replaced.changed,
+        timings=schemas.ReconcileTimings(
+            load_ms=rendered.load_seconds * 1000,
+            render_ms=rendered.render_seconds * 1000,
+            write_ms=(reload_start_time - write_start_time) * 1000,
+            reload_ms=(end_time - reload_start_time) * 1000,
+            total_ms=(end_time - start_time) * 1000,
+        ),
+    )
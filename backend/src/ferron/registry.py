@@ -0,0 +1,147 @@
+import asyncio
+import contextlib
+from collections.abc import Iterator
+
+import aiofiles
+
+from src.ferron.constants import ConfigFileLocation
+from src.ferron.files import write_config_if_changed
+
+
+def include_line(path: str) -> str:
+    return f'include "{path}"'
+
+
+class IncludeRegistry:
+    """
+    in-memory copy of the include statements of the main config, loaded once at startup and written with
+    `persist()` once per batch of changes
+    """
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+
+        # dict is used as an ordered set so that includes keep the order in which they were added
+        self._included_paths: dict[str, None] = {}
+        # lines which aren't include statements are kept as they are, above the includes
+        self._other_lines: list[str] = []
+        self._dirty = False
+        self._persist_lock = asyncio.Lock()
+        # includes added (True) or removed (False) in the current `transaction()`
+        self._journal: list[tuple[str, bool]] | None = None
+
+    async def load(self) -> None:
+        try:
+            async with aiofiles.open(self.path, "r") as f:
+                text = await f.read()
+        except FileNotFoundError:
+            text = ""
+
+        self.load_text(text)
+
+    def load_text(self, text: str) -> None:
+        self._included_paths = {}
+        self._other_lines = []
+        for line in text.splitlines():
+            stripped_line = line.strip()
+            if stripped_line.startswith('include "') and stripped_line.endswith('"'):
+                self._included_paths[stripped_line.removeprefix('include "').removesuffix('"')] = None
+            elif stripped_line:
+                self._other_lines.append(line)
+
+        self._dirty = False
+
+    def __contains__(self, path: str) -> bool:
+        return path in self._included_paths
+
+    def __len__(self) -> int:
+        return len(self._included_paths)
+
+    def paths(self) -> list[str]:
+        return list(self._included_paths)
+
+    def add(self, path: str) -> bool:
+        """
+        returns whether the include was added, i.e. it wasn't already present
+        """
+        if path in self._included_paths:
+            return False
+
+        self._included_paths[path] = None
+        self._dirty = True
+        if self._journal is not None:
+            self._journal.append((path, True))
+        return True
+
+    def remove(self, path: str) -> bool:
+        """
+        returns whether the include was removed, i.e. it was present
+        """
+        if path not in self._included_paths:
+            return False
+
+        del self._included_paths[path]
+        self._dirty = True
+        if self._journal is not None:
+            self._journal.append((path, False))
+        return True
+
+    @contextlib.contextmanager
+    def transaction(self) -> Iterator[None]:
+        """
+        undoes includes added or removed in the block if it raises before they were persisted, so that a failed write
+        doesn't leave includes of files which weren't written
+        """
+        journal: list[tuple[str, bool]] = []
+        dirty = self._dirty
+        self._journal = journal
+        try:
+            yield
+        except BaseException:
+            if self._dirty:
+                for path, added in reversed(journal):
+                    if added:
+                        del self._included_paths[path]
+                    else:
+                        self._included_paths[path] = None
+                self._dirty = dirty
+            raise
+        finally:
+            self._journal = None
+
+    @property
+    def dirty(self) -> bool:
+        """
+        whether includes have changed since they were last persisted
+        """
+        return self._dirty
+
+    def mark_persisted(self) -> None:
+        """
+        marks includes as persisted, when they have been written somewhere else than the main config
+        """
+        self._dirty = False
+
+    def render(self) -> str:
+        lines = self._other_lines + [include_line(path) for path in self._included_paths]
+        return "".join(f"{line}\n" for line in lines)
+
+    async def persist(self) -> bool:
+        """
+        writes the main config if includes have changed since the last write. Returns whether the file was written
+        """
+        # the lock makes sure that an older state can't be written after a newer one
+        async with self._persist_lock:
+            if not self._dirty:
+                return False
+
+            # marked clean before awaiting so that changes made during the write mark it dirty again
+            self._dirty = False
+            try:
+                return await write_config_if_changed(self.path, self.render())
+            except BaseException:
+                self._dirty = True
+                raise
+
+
+include_registry = IncludeRegistry(ConfigFileLocation.MAIN_CONFIG.value)
@@ -0,0 +1,108 @@
+import asyncio
+import contextlib
+import logging
+from collections.abc import Awaitable, Callable
+
+from src.config import settings
+from src.ferron import schemas
+
+logger = logging.getLogger(__name__)
+
+ReloadFunc = Callable[[], Awaitable[None]]
+
+
+class ReloadScheduler:
+    """
+    coalesces reload requests into a single SIGHUP per window. The window starts with the first request after the
+    previous reload, so a steady stream of changes can't postpone the reload forever
+    """
+
+    def __init__(self, window_seconds: float) -> None:
+        self.window_seconds = window_seconds
+        self.requested_count = 0
+        self.issued_count = 0
+        self.failed_count = 0
+
+        self._reload_func: ReloadFunc | None = None
+        # resolved once the reload covering every request made before it has been issued
+        self._pending: asyncio.Future[None] | None = None
+        self._task: asyncio.Task[None] | None = None
+
+    def start(self, reload_func: ReloadFunc) -> None:
+        self._reload_func = reload_func
+
+    async def stop(self) -> None:
+        """
+        issues the pending reload right away, if there is one, so that no change is left unapplied on shutdown
+        """
+        task = self._task
+        if task is not None and not task.done():
+            if self._pending is not None:
+                # still inside the window, no need to wait for the rest of it
+                task.cancel()
+                with contextlib.suppress(asyncio.CancelledError):
+                    await task
+
+                await self._issue_reload()
+            else:
+                # the reload is already being issued
+                await task
+
+        self._reload_func = None
+
+    async def request_reload(self, wait: bool = False) -> None:
+        """
+        schedules a reload of Ferron. If `wait` is True, returns only after the reload has been issued and raises the
+        exception of a failed reload
+        """
+        if self._reload_func is None:
+            raise RuntimeError("Reload scheduler has not been started")
+
+        self.requested_count += 1
+
+        if self._pending is None:
+            self._pending = asyncio.get_running_loop().create_future()
+            self._task = asyncio.create_task(self._issue_reload_after_window())
+
+        pending = self._pending
+
+        if wait:
+            # shielded so that a cancelled request doesn't cancel the reload other requests are waiting on
+            await asyncio.shield(pending)
+
+    async def _issue_reload_after_window(self) -> None:
+        await asyncio.sleep(self.window_seconds)
+        await self._issue_reload()
+
+    async def _issue_reload(self) -> None:
+        pending = self._pending
+        # requests coming in while the reload is being issued start a new window, since their changes may have been
+        # written after Ferron has already re-read its config
+        self._pending = None
+
+        if pending is None or self._reload_func is None:
+            return
+
+        try:
+            await self._reload_func()
+        except Exception as e:
+            self.failed_count += 1
+            logger.error("Failed to reload Ferron: %s", e)
+            pending.set_exception(e)
+            # marks the exception as retrieved, callers which didn't wait for the reload won't ever retrieve it
+            pending.exception()
+        else:
+            self.issued_count += 1
+            pending.set_result(None)
+
+    def stats(self) -> schemas.ReloadStats:
+        return schemas.ReloadStats(
+            requested=self.requested_count,
+            issued=self.issued_count,
+            failed=self.failed_count,
+            pending=self._pending is not None,
+            window_ms=int(self.window_seconds * 1000),
+        )
+
+
+reload_scheduler = ReloadScheduler(window_seconds=settings.ferron_reload_window_ms / 1000)
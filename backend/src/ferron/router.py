@@ -1,19 +1,43 @@
+import asyncio
 from typing import Annotated
 
-from fastapi import APIRouter, Depends
+from fastapi import APIRouter, Depends, Query, Response
+from pydantic import HttpUrl
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from src.auth.dependencies import get_current_user
 from src.config import settings
 from src.database import get_session
 from src.exceptions import InvalidTokenException
-from src.ferron import schemas, service
+from src.ferron import reconcile, schemas, service
+from src.ferron.constants import (
+    DEFAULT_HISTORY_PAGE_SIZE,
+    DEFAULT_HOSTS_PAGE_SIZE,
+    MAX_HISTORY_PAGE_SIZE,
+    MAX_HOSTS_PAGE_SIZE,
+    MIN_SEARCH_QUERY_LENGTH,
+    HostSortKey,
+    HostType,
+    SortOrder,
+)
+from src.ferron.dependencies import check_config_revision
+from src.ferron.drift import drift_detector
 from src.ferron.exceptions import (
+    BatchOperationFailed,
+    ChangesNotAvailable,
     ConfigNotFound,
     FerronContainerNotFoundException,
+    GenerationNotFound,
+    GenerationsDisabled,
     GlobalConfigAlreadyExists,
+    HistoryEntryNotFound,
+    InvalidConfig,
+    InvalidCursor,
+    LoadBalancerBackendAlreadyExists,
     VirtualHostNameAlreadyExists,
 )
+from src.ferron.reload import reload_scheduler
+from src.ferron.writer import config_writer
 from src.utils import generate_error_response, merge_responses
 
 router = APIRouter(
@@ -26,7 +50,11 @@ router = APIRouter(
 )
 
 
-@router.get("/global", responses=generate_error_response(ConfigNotFound, "global configuration"))
+@router.get(
+    "/global",
+    responses=generate_error_response(ConfigNotFound, "global configuration"),
+    dependencies=[Depends(check_config_revision)],
+)
 async def read_global_config(session: Annotated[AsyncSession, Depends(get_session)]) -> schemas.GlobalTemplateConfig:
     config = await service.read_global_config(session)
     return config
@@ -36,13 +64,16 @@ async def read_global_config(session: Annotated[AsyncSession, Depends(get_sessio
     "/global",
     responses=merge_responses(
         generate_error_response(GlobalConfigAlreadyExists),
+        generate_error_response(InvalidConfig),
         generate_error_response(FerronContainerNotFoundException, settings.ferron_container_name),
     ),
 )
 async def create_global_config(
-    global_config_data: schemas.GlobalTemplateConfig, session: Annotated[AsyncSession, Depends(get_session)]
+    global_config_data: schemas.GlobalTemplateConfig,
+    session: Annotated[AsyncSession, Depends(get_session)],
+    wait_for_reload: bool = False,
 ) -> schemas.GlobalTemplateConfig:
-    config = await service.create_global_config(global_config_data, session)
+    config = await service.create_global_config(global_config_data, session, wait_for_reload)
     return config
 
 
@@ -50,13 +81,16 @@ async def create_global_config(
     "/global",
     responses=merge_responses(
         generate_error_response(ConfigNotFound, "global configuration"),
+        generate_error_response(InvalidConfig),
         generate_error_response(FerronContainerNotFoundException, settings.ferron_container_name),
     ),
 )
 async def update_global_config(
-    global_config_data: schemas.GlobalTemplateConfig, session: Annotated[AsyncSession, Depends(get_session)]
+    global_config_data: schemas.GlobalTemplateConfig,
+    session: Annotated[AsyncSession, Depends(get_session)],
+    wait_for_reload: bool = False,
 ) -> schemas.GlobalTemplateConfig:
-    config = await service.update_global_config(global_config_data, session)
+    config = await service.update_global_config(global_config_data, session, wait_for_reload)
     return config
 
 
@@ -64,14 +98,16 @@ async def update_global_config(
     "/reverse-proxy",
     responses=merge_responses(
         generate_error_response(VirtualHostNameAlreadyExists),
+        generate_error_response(InvalidConfig),
         generate_error_response(FerronContainerNotFoundException, settings.ferron_container_name),
     ),
 )
 async def create_reverse_proxy_config(
     create_reverse_proxy_config_data: schemas.CreateReverseProxyConfig,
     session: Annotated[AsyncSession, Depends(get_session)],
+    wait_for_reload: bool = False,
 ) -> schemas.UpdateReverseProxyConfig:
-    config = await service.create_reverse_proxy_config(create_reverse_proxy_config_data, session)
+    config = await service.create_reverse_proxy_config(create_reverse_proxy_config_data, session, wait_for_reload)
     return config
 
 
@@ -79,18 +115,24 @@ async def create_reverse_proxy_config(
     "/reverse-proxy",
     responses=merge_responses(
         generate_error_response(ConfigNotFound, "reverse proxy configuration"),
+        generate_error_response(InvalidConfig),
         generate_error_response(FerronContainerNotFoundException, settings.ferron_container_name),
     ),
 )
 async def update_reverse_proxy_config(
     update_reverse_proxy_config_data: schemas.UpdateReverseProxyConfig,
     session: Annotated[AsyncSession, Depends(get_session)],
+    wait_for_reload: bool = False,
 ) -> schemas.UpdateReverseProxyConfig:
-    config = await service.update_reverse_proxy_config(update_reverse_proxy_config_data, session)
+    config = await service.update_reverse_proxy_config(update_reverse_proxy_config_data, session, wait_for_reload)
     return config
 
 
-@router.get("/reverse-proxy", responses=generate_error_response(ConfigNotFound, "reverse proxy configuration"))
+@router.get(
+    "/reverse-proxy",
+    responses=generate_error_response(ConfigNotFound, "reverse proxy configuration"),
+    dependencies=[Depends(check_config_revision)],
+)
 async def read_reverse_proxy_config(
     reverse_proxy_id: int, session: Annotated[AsyncSession, Depends(get_session)]
 ) -> schemas.UpdateReverseProxyConfig:
@@ -100,11 +142,15 @@ async def read_reverse_proxy_config(
 
 @router.get(
     "/reverse-proxy/all",
+    response_model=list[schemas.UpdateReverseProxyConfig],
+    dependencies=[Depends(check_config_revision)],
 )
 async def read_all_reverse_proxy_config(
+    response: Response,
     session: Annotated[AsyncSession, Depends(get_session)],
-) -> list[schemas.UpdateReverseProxyConfig]:
-    return await service.read_all_reverse_proxy_config(session=session)
+) -> Response:
+    rows = await service.read_all_reverse_proxy_config(session=session)
+    return service.config_rows_response(rows, response.headers)
 
 
 @router.delete(
@@ -115,9 +161,11 @@ async def read_all_reverse_proxy_config(
     ),
 )
 async def delete_reverse_proxy_config(
-    reverse_proxy_id: int, session: Annotated[AsyncSession, Depends(get_session)]
+    reverse_proxy_id: int,
+    session: Annotated[AsyncSession, Depends(get_session)],
+    wait_for_reload: bool = False,
 ) -> schemas.UpdateReverseProxyConfig:
-    config = await service.delete_reverse_proxy_config(reverse_proxy_id, session)
+    config = await service.delete_reverse_proxy_config(reverse_proxy_id, session, wait_for_reload)
     return config
 
 
@@ -125,14 +173,16 @@ async def delete_reverse_proxy_config(
     "/load-balancer",
     responses=merge_responses(
         generate_error_response(VirtualHostNameAlreadyExists),
+        generate_error_response(InvalidConfig),
         generate_error_response(FerronContainerNotFoundException, settings.ferron_container_name),
     ),
 )
 async def create_load_balancer_config(
     create_load_balancer_config_data: schemas.CreateLoadBalancerConfig,
     session: Annotated[AsyncSession, Depends(get_session)],
+    wait_for_reload: bool = False,
 ) -> schemas.UpdateLoadBalancerConfig:
-    config = await service.create_load_balancer_config(create_load_balancer_config_data, session)
+    config = await service.create_load_balancer_config(create_load_balancer_config_data, session, wait_for_reload)
     return config
 
 
@@ -140,18 +190,24 @@ async def create_load_balancer_config(
     "/load-balancer",
     responses=merge_responses(
         generate_error_response(ConfigNotFound, "load balancer configuration"),
+        generate_error_response(InvalidConfig),
         generate_error_response(FerronContainerNotFoundException, settings.ferron_container_name),
     ),
 )
 async def update_load_balancer_config(
     update_load_balancer_config_data: schemas.UpdateLoadBalancerConfig,
     session: Annotated[AsyncSession, Depends(get_session)],
+    wait_for_reload: bool = False,
 ) -> schemas.UpdateLoadBalancerConfig:
-    config = await service.update_load_balancer_config(update_load_balancer_config_data, session)
+    config = await service.update_load_balancer_config(update_load_balancer_config_data, session, wait_for_reload)
     return config
 
 
-@router.get("/load-balancer", responses=generate_error_response(ConfigNotFound, "load balancer configuration"))
+@router.get(
+    "/load-balancer",
+    responses=generate_error_response(ConfigNotFound, "load balancer configuration"),
+    dependencies=[Depends(check_config_revision)],
+)
 async def read_load_balancer_config(
     load_balancer_id: int, session: Annotated[AsyncSession, Depends(get_session)]
 ) -> schemas.UpdateLoadBalancerConfig:
@@ -161,11 +217,15 @@ async def read_load_balancer_config(
 
 @router.get(
     "/load-balancer/all",
+    response_model=list[schemas.UpdateLoadBalancerConfig],
+    dependencies=[Depends(check_config_revision)],
 )
 async def read_all_load_balancer_config(
+    response: Response,
     session: Annotated[AsyncSession, Depends(get_session)],
-) -> list[schemas.UpdateLoadBalancerConfig]:
-    return await service.read_all_load_balancer_config(session=session)
+) -> Response:
+    rows = await service.read_all_load_balancer_config(session=session)
+    return service.config_rows_response(rows, response.headers)
 
 
 @router.delete(
@@ -176,9 +236,48 @@ async def read_all_load_balancer_config(
     ),
 )
 async def delete_load_balancer_config(
-    load_balancer_id: int, session: Annotated[AsyncSession, Depends(get_session)]
+    load_balancer_id: int,
+    session: Annotated[AsyncSession, Depends(get_session)],
+    wait_for_reload: bool = False,
 ) -> schemas.UpdateLoadBalancerConfig:
-    config = await service.delete_load_balancer_config(load_balancer_id, session)
+    config = await service.delete_load_balancer_config(load_balancer_id, session, wait_for_reload)
+    return config
+
+
+@router.post(
+    "/load-balancer/backend",
+    responses=merge_responses(
+        generate_error_response(ConfigNotFound, "load balancer configuration"),
+        generate_error_response(LoadBalancerBackendAlreadyExists),
+        generate_error_response(InvalidConfig),
+        generate_error_response(FerronContainerNotFoundException, settings.ferron_container_name),
+    ),
+)
+async def add_load_balancer_backend(
+    load_balancer_id: int,
+    backend: schemas.LoadBalancerBackend,
+    session: Annotated[AsyncSession, Depends(get_session)],
+    wait_for_reload: bool = False,
+) -> schemas.UpdateLoadBalancerConfig:
+    config = await service.add_load_balancer_backend(load_balancer_id, backend, session, wait_for_reload)
+    return config
+
+
+@router.delete(
+    "/load-balancer/backend",
+    responses=merge_responses(
+        generate_error_response(ConfigNotFound, "load balancer configuration or backend"),
+        generate_error_response(InvalidConfig),
+        generate_error_response(FerronContainerNotFoundException, settings.ferron_container_name),
+    ),
+)
+async def remove_load_balancer_backend(
+    load_balancer_id: int,
+    backend_url: HttpUrl,
+    session: Annotated[AsyncSession, Depends(get_session)],
+    wait_for_reload: bool = False,
+) -> schemas.UpdateLoadBalancerConfig:
+    config = await service.remove_load_balancer_backend(load_balancer_id, backend_url, session, wait_for_reload)
     return config
 
 
@@ -186,14 +285,16 @@ async def delete_load_balancer_config(
     "/static-file",
     responses=merge_responses(
         generate_error_response(VirtualHostNameAlreadyExists),
+        generate_error_response(InvalidConfig),
         generate_error_response(FerronContainerNotFoundException, settings.ferron_container_name),
     ),
 )
 async def create_static_file_config(
     create_static_file_config_data: schemas.CreateStaticFileConfig,
     session: Annotated[AsyncSession, Depends(get_session)],
+    wait_for_reload: bool = False,
 ) -> schemas.UpdateStaticFileConfig:
-    config = await service.create_static_file_config(create_static_file_config_data, session)
+    config = await service.create_static_file_config(create_static_file_config_data, session, wait_for_reload)
     return config
 
 
@@ -201,18 +302,24 @@ async def create_static_file_config(
     "/static-file",
     responses=merge_responses(
         generate_error_response(ConfigNotFound, "static file configuration"),
+        generate_error_response(InvalidConfig),
         generate_error_response(FerronContainerNotFoundException, settings.ferron_container_name),
     ),
 )
 async def update_static_file_config(
     update_static_file_config_data: schemas.UpdateStaticFileConfig,
     session: Annotated[AsyncSession, Depends(get_session)],
+    wait_for_reload: bool = False,
 ) -> schemas.UpdateStaticFileConfig:
-    config = await service.update_static_file_config(update_static_file_config_data, session)
+    config = await service.update_static_file_config(update_static_file_config_data, session, wait_for_reload)
     return config
 
 
-@router.get("/static-file", responses=generate_error_response(ConfigNotFound, "static file configuration"))
+@router.get(
+    "/static-file",
+    responses=generate_error_response(ConfigNotFound, "static file configuration"),
+    dependencies=[Depends(check_config_revision)],
+)
 async def read_static_file_config(
     static_file_id: int, session: Annotated[AsyncSession, Depends(get_session)]
 ) -> schemas.UpdateStaticFileConfig:
@@ -222,11 +329,15 @@ async def read_static_file_config(
 
 @router.get(
     "/static-file/all",
+    response_model=list[schemas.UpdateStaticFileConfig],
+    dependencies=[Depends(check_config_revision)],
 )
 async def read_all_static_file_config(
+    response: Response,
     session: Annotated[AsyncSession, Depends(get_session)],
-) -> list[schemas.UpdateStaticFileConfig]:
-    return await service.read_all_static_file_config(session=session)
+) -> Response:
+    rows = await service.read_all_static_file_config(session=session)
+    return service.config_rows_response(rows, response.headers)
 
 
 @router.delete(
@@ -237,7 +348,184 @@ async def read_all_static_file_config(
     ),
 )
 async def delete_static_file_config(
-    static_file_id: int, session: Annotated[AsyncSession, Depends(get_session)]
+    static_file_id: int,
+    session: Annotated[AsyncSession, Depends(get_session)],
+    wait_for_reload: bool = False,
 ) -> schemas.UpdateStaticFileConfig:
-    config = await service.delete_static_file_config(static_file_id, session)
+    config = await service.delete_static_file_config(static_file_id, session, wait_for_reload)
     return config
+
+
+@router.get(
+    "/hosts",
+    responses=generate_error_response(InvalidCursor),
+    dependencies=[Depends(check_config_revision)],
+)
+async def read_hosts(
+    session: Annotated[AsyncSession, Depends(get_session)],
+    host_type: Annotated[HostType | None, Query(alias="type")] = None,
+    name_prefix: str | None = None,
+    backend: str | None = None,
+    sort: HostSortKey = HostSortKey.NAME,
+    order: SortOrder = SortOrder.ASC,
+    limit: Annotated[int, Query(ge=1, le=MAX_HOSTS_PAGE_SIZE)] = DEFAULT_HOSTS_PAGE_SIZE,
+    cursor: str | None = None,
+) -> schemas.HostPage:
+    return await service.read_hosts(session, host_type, name_prefix, backend, sort, order, limit, cursor)
+
+
+@router.get(
+    "/search",
+    responses=generate_error_response(InvalidCursor),
+    dependencies=[Depends(check_config_revision)],
+)
+async def search_hosts(
+    query: Annotated[str, Query(min_length=MIN_SEARCH_QUERY_LENGTH)],
+    session: Annotated[AsyncSession, Depends(get_session)],
+    limit: Annotated[int, Query(ge=1, le=MAX_HOSTS_PAGE_SIZE)] = DEFAULT_HOSTS_PAGE_SIZE,
+    cursor: str | None = None,
+) -> schemas.HostPage:
+    return await service.search_hosts(query, session, limit, cursor)
+
+
+@router.post(
+    "/batch",
+    responses=merge_responses(
+        generate_error_response(BatchOperationFailed, 0, ConfigNotFound()),
+        generate_error_response(InvalidConfig),
+        generate_error_response(FerronContainerNotFoundException, settings.ferron_container_name),
+    ),
+)
+async def apply_config_batch(
+    batch_data: schemas.ConfigBatch,
+    session: Annotated[AsyncSession, Depends(get_session)],
+    wait_for_reload: bool = False,
+) -> schemas.ConfigBatchResult:
+    return await service.apply_config_batch(batch_data, session, wait_for_reload)
+
+
+@router.get(
+    "/changes",
+    responses=generate_error_response(ChangesNotAvailable),
+    dependencies=[Depends(check_config_revision)],
+)
+async def read_config_changes(
+    since: Annotated[int, Query(ge=0)],
+    session: Annotated[AsyncSession, Depends(get_session)],
+) -> schemas.ConfigChanges:
+    # deleted hosts are returned without their config, so mirrors can delete them too
+    return await service.read_config_changes(since, session)
+
+
+@router.get(
+    "/history",
+    responses=generate_error_response(InvalidCursor),
+    dependencies=[Depends(check_config_revision)],
+)
+async def read_config_history(
+    session: Annotated[AsyncSession, Depends(get_session)],
+    host_type: Annotated[HostType | None, Query(alias="type")] = None,
+    config_id: int | None = None,
+    limit: Annotated[int, Query(ge=1, le=MAX_HISTORY_PAGE_SIZE)] = DEFAULT_HISTORY_PAGE_SIZE,
+    cursor: str | None = None,
+) -> schemas.ConfigChangePage:
+    return await service.read_config_history(session, host_type, config_id, limit, cursor)
+
+
+@router.get(
+    "/history/diff",
+    responses=generate_error_response(HistoryEntryNotFound),
+    dependencies=[Depends(check_config_revision)],
+)
+async def diff_config_history(
+    from_id: Annotated[int, Query(ge=0)],
+    to_id: Annotated[int, Query(ge=0)],
+    session: Annotated[AsyncSession, Depends(get_session)],
+) -> schemas.ConfigHistoryDiff:
+    return await service.diff_config_history(from_id, to_id, session)
+
+
+@router.post(
+    "/history/rollback",
+    responses=merge_responses(
+        generate_error_response(HistoryEntryNotFound),
+        generate_error_response(BatchOperationFailed, 0, ConfigNotFound()),
+        generate_error_response(InvalidConfig),
+        generate_error_response(FerronContainerNotFoundException, settings.ferron_container_name),
+    ),
+)
+async def rollback_config_history(
+    history_id: Annotated[int, Query(ge=0)],
+    session: Annotated[AsyncSession, Depends(get_session)],
+    wait_for_reload: bool = False,
+) -> schemas.ConfigBatchResult:
+    # hosts are rolled back to how they were right after change `history_id`
+    return await service.rollback_config_history(history_id, session, wait_for_reload)
+
+
+@router.get("/reload/stats")
+async def read_reload_stats() -> schemas.ReloadStats:
+    return reload_scheduler.stats()
+
+
+@router.post(
+    "/reconcile",
+    responses=merge_responses(
+        generate_error_response(InvalidConfig),
+        generate_error_response(FerronContainerNotFoundException, settings.ferron_container_name),
+    ),
+)
+async def reconcile_configs(
+    session: Annotated[AsyncSession, Depends(get_session)],
+    wait_for_reload: bool = False,
+) -> schemas.ReconcileResult:
+    return await reconcile.reconcile_configs(session, wait_for_reload)
+
+
+@router.get("/drift")
+async def read_config_drift(scan: bool = False) -> schemas.DriftReport:
+    # report of the last periodic check is returned unless a check is asked for or none has been made yet
+    if scan or drift_detector.last_report is None:
+        return await drift_detector.check(repair=False)
+
+    return drift_detector.last_report
+
+
+@router.post(
+    "/drift/repair",
+    responses=merge_responses(
+        generate_error_response(InvalidConfig),
+        generate_error_response(FerronContainerNotFoundException, settings.ferron_container_name),
+    ),
+)
+async def repair_config_drift() -> schemas.DriftReport:
+    return await drift_detector.check(repair=True)
+
+
+@router.get("/generations", responses=generate_error_response(GenerationsDisabled))
+async def read_config_generations() -> schemas.ConfigGenerations:
+    generations = config_writer.generations
+    if generations is None:
+        raise GenerationsDisabled()
+
+    return schemas.ConfigGenerations(
+        current=generations.current, generations=await asyncio.to_thread(generations.generations)
+    )
+
+
+@router.post(
+    "/generations/rollback",
+    responses=merge_responses(
+        generate_error_response(GenerationsDisabled),
+        generate_error_response(GenerationNotFound),
+        generate_error_response(FerronContainerNotFoundException, settings.ferron_container_name),
+    ),
+)
+async def rollback_config_generation(
+    generation: int | None = None, wait_for_reload: bool = False
+) -> schemas.ConfigGenerations:
+    # files are left as they were in the generation until they are reconciled with the database
+    await config_writer.rollback_generation(generation)
+    await reload_scheduler.request_reload(wait=wait_for_reload)
+
+    return await read_config_generations()
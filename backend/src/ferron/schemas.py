@@ -1,4 +1,6 @@
+from datetime import datetime
 from pathlib import Path
+from typing import Annotated, Any, Literal
 
 from pydantic import BaseModel, ConfigDict, Field, HttpUrl, ValidationInfo, field_validator
 from pydantic_extra_types.domain import DomainStr
@@ -22,6 +24,9 @@ from src.ferron.constants import (
     DEFAULT_TIMEOUT,
     DEFAULT_USE_SPA,
     DEFAULT_USE_UNIX_SOCKET,
+    MAX_BATCH_OPERATIONS,
+    ConfigChangeOperation,
+    HostType,
 )
 
 
@@ -102,6 +107,10 @@ class UpdateLoadBalancerConfig(CreateLoadBalancerConfig):
     id: int
 
 
+class LoadBalancerBackend(BaseModel):
+    backend_url: HttpUrl
+
+
 class CreateStaticFileConfig(BaseVirtualHost, Cache):
     static_files_dir: str
     use_spa: bool = DEFAULT_USE_SPA
@@ -128,3 +137,173 @@ class CreateStaticFileConfig(BaseVirtualHost, Cache):
 
 class UpdateStaticFileConfig(CreateStaticFileConfig):
     id: int
+
+
+class CreateReverseProxyOperation(BaseModel):
+    op: Literal["create_reverse_proxy"]
+    config: CreateReverseProxyConfig
+
+
+class UpdateReverseProxyOperation(BaseModel):
+    op: Literal["update_reverse_proxy"]
+    config: UpdateReverseProxyConfig
+
+
+class DeleteReverseProxyOperation(BaseModel):
+    op: Literal["delete_reverse_proxy"]
+    id: int
+
+
+class CreateLoadBalancerOperation(BaseModel):
+    op: Literal["create_load_balancer"]
+    config: CreateLoadBalancerConfig
+
+
+class UpdateLoadBalancerOperation(BaseModel):
+    op: Literal["update_load_balancer"]
+    config: UpdateLoadBalancerConfig
+
+
+class DeleteLoadBalancerOperation(BaseModel):
+    op: Literal["delete_load_balancer"]
+    id: int
+
+
+class CreateStaticFileOperation(BaseModel):
+    op: Literal["create_static_file"]
+    config: CreateStaticFileConfig
+
+
+class UpdateStaticFileOperation(BaseModel):
+    op: Literal["update_static_file"]
+    config: UpdateStaticFileConfig
+
+
+class DeleteStaticFileOperation(BaseModel):
+    op: Literal["delete_static_file"]
+    id: int
+
+
+BatchOperation = Annotated[
+    CreateReverseProxyOperation
+    | UpdateReverseProxyOperation
+    | DeleteReverseProxyOperation
+    | CreateLoadBalancerOperation
+    | UpdateLoadBalancerOperation
+    | DeleteLoadBalancerOperation
+    | CreateStaticFileOperation
+    | UpdateStaticFileOperation
+    | DeleteStaticFileOperation,
+    Field(discriminator="op"),
+]
+
+
+class ConfigBatch(BaseModel):
+    # operations are applied in order, in a single transaction
+    operations: list[BatchOperation] = Field(min_length=1, max_length=MAX_BATCH_OPERATIONS)
+
+
+class BatchOperationResult(BaseModel):
+    op: str
+    # for delete operations this is the configuration as it was before deletion
+    config: UpdateReverseProxyConfig | UpdateLoadBalancerConfig | UpdateStaticFileConfig
+
+
+class ConfigBatchResult(BaseModel):
+    results: list[BatchOperationResult]
+
+
+class ReloadStats(BaseModel):
+    requested: int  # number of reloads requested by config changes
+    issued: int  # number of reloads actually sent to ferron
+    failed: int
+    pending: bool
+    window_ms: int
+
+
+class ReconcileTimings(BaseModel):
+    load_ms: float  # streaming rows from the database
+    render_ms: float  # rendering in worker threads, overlaps with loading
+    write_ms: float  # writing changed files and the main config
+    reload_ms: float
+    total_ms: float
+
+
+class ReconcileResult(BaseModel):
+    hosts: int  # number of hosts read from the database
+    hosts_rendered: int  # number of them whose stored configs were rendered by other templates and were rendered again
+    files_written: int
+    files_unchanged: int
+    files_removed: int
+    reloaded: bool  # whether a reload was requested, which happens only if any file was changed
+    timings: ReconcileTimings
+
+
+class DriftReport(BaseModel):
+    checked_at: datetime
+    has_drift: bool
+    modified: list[str]  # files whose content differs from their rendered config, e.g. edited by hand
+    missing: list[str]  # files of hosts which don't exist on disk
+    orphaned: list[str]  # host config files on disk which don't belong to any host
+    dangling_includes: list[str]  # includes in the main config of files which don't belong to any host
+    main_config_modified: bool  # main config differs from its includes
+    files_checked: int
+    repaired: bool  # whether drift was repaired by regenerating config files
+
+
+class ConfigGenerations(BaseModel):
+    current: int | None  # generation ferron is configured with
+    generations: list[int]  # generations which can be rolled back to, oldest first
+
+
+class HostSummary(BaseModel):
+    type: HostType
+    id: int  # id of the host's config, the one endpoints of its type take
+    virtual_host_name: str
+    backend_urls: list[str]  # empty for static file hosts
+    static_files_dir: str | None  # None unless it's a static file host
+
+
+class HostPage(BaseModel):
+    items: list[HostSummary]
+    total: int  # number of hosts matching the filters, on all pages
+    next_cursor: str | None  # passed as `cursor` to get the next page, None on the last page
+
+
+class ConfigChange(BaseModel):
+    id: int  # id of the change in the history, the one diffs and rollbacks take
+    host_type: HostType
+    config_id: int  # id of the host's config, the one endpoints of its type take
+    operation: ConfigChangeOperation
+    changes: dict[str, tuple[Any, Any]]  # fields which changed as (old, new), all of them for creates and deletes
+    created_at: datetime
+
+
+class ConfigChangePage(BaseModel):
+    items: list[ConfigChange]  # newest first
+    next_cursor: str | None  # passed as `cursor` to get the next page, None on the last page
+
+
+class HostConfigDiff(BaseModel):
+    host_type: HostType
+    config_id: int
+    operation: ConfigChangeOperation  # create if the host didn't exist before, delete if it doesn't exist after
+    changes: dict[str, tuple[Any, Any]]
+
+
+class ConfigHistoryDiff(BaseModel):
+    from_id: int
+    to_id: int
+    hosts: list[HostConfigDiff]  # hosts whose configs differ between the two
+
+
+class HostChange(BaseModel):
+    host_type: HostType
+    config_id: int
+    deleted: bool
+    config: UpdateReverseProxyConfig | UpdateLoadBalancerConfig | UpdateStaticFileConfig | None  # None if deleted
+
+
+class ConfigChanges(BaseModel):
+    revision: int  # passed as `since` to get the changes made after these
+    hosts: list[HostChange]  # hosts created, updated or deleted since the revision, as they are now
@@ -1,19 +1,59 @@
-from typing import Annotated
+import base64
+import bisect
+import json
+from collections import defaultdict, deque
+from collections.abc import Mapping, Sequence
+from typing import Annotated, Any
 
 import sqlalchemy.exc
-from fastapi import Depends
-from sqlalchemy import select
+from fastapi import Depends, Response
+from pydantic import HttpUrl, TypeAdapter
+from sqlalchemy import (
+    ColumnElement,
+    Integer,
+    Row,
+    Select,
+    String,
+    and_,
+    cast,
+    delete,
+    exists,
+    func,
+    insert,
+    literal_column,
+    null,
+    or_,
+    select,
+    true,
+    type_coerce,
+    update,
+)
 from sqlalchemy.orm import selectinload
+from sqlmodel import SQLModel
 from sqlmodel.ext.asyncio.session import AsyncSession
 
 from src.database import get_session
-from src.ferron import exceptions, models, schemas
+from src.ferron import exceptions, history, models, schemas
+from src.ferron.constants import (
+    DEFAULT_HISTORY_PAGE_SIZE,
+    DEFAULT_HOSTS_PAGE_SIZE,
+    LOAD_BALANCER_BACKEND_POSITION_STEP,
+    ConfigChangeOperation,
+    HostSortKey,
+    HostType,
+    SortOrder,
+)
 from src.ferron.exceptions import VirtualHostNameAlreadyExists
+from src.ferron.files import hash_config
+from src.ferron.reload import reload_scheduler
 from src.ferron.utils import (
+    TEMPLATE_VERSION,
+    HostTemplateConfig,
     delete_load_balancer_config_from_file,
     delete_reverse_proxy_config_from_file,
     delete_static_file_config_from_file,
-    reload_ferron_service,
+    render_host_config,
+    update_host_configs_in_files,
     write_global_config_to_file,
     write_load_balancer_config_to_file,
     write_reverse_proxy_config_to_file,
@@ -33,9 +73,94 @@ def _static_file_to_schema(config: models.StaticFileConfig) -> schemas.UpdateSta
     return schemas.UpdateStaticFileConfig.model_validate(config, from_attributes=True)
 
 
+_HOST_MODELS: dict[HostType, type[models.RenderedConfig]] = {
+    HostType.REVERSE_PROXY: models.ReverseProxyConfig,
+    HostType.LOAD_BALANCER: models.LoadBalancerConfig,
+    HostType.STATIC_FILE: models.StaticFileConfig,
+}
+
+
+def _store_rendered_config(
+    config: models.RenderedConfig, host_type: HostType, config_schema: HostTemplateConfig
+) -> str:
+    """
+    stores the config of a host rendered from `config_schema` with its row, in the transaction of the change. Returns
+    the rendered config
+    """
+    rendered_kdl = render_host_config(host_type, config_schema)
+    config.rendered_kdl = rendered_kdl
+    config.rendered_hash = hash_config(rendered_kdl)
+    config.template_version = TEMPLATE_VERSION
+    return rendered_kdl
+
+
+async def _read_rendered_config(host_type: HostType, host_id: int, session: AsyncSession) -> str:
+    """
+    rendered config a host was stored with by `_store_rendered_config()`, so that files are written without rendering
+    it again. The row is usually still in the session and isn't read from the db
+    """
+    config = await session.get(_HOST_MODELS[host_type], host_id)
+    return config.rendered_kdl
+
+
+# backend urls are read as strings, HttpUrlType can't convert NULLs of outer joins
+_reverse_proxy_backend_url = type_coerce(models.ReverseProxyConfig.backend_url, String)
+_load_balancer_backend_url = type_coerce(models.LoadBalancerBackendURL.backend_url, String)
+
+# config lists are serialized from rows as they are read. Values in the database were validated when they were written,
+# validating them into schemas again on the way out costs more than reading them
+_CONFIG_ROWS_ADAPTER = TypeAdapter(list[dict[str, Any]])
+_BATCH_OPERATION_ADAPTER: TypeAdapter[schemas.BatchOperation] = TypeAdapter(schemas.BatchOperation)
+
+
+def config_rows_response(rows: list[dict[str, Any]], headers: Mapping[str, str] | None = None) -> Response:
+    """
+    `headers` are the ones dependencies set, e.g. the ETag, since they are only added to responses FastAPI creates
+    """
+    return Response(
+        content=_CONFIG_ROWS_ADAPTER.dump_json(rows), media_type="application/json", headers=dict(headers or {})
+    )
+
+
+def _config_columns(schema: type[schemas.TemplateConfig], model: type[SQLModel]) -> list[ColumnElement[Any]]:
+    """
+    columns of `model` named and ordered like the fields of `schema`, so that rows serialize the way the schema does
+    """
+    columns = []
+    for name in schema.model_fields:
+        if name == "virtual_host_name":
+            column = models.VirtualHost.virtual_host_name
+        elif name == "backend_urls":
+            # backends of load balancers are read by a query of their own
+            column = null()
+        else:
+            column = getattr(model, name)
+            if isinstance(column.type, models.HttpUrlType):
+                # urls were stored as strings of HttpUrl, so they are read as the strings they serialize to
+                column = type_coerce(column, String)
+        columns.append(column.label(name))
+
+    return columns
+
+
+async def _read_all_config_rows(
+    schema: type[schemas.TemplateConfig], model: type[SQLModel], session: AsyncSession
+) -> list[dict[str, Any]]:
+    statement = (
+        select(*_config_columns(schema, model))
+        .select_from(model)
+        .join(models.VirtualHost, models.VirtualHost.id == model.virtual_host_id)
+        .order_by(model.id)
+    )
+
+    result = await session.exec(statement)
+    return [dict(row) for row in result.mappings()]
+
+
 async def create_global_config(
     global_config_data: schemas.GlobalTemplateConfig,
     session: Annotated[AsyncSession, Depends(get_session)],
+    wait_for_reload: bool = False,
 ) -> schemas.GlobalTemplateConfig:
     try:
         _existing_config = await read_global_config(session)
@@ -52,7 +177,7 @@ async def create_global_config(
 
         global_config_schema = schemas.GlobalTemplateConfig.model_validate(global_config)
 
-        await reload_ferron_service()
+        await reload_scheduler.request_reload(wait=wait_for_reload)
 
         return global_config_schema
     else:
@@ -60,7 +185,9 @@ async def create_global_config(
 
 
 async def update_global_config(
-    global_config_data: schemas.GlobalTemplateConfig, session: Annotated[AsyncSession, Depends(get_session)]
+    global_config_data: schemas.GlobalTemplateConfig,
+    session: Annotated[AsyncSession, Depends(get_session)],
+    wait_for_reload: bool = False,
 ) -> schemas.GlobalTemplateConfig:
     statement = select(models.GlobalConfig).where(models.GlobalConfig.id == 1)
     result = await session.exec(statement)
@@ -74,15 +201,27 @@ async def update_global_config(
         setattr(existing_config, field, value)
 
     existing_config_schema = schemas.GlobalTemplateConfig.model_validate(existing_config)
-    await write_global_config_to_file(existing_config_schema)
+    changed = await write_global_config_to_file(existing_config_schema)
 
     await session.commit()
 
-    await reload_ferron_service()
+    # saving a configuration without changing anything doesn't need a reload
+    if changed:
+        await reload_scheduler.request_reload(wait=wait_for_reload)
 
     return existing_config_schema
 
 
+async def read_config_revision(session: Annotated[AsyncSession, Depends(get_session)]) -> int:
+    """
+    revision of the config in the database, it changes with every committed write
+    """
+    statement = select(models.ConfigRevision.revision).where(models.ConfigRevision.id == 1)
+
+    result = await session.exec(statement)
+    return result.scalar_one_or_none() or 0
+
+
 async def read_global_config(session: Annotated[AsyncSession, Depends(get_session)]) -> schemas.GlobalTemplateConfig:
     statement = select(models.GlobalConfig).where(models.GlobalConfig.id == 1)
 
@@ -96,9 +235,8 @@ async def read_global_config(session: Annotated[AsyncSession, Depends(get_sessio
     return config_schema
 
 
-async def create_reverse_proxy_config(
-    create_reverse_proxy_config_data: schemas.CreateReverseProxyConfig,
-    session: Annotated[AsyncSession, Depends(get_session)],
+async def _create_reverse_proxy_config_record(
+    create_reverse_proxy_config_data: schemas.CreateReverseProxyConfig, session: AsyncSession
 ) -> schemas.UpdateReverseProxyConfig:
     existing_virtual_host_stmt = select(models.VirtualHost).where(
         models.VirtualHost.virtual_host_name == create_reverse_proxy_config_data.virtual_host_name
@@ -123,19 +261,34 @@ async def create_reverse_proxy_config(
     except sqlalchemy.exc.IntegrityError:
         raise VirtualHostNameAlreadyExists(virtual_host_name=create_reverse_proxy_config_data.virtual_host_name)
 
-    reverse_proxy_config_schema = _reverse_proxy_to_schema(reverse_proxy_config)
+    config_schema = _reverse_proxy_to_schema(reverse_proxy_config)
+    _store_rendered_config(reverse_proxy_config, HostType.REVERSE_PROXY, config_schema)
+    await history.record_config_change(HostType.REVERSE_PROXY, None, config_schema, session)
+
+    return config_schema
+
+
+async def create_reverse_proxy_config(
+    create_reverse_proxy_config_data: schemas.CreateReverseProxyConfig,
+    session: Annotated[AsyncSession, Depends(get_session)],
+    wait_for_reload: bool = False,
+) -> schemas.UpdateReverseProxyConfig:
+    reverse_proxy_config_schema = await _create_reverse_proxy_config_record(create_reverse_proxy_config_data, session)
 
-    await write_reverse_proxy_config_to_file(reverse_proxy_config_schema)
+    await write_reverse_proxy_config_to_file(
+        reverse_proxy_config_schema.id,
+        await _read_rendered_config(HostType.REVERSE_PROXY, reverse_proxy_config_schema.id, session),
+    )
 
     await session.commit()
 
-    await reload_ferron_service()
+    await reload_scheduler.request_reload(wait=wait_for_reload)
 
     return reverse_proxy_config_schema
 
 
-async def update_reverse_proxy_config(
-    reverse_proxy_config_data: schemas.UpdateReverseProxyConfig, session: Annotated[AsyncSession, Depends(get_session)]
+async def _update_reverse_proxy_config_record(
+    reverse_proxy_config_data: schemas.UpdateReverseProxyConfig, session: AsyncSession
 ) -> schemas.UpdateReverseProxyConfig:
     # have to do this to check if id specified in reverse_proxy_config_data exists
     statement = (
@@ -153,6 +306,8 @@ async def update_reverse_proxy_config(
     if not existing_config.virtual_host:
         raise exceptions.ConfigNotFound(config_type="reverse proxy configuration")
 
+    previous_config_schema = _reverse_proxy_to_schema(existing_config)
+
     if reverse_proxy_config_data.virtual_host_name != existing_config.virtual_host.virtual_host_name:
         conflicting_virtual_host_stmt = select(models.VirtualHost).where(
             models.VirtualHost.virtual_host_name == reverse_proxy_config_data.virtual_host_name
@@ -173,12 +328,29 @@ async def update_reverse_proxy_config(
     except sqlalchemy.exc.IntegrityError:
         raise VirtualHostNameAlreadyExists(virtual_host_name=reverse_proxy_config_data.virtual_host_name)
 
-    existing_config_schema = _reverse_proxy_to_schema(existing_config)
-    await write_reverse_proxy_config_to_file(existing_config_schema)
+    config_schema = _reverse_proxy_to_schema(existing_config)
+    _store_rendered_config(existing_config, HostType.REVERSE_PROXY, config_schema)
+    await history.record_config_change(HostType.REVERSE_PROXY, previous_config_schema, config_schema, session)
+
+    return config_schema
+
+
+async def update_reverse_proxy_config(
+    reverse_proxy_config_data: schemas.UpdateReverseProxyConfig,
+    session: Annotated[AsyncSession, Depends(get_session)],
+    wait_for_reload: bool = False,
+) -> schemas.UpdateReverseProxyConfig:
+    existing_config_schema = await _update_reverse_proxy_config_record(reverse_proxy_config_data, session)
+    changed = await write_reverse_proxy_config_to_file(
+        existing_config_schema.id,
+        await _read_rendered_config(HostType.REVERSE_PROXY, existing_config_schema.id, session),
+    )
 
     await session.commit()
 
-    await reload_ferron_service()
+    # saving a configuration without changing anything doesn't need a reload
+    if changed:
+        await reload_scheduler.request_reload(wait=wait_for_reload)
 
     return existing_config_schema
 
@@ -205,17 +377,15 @@ async def read_reverse_proxy_config(
 
 async def read_all_reverse_proxy_config(
     session: Annotated[AsyncSession, Depends(get_session)],
-) -> list[schemas.UpdateReverseProxyConfig]:
-    statement = select(models.ReverseProxyConfig).options(selectinload(models.ReverseProxyConfig.virtual_host))
-
-    result = await session.exec(statement)
-    configs = result.scalars().all()
+) -> list[dict[str, Any]]:
+    """
+    every reverse proxy config, as rows with the fields of UpdateReverseProxyConfig
+    """
+    return await _read_all_config_rows(schemas.UpdateReverseProxyConfig, models.ReverseProxyConfig, session)
 
-    return [_reverse_proxy_to_schema(config) for config in configs]
 
-
-async def delete_reverse_proxy_config(
-    reverse_proxy_id: int, session: Annotated[AsyncSession, Depends(get_session)]
+async def _delete_reverse_proxy_config_record(
+    reverse_proxy_id: int, session: AsyncSession
 ) -> schemas.UpdateReverseProxyConfig:
     statement = (
         select(models.ReverseProxyConfig)
@@ -231,23 +401,172 @@ async def delete_reverse_proxy_config(
     if not config:
         raise exceptions.ConfigNotFound(config_type="reverse proxy configuration")
 
+    # schema is built before deleting since the virtual host can't be loaded afterwards
+    config_schema = _reverse_proxy_to_schema(config)
+
     if config.virtual_host:
         await session.delete(config.virtual_host)
     else:
         await session.delete(config)
 
-    # delete config file only after successfully deleted from db
-    await session.commit()
+    await session.flush()
+    await history.record_config_change(HostType.REVERSE_PROXY, config_schema, None, session)
+
+    return config_schema
+
+
+async def delete_reverse_proxy_config(
+    reverse_proxy_id: int,
+    session: Annotated[AsyncSession, Depends(get_session)],
+    wait_for_reload: bool = False,
+) -> schemas.UpdateReverseProxyConfig:
+    config_schema = await _delete_reverse_proxy_config_record(reverse_proxy_id, session)
+
+    # the row is deleted and flushed before the file is removed, and only committed once the file is gone
     await delete_reverse_proxy_config_from_file(reverse_proxy_id)
+    await session.commit()
 
-    await reload_ferron_service()
+    await reload_scheduler.request_reload(wait=wait_for_reload)
 
-    return _reverse_proxy_to_schema(config)
+    return config_schema
 
 
-async def create_load_balancer_config(
-    create_load_balancer_config_data: schemas.CreateLoadBalancerConfig,
-    session: Annotated[AsyncSession, Depends(get_session)],
+async def _read_load_balancer_record(load_balancer_id: int, session: AsyncSession) -> models.LoadBalancerConfig:
+    statement = (
+        select(models.LoadBalancerConfig)
+        .options(selectinload(models.LoadBalancerConfig.virtual_host))
+        .where(models.LoadBalancerConfig.id == load_balancer_id)
+    )
+
+    result = await session.exec(statement)
+    config = result.scalar_one_or_none()
+
+    if not config or not config.virtual_host:
+        raise exceptions.ConfigNotFound(config_type="load balancer configuration")
+
+    return config
+
+
+def _increasing_subsequence(values: list[int]) -> set[int]:
+    """
+    indices of a longest strictly increasing subsequence of `values`
+    """
+    # index of the last value of the best subsequence found so far of every length
+    tails: list[int] = []
+    previous: list[int | None] = []
+    for index, value in enumerate(values):
+        length = bisect.bisect_left(tails, value, key=lambda tail: values[tail])
+        previous.append(tails[length - 1] if length else None)
+        if length == len(tails):
+            tails.append(index)
+        else:
+            tails[length] = index
+
+    indices: set[int] = set()
+    last_index = tails[-1] if tails else None
+    while last_index is not None:
+        indices.add(last_index)
+        last_index = previous[last_index]
+    return indices
+
+
+def _spread_backend_positions(positions: list[int | None]) -> list[int]:
+    """
+    fills positions which are None in evenly between the ones around them. If there is no room left between two
+    positions, every position is spaced out again
+    """
+    step = LOAD_BALANCER_BACKEND_POSITION_STEP
+    spread: list[int | None] = list(positions)
+    start = 0
+    while start < len(spread):
+        if spread[start] is not None:
+            start += 1
+            continue
+
+        end = start
+        while end < len(spread) and spread[end] is None:
+            end += 1
+        count = end - start
+
+        low = spread[start - 1] if start > 0 else None
+        high = spread[end] if end < len(spread) else None
+        if low is None:
+            low = (high if high is not None else (count + 1) * step) - (count + 1) * step
+        if high is None:
+            high = low + (count + 1) * step
+        if high - low <= count:
+            return [(index + 1) * step for index in range(len(positions))]
+
+        for offset in range(count):
+            spread[start + offset] = low + (high - low) * (offset + 1) // (count + 1)
+        start = end
+
+    return spread
+
+
+async def _sync_load_balancer_backends(
+    config: models.LoadBalancerConfig, backend_urls: list[HttpUrl], session: AsyncSession
+) -> None:
+    """
+    makes backends of a load balancer match `backend_urls` in order. Urls which aren't wanted anymore are deleted and
+    new ones inserted, in one statement each, and only backends which moved get a new position
+    """
+    statement = (
+        select(models.LoadBalancerBackendURL.id, _load_balancer_backend_url, models.LoadBalancerBackendURL.position)
+        .where(models.LoadBalancerBackendURL.used_in_load_balancer == config.id)
+        .order_by(models.LoadBalancerBackendURL.position, models.LoadBalancerBackendURL.id)
+    )
+    existing_backends = (await session.exec(statement)).all()
+
+    # rows are matched with wanted urls as a multiset, since a url may be in the list more than once
+    available_backends: defaultdict[str, deque[tuple[int, int]]] = defaultdict(deque)
+    for backend_id, backend_url, position in existing_backends:
+        available_backends[backend_url].append((backend_id, position))
+    wanted_urls = [str(backend_url) for backend_url in backend_urls]
+    kept_backends = [available_backends[url].popleft() if available_backends[url] else None for url in wanted_urls]
+    removed_ids = [backend_id for backends in available_backends.values() for backend_id, _position in backends]
+
+    # the most kept backends which are already in the wanted order stay where they are, the others are placed
+    # between them
+    kept_indices = [index for index, backend in enumerate(kept_backends) if backend is not None]
+    unmoved_indices = {
+        kept_indices[index] for index in _increasing_subsequence([kept_backends[index][1] for index in kept_indices])
+    }
+    positions = _spread_backend_positions(
+        [backend[1] if index in unmoved_indices else None for index, backend in enumerate(kept_backends)]
+    )
+    moved_backends = [
+        {"id": backend[0], "position": position}
+        for backend, position in zip(kept_backends, positions)
+        if backend is not None and backend[1] != position
+    ]
+    added_backends = [
+        {
+            "virtual_host_id": config.virtual_host_id,
+            "used_in_load_balancer": config.id,
+            "backend_url": url,
+            "position": position,
+        }
+        for url, backend, position in zip(wanted_urls, kept_backends, positions)
+        if backend is None
+    ]
+
+    if removed_ids:
+        await session.exec(
+            delete(models.LoadBalancerBackendURL).where(models.LoadBalancerBackendURL.id.in_(removed_ids))
+        )
+    if moved_backends:
+        await session.exec(update(models.LoadBalancerBackendURL), params=moved_backends)
+    if added_backends:
+        await session.exec(insert(models.LoadBalancerBackendURL), params=added_backends)
+
+    # backend_urls is a property of the LoadBalancerConfig model that relies on a relationship, refreshing loads the
+    # backends as they are now
+    await session.refresh(config, attribute_names=["backend_urls_relationship"])
+
+
+async def _create_load_balancer_config_record(
+    create_load_balancer_config_data: schemas.CreateLoadBalancerConfig, session: AsyncSession
 ) -> schemas.UpdateLoadBalancerConfig:
     existing_virtual_host_stmt = select(models.VirtualHost).where(
         models.VirtualHost.virtual_host_name == create_load_balancer_config_data.virtual_host_name
@@ -272,50 +591,41 @@ async def create_load_balancer_config(
     except sqlalchemy.exc.IntegrityError:
         raise VirtualHostNameAlreadyExists(virtual_host_name=create_load_balancer_config_data.virtual_host_name)
 
-    # Add backend URLs
-    for backend_url in create_load_balancer_config_data.backend_urls:
-        backend_record = models.LoadBalancerBackendURL(
-            virtual_host=virtual_host, used_in_load_balancer=load_balancer_config.id, backend_url=backend_url
-        )
-        session.add(backend_record)
+    await _sync_load_balancer_backends(load_balancer_config, create_load_balancer_config_data.backend_urls, session)
 
-    await session.flush()
+    await session.refresh(load_balancer_config, attribute_names=["virtual_host"])
+
+    config_schema = _load_balancer_to_schema(load_balancer_config)
+    _store_rendered_config(load_balancer_config, HostType.LOAD_BALANCER, config_schema)
+    await history.record_config_change(HostType.LOAD_BALANCER, None, config_schema, session)
+
+    return config_schema
 
-    # backend_urls is a property of the LoadBalancerConfig model that relies on a relationship,
-    # have to refresh to get the backend_urls_relationship loaded.
-    await session.refresh(load_balancer_config, attribute_names=["backend_urls_relationship", "virtual_host"])
 
-    load_balancer_config_schema = _load_balancer_to_schema(load_balancer_config)
+async def create_load_balancer_config(
+    create_load_balancer_config_data: schemas.CreateLoadBalancerConfig,
+    session: Annotated[AsyncSession, Depends(get_session)],
+    wait_for_reload: bool = False,
+) -> schemas.UpdateLoadBalancerConfig:
+    load_balancer_config_schema = await _create_load_balancer_config_record(create_load_balancer_config_data, session)
 
-    await write_load_balancer_config_to_file(load_balancer_config_schema)
+    await write_load_balancer_config_to_file(
+        load_balancer_config_schema.id,
+        await _read_rendered_config(HostType.LOAD_BALANCER, load_balancer_config_schema.id, session),
+    )
 
     await session.commit()
 
-    await reload_ferron_service()
+    await reload_scheduler.request_reload(wait=wait_for_reload)
 
     return load_balancer_config_schema
 
 
-async def update_load_balancer_config(
-    load_balancer_config_data: schemas.UpdateLoadBalancerConfig, session: Annotated[AsyncSession, Depends(get_session)]
+async def _update_load_balancer_config_record(
+    load_balancer_config_data: schemas.UpdateLoadBalancerConfig, session: AsyncSession
 ) -> schemas.UpdateLoadBalancerConfig:
-    statement = (
-        select(models.LoadBalancerConfig)
-        .options(
-            selectinload(models.LoadBalancerConfig.virtual_host),
-            selectinload(models.LoadBalancerConfig.backend_urls_relationship),
-        )
-        .where(models.LoadBalancerConfig.id == load_balancer_config_data.id)
-    )
-
-    result = await session.exec(statement)
-    existing_config = result.scalar_one_or_none()
-
-    if not existing_config:
-        raise exceptions.ConfigNotFound(config_type="load balancer configuration")
-
-    if not existing_config.virtual_host:
-        raise exceptions.ConfigNotFound(config_type="load balancer configuration")
+    existing_config = await _read_load_balancer_record(load_balancer_config_data.id, session)
+    previous_config_schema = _load_balancer_to_schema(existing_config)
 
     if load_balancer_config_data.virtual_host_name != existing_config.virtual_host.virtual_host_name:
         conflicting_virtual_host_stmt = select(models.VirtualHost).where(
@@ -332,33 +642,96 @@ async def update_load_balancer_config(
     for field, value in update_data.items():
         setattr(existing_config, field, value)
 
-    # Update backend URLs - delete existing and create new ones
-    for backend in existing_config.backend_urls_relationship:
-        await session.delete(backend)
-
-    await session.flush()
-
-    for backend_url in load_balancer_config_data.backend_urls:
-        backend_record = models.LoadBalancerBackendURL(
-            virtual_host=existing_config.virtual_host, used_in_load_balancer=existing_config.id, backend_url=backend_url
-        )
-        session.add(backend_record)
-
     try:
         await session.flush()
     except sqlalchemy.exc.IntegrityError:
         raise VirtualHostNameAlreadyExists(virtual_host_name=load_balancer_config_data.virtual_host_name)
 
-    existing_config_schema = _load_balancer_to_schema(existing_config)
-    await write_load_balancer_config_to_file(existing_config_schema)
+    await _sync_load_balancer_backends(existing_config, load_balancer_config_data.backend_urls, session)
+
+    config_schema = _load_balancer_to_schema(existing_config)
+    _store_rendered_config(existing_config, HostType.LOAD_BALANCER, config_schema)
+    await history.record_config_change(HostType.LOAD_BALANCER, previous_config_schema, config_schema, session)
+
+    return config_schema
+
+
+async def update_load_balancer_config(
+    load_balancer_config_data: schemas.UpdateLoadBalancerConfig,
+    session: Annotated[AsyncSession, Depends(get_session)],
+    wait_for_reload: bool = False,
+) -> schemas.UpdateLoadBalancerConfig:
+    existing_config_schema = await _update_load_balancer_config_record(load_balancer_config_data, session)
+    changed = await write_load_balancer_config_to_file(
+        existing_config_schema.id,
+        await _read_rendered_config(HostType.LOAD_BALANCER, existing_config_schema.id, session),
+    )
 
     await session.commit()
 
-    await reload_ferron_service()
+    # saving a configuration without changing anything doesn't need a reload
+    if changed:
+        await reload_scheduler.request_reload(wait=wait_for_reload)
 
     return existing_config_schema
 
 
+async def add_load_balancer_backend(
+    load_balancer_id: int,
+    backend: schemas.LoadBalancerBackend,
+    session: Annotated[AsyncSession, Depends(get_session)],
+    wait_for_reload: bool = False,
+) -> schemas.UpdateLoadBalancerConfig:
+    config = await _read_load_balancer_record(load_balancer_id, session)
+
+    backend_urls = [existing_backend.backend_url for existing_backend in config.backend_urls_relationship]
+    if str(backend.backend_url) in map(str, backend_urls):
+        raise exceptions.LoadBalancerBackendAlreadyExists(backend_url=str(backend.backend_url))
+
+    previous_config_schema = _load_balancer_to_schema(config)
+    await _sync_load_balancer_backends(config, [*backend_urls, backend.backend_url], session)
+
+    config_schema = _load_balancer_to_schema(config)
+    rendered_kdl = _store_rendered_config(config, HostType.LOAD_BALANCER, config_schema)
+    await history.record_config_change(HostType.LOAD_BALANCER, previous_config_schema, config_schema, session)
+    await write_load_balancer_config_to_file(config.id, rendered_kdl)
+
+    await session.commit()
+
+    await reload_scheduler.request_reload(wait=wait_for_reload)
+
+    return config_schema
+
+
+async def remove_load_balancer_backend(
+    load_balancer_id: int,
+    backend_url: HttpUrl,
+    session: Annotated[AsyncSession, Depends(get_session)],
+    wait_for_reload: bool = False,
+) -> schemas.UpdateLoadBalancerConfig:
+    config = await _read_load_balancer_record(load_balancer_id, session)
+
+    backend_urls = [existing_backend.backend_url for existing_backend in config.backend_urls_relationship]
+    removed_urls = [url for url in backend_urls if str(url) == str(backend_url)]
+    if not removed_urls:
+        raise exceptions.ConfigNotFound(config_type="load balancer backend")
+    backend_urls.remove(removed_urls[0])
+
+    previous_config_schema = _load_balancer_to_schema(config)
+    await _sync_load_balancer_backends(config, backend_urls, session)
+
+    config_schema = _load_balancer_to_schema(config)
+    rendered_kdl = _store_rendered_config(config, HostType.LOAD_BALANCER, config_schema)
+    await history.record_config_change(HostType.LOAD_BALANCER, previous_config_schema, config_schema, session)
+    await write_load_balancer_config_to_file(config.id, rendered_kdl)
+
+    await session.commit()
+
+    await reload_scheduler.request_reload(wait=wait_for_reload)
+
+    return config_schema
+
+
 async def read_load_balancer_config(
     load_balancer_id: int,
     session: Annotated[AsyncSession, Depends(get_session)],
@@ -384,20 +757,27 @@ async def read_load_balancer_config(
 
 async def read_all_load_balancer_config(
     session: Annotated[AsyncSession, Depends(get_session)],
-) -> list[schemas.UpdateLoadBalancerConfig]:
-    statement = select(models.LoadBalancerConfig).options(
-        selectinload(models.LoadBalancerConfig.virtual_host),
-        selectinload(models.LoadBalancerConfig.backend_urls_relationship),
+) -> list[dict[str, Any]]:
+    """
+    every load balancer config, as rows with the fields of UpdateLoadBalancerConfig
+    """
+    rows = await _read_all_config_rows(schemas.UpdateLoadBalancerConfig, models.LoadBalancerConfig, session)
+
+    backend_urls: dict[int, list[str]] = defaultdict(list)
+    statement = select(models.LoadBalancerBackendURL.used_in_load_balancer, _load_balancer_backend_url).order_by(
+        models.LoadBalancerBackendURL.position, models.LoadBalancerBackendURL.id
     )
+    for load_balancer_id, backend_url in await session.exec(statement):
+        backend_urls[load_balancer_id].append(backend_url)
 
-    result = await session.exec(statement)
-    configs = result.scalars().all()
+    for row in rows:
+        row["backend_urls"] = backend_urls[row["id"]]
 
-    return [_load_balancer_to_schema(config) for config in configs]
+    return rows
 
 
-async def delete_load_balancer_config(
-    load_balancer_id: int, session: Annotated[AsyncSession, Depends(get_session)]
+async def _delete_load_balancer_config_record(
+    load_balancer_id: int, session: AsyncSession
 ) -> schemas.UpdateLoadBalancerConfig:
     statement = (
         select(models.LoadBalancerConfig)
@@ -414,22 +794,38 @@ async def delete_load_balancer_config(
     if not config:
         raise exceptions.ConfigNotFound(config_type="load balancer configuration")
 
+    # schema is built before deleting since the virtual host can't be loaded afterwards
+    config_schema = _load_balancer_to_schema(config)
+
     if config.virtual_host:
         await session.delete(config.virtual_host)
     else:
         await session.delete(config)
 
-    await session.commit()
+    await session.flush()
+    await history.record_config_change(HostType.LOAD_BALANCER, config_schema, None, session)
+
+    return config_schema
+
+
+async def delete_load_balancer_config(
+    load_balancer_id: int,
+    session: Annotated[AsyncSession, Depends(get_session)],
+    wait_for_reload: bool = False,
+) -> schemas.UpdateLoadBalancerConfig:
+    config_schema = await _delete_load_balancer_config_record(load_balancer_id, session)
+
+    # the row is deleted and flushed before the file is removed, and only committed once the file is gone
     await delete_load_balancer_config_from_file(load_balancer_id)
+    await session.commit()
 
-    await reload_ferron_service()
+    await reload_scheduler.request_reload(wait=wait_for_reload)
 
-    return _load_balancer_to_schema(config)
+    return config_schema
 
 
-async def create_static_file_config(
-    create_static_file_config_data: schemas.CreateStaticFileConfig,
-    session: Annotated[AsyncSession, Depends(get_session)],
+async def _create_static_file_config_record(
+    create_static_file_config_data: schemas.CreateStaticFileConfig, session: AsyncSession
 ) -> schemas.UpdateStaticFileConfig:
     existing_virtual_host_stmt = select(models.VirtualHost).where(
         models.VirtualHost.virtual_host_name == create_static_file_config_data.virtual_host_name
@@ -453,19 +849,34 @@ async def create_static_file_config(
     except sqlalchemy.exc.IntegrityError:
         raise VirtualHostNameAlreadyExists(virtual_host_name=create_static_file_config_data.virtual_host_name)
 
-    static_file_config_schema = _static_file_to_schema(static_file_config)
+    config_schema = _static_file_to_schema(static_file_config)
+    _store_rendered_config(static_file_config, HostType.STATIC_FILE, config_schema)
+    await history.record_config_change(HostType.STATIC_FILE, None, config_schema, session)
+
+    return config_schema
+
+
+async def create_static_file_config(
+    create_static_file_config_data: schemas.CreateStaticFileConfig,
+    session: Annotated[AsyncSession, Depends(get_session)],
+    wait_for_reload: bool = False,
+) -> schemas.UpdateStaticFileConfig:
+    static_file_config_schema = await _create_static_file_config_record(create_static_file_config_data, session)
 
-    await write_static_file_config_to_file(static_file_config_schema)
+    await write_static_file_config_to_file(
+        static_file_config_schema.id,
+        await _read_rendered_config(HostType.STATIC_FILE, static_file_config_schema.id, session),
+    )
 
     await session.commit()
 
-    await reload_ferron_service()
+    await reload_scheduler.request_reload(wait=wait_for_reload)
 
     return static_file_config_schema
 
 
-async def update_static_file_config(
-    static_file_config_data: schemas.UpdateStaticFileConfig, session: Annotated[AsyncSession, Depends(get_session)]
+async def _update_static_file_config_record(
+    static_file_config_data: schemas.UpdateStaticFileConfig, session: AsyncSession
 ) -> schemas.UpdateStaticFileConfig:
     statement = (
         select(models.StaticFileConfig)
@@ -482,6 +893,8 @@ async def update_static_file_config(
     if not existing_config.virtual_host:
         raise exceptions.ConfigNotFound(config_type="static file configuration")
 
+    previous_config_schema = _static_file_to_schema(existing_config)
+
     if static_file_config_data.virtual_host_name != existing_config.virtual_host.virtual_host_name:
         conflicting_virtual_host_stmt = select(models.VirtualHost).where(
             models.VirtualHost.virtual_host_name == static_file_config_data.virtual_host_name
@@ -502,12 +915,29 @@ async def update_static_file_config(
     except sqlalchemy.exc.IntegrityError:
         raise VirtualHostNameAlreadyExists(virtual_host_name=static_file_config_data.virtual_host_name)
 
-    existing_config_schema = _static_file_to_schema(existing_config)
-    await write_static_file_config_to_file(existing_config_schema)
+    config_schema = _static_file_to_schema(existing_config)
+    _store_rendered_config(existing_config, HostType.STATIC_FILE, config_schema)
+    await history.record_config_change(HostType.STATIC_FILE, previous_config_schema, config_schema, session)
+
+    return config_schema
+
+
+async def update_static_file_config(
+    static_file_config_data: schemas.UpdateStaticFileConfig,
+    session: Annotated[AsyncSession, Depends(get_session)],
+    wait_for_reload: bool = False,
+) -> schemas.UpdateStaticFileConfig:
+    existing_config_schema = await _update_static_file_config_record(static_file_config_data, session)
+    changed = await write_static_file_config_to_file(
+        existing_config_schema.id,
+        await _read_rendered_config(HostType.STATIC_FILE, existing_config_schema.id, session),
+    )
 
     await session.commit()
 
-    await reload_ferron_service()
+    # saving a configuration without changing anything doesn't need a reload
+    if changed:
+        await reload_scheduler.request_reload(wait=wait_for_reload)
 
     return existing_config_schema
 
@@ -534,17 +964,15 @@ async def read_static_file_config(
 
 async def read_all_static_file_config(
     session: Annotated[AsyncSession, Depends(get_session)],
-) -> list[schemas.UpdateStaticFileConfig]:
-    statement = select(models.StaticFileConfig).options(selectinload(models.StaticFileConfig.virtual_host))
-
-    result = await session.exec(statement)
-    configs = result.scalars().all()
-
-    return [_static_file_to_schema(config) for config in configs]
+) -> list[dict[str, Any]]:
+    """
+    every static file config, as rows with the fields of UpdateStaticFileConfig
+    """
+    return await _read_all_config_rows(schemas.UpdateStaticFileConfig, models.StaticFileConfig, session)
 
 
-async def delete_static_file_config(
-    static_file_id: int, session: Annotated[AsyncSession, Depends(get_session)]
+async def _delete_static_file_config_record(
+    static_file_id: int, session: AsyncSession
 ) -> schemas.UpdateStaticFileConfig:
     statement = (
         select(models.StaticFileConfig)
@@ -560,15 +988,537 @@ async def delete_static_file_config(
     if not config:
         raise exceptions.ConfigNotFound(config_type="static file configuration")
 
+    # schema is built before deleting since the virtual host can't be loaded afterwards
+    config_schema = _static_file_to_schema(config)
+
     if config.virtual_host:
         await session.delete(config.virtual_host)
     else:
         await session.delete(config)
 
-    # delete config file only after successfully deleted from db
-    await session.commit()
+    await session.flush()
+    await history.record_config_change(HostType.STATIC_FILE, config_schema, None, session)
+
+    return config_schema
+
+
+async def delete_static_file_config(
+    static_file_id: int,
+    session: Annotated[AsyncSession, Depends(get_session)],
+    wait_for_reload: bool = False,
+) -> schemas.UpdateStaticFileConfig:
+    config_schema = await _delete_static_file_config_record(static_file_id, session)
+
+    # the row is deleted and flushed before the file is removed, and only committed once the file is gone
     await delete_static_file_config_from_file(static_file_id)
+    await session.commit()
+
+    await reload_scheduler.request_reload(wait=wait_for_reload)
+
+    return config_schema
+
+
+def _encode_cursor(*values: str | int | float) -> str:
+    cursor = json.dumps(values, separators=(",", ":"))
+    return base64.urlsafe_b64encode(cursor.encode()).decode().rstrip("=")
+
+
+def _decode_cursor(cursor: str, *value_types: type) -> list[Any]:
+    """
+    values of a cursor made by `_encode_cursor()`, raises InvalidCursor unless they have the given types
+    """
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+    except ValueError:
+        raise exceptions.InvalidCursor()
+
+    if not isinstance(values, list) or [type(value) for value in values] != list(value_types):
+        raise exceptions.InvalidCursor()
+
+    return values
+
+
+_HOST_COLUMNS = (
+    models.VirtualHost.id,
+    models.VirtualHost.virtual_host_name,
+    models.ReverseProxyConfig.id.label("reverse_proxy_id"),
+    _reverse_proxy_backend_url.label("backend_url"),
+    models.LoadBalancerConfig.id.label("load_balancer_id"),
+    models.StaticFileConfig.id.label("static_file_id"),
+    models.StaticFileConfig.static_files_dir,
+)
+
+
+def _join_host_configs(statement: Select) -> Select:
+    """
+    joins config tables of every host type to a statement which selects from the virtual host table
+    """
+    return (
+        statement.outerjoin(
+            models.ReverseProxyConfig, models.ReverseProxyConfig.virtual_host_id == models.VirtualHost.id
+        )
+        .outerjoin(models.LoadBalancerConfig, models.LoadBalancerConfig.virtual_host_id == models.VirtualHost.id)
+        .outerjoin(models.StaticFileConfig, models.StaticFileConfig.virtual_host_id == models.VirtualHost.id)
+    )
+
+
+async def _host_summaries(rows: Sequence[Row], session: AsyncSession) -> list[schemas.HostSummary]:
+    """
+    summaries of rows of `_HOST_COLUMNS`, with backend urls of load balancers read in a single query
+    """
+    load_balancer_ids = [row.load_balancer_id for row in rows if row.load_balancer_id is not None]
+    backend_urls: dict[int, list[str]] = {load_balancer_id: [] for load_balancer_id in load_balancer_ids}
+    if load_balancer_ids:
+        backends_statement = (
+            select(models.LoadBalancerBackendURL.used_in_load_balancer, _load_balancer_backend_url)
+            .where(models.LoadBalancerBackendURL.used_in_load_balancer.in_(load_balancer_ids))
+            .order_by(models.LoadBalancerBackendURL.position, models.LoadBalancerBackendURL.id)
+        )
+        for load_balancer_id, backend_url in await session.exec(backends_statement):
+            backend_urls[load_balancer_id].append(backend_url)
+
+    summaries = []
+    for row in rows:
+        if row.reverse_proxy_id is not None:
+            host_type, config_id, host_backend_urls = HostType.REVERSE_PROXY, row.reverse_proxy_id, [row.backend_url]
+        elif row.load_balancer_id is not None:
+            host_type, config_id = HostType.LOAD_BALANCER, row.load_balancer_id
+            host_backend_urls = backend_urls[row.load_balancer_id]
+        else:
+            host_type, config_id, host_backend_urls = HostType.STATIC_FILE, row.static_file_id, []
+
+        summaries.append(
+            schemas.HostSummary(
+                type=host_type,
+                id=config_id,
+                virtual_host_name=row.virtual_host_name,
+                backend_urls=host_backend_urls,
+                static_files_dir=row.static_files_dir,
+            )
+        )
 
-    await reload_ferron_service()
+    return summaries
 
-    return _static_file_to_schema(config)
+
+async def read_hosts(
+    session: Annotated[AsyncSession, Depends(get_session)],
+    host_type: HostType | None = None,
+    name_prefix: str | None = None,
+    backend: str | None = None,
+    sort: HostSortKey = HostSortKey.NAME,
+    order: SortOrder = SortOrder.ASC,
+    limit: int = DEFAULT_HOSTS_PAGE_SIZE,
+    cursor: str | None = None,
+) -> schemas.HostPage:
+    """
+    one page of hosts of every type. Pages are keyset paginated on virtual host name or id, which are both unique and
+    indexed, so a page costs the same no matter how deep it is
+    """
+    virtual_host = models.VirtualHost
+    configs = {
+        HostType.REVERSE_PROXY: models.ReverseProxyConfig,
+        HostType.LOAD_BALANCER: models.LoadBalancerConfig,
+        HostType.STATIC_FILE: models.StaticFileConfig,
+    }
+    host_types = [host_type] if host_type is not None else list(HostType)
+
+    name_conditions: list[ColumnElement[bool]] = []
+    if name_prefix:
+        # a range instead of LIKE, which can use the index of virtual host names
+        name_conditions.append(virtual_host.virtual_host_name >= name_prefix)
+        name_conditions.append(virtual_host.virtual_host_name < name_prefix + "\U0010ffff")
+
+    backend_conditions: dict[HostType, ColumnElement[bool]] = {}
+    if backend:
+        backend_conditions = {
+            HostType.REVERSE_PROXY: _reverse_proxy_backend_url.contains(backend, autoescape=True),
+            HostType.LOAD_BALANCER: exists().where(
+                models.LoadBalancerBackendURL.used_in_load_balancer == models.LoadBalancerConfig.id,
+                _load_balancer_backend_url.contains(backend, autoescape=True),
+            ),
+            HostType.STATIC_FILE: models.StaticFileConfig.static_files_dir.contains(backend, autoescape=True),
+        }
+
+    sort_column = virtual_host.virtual_host_name if sort == HostSortKey.NAME else virtual_host.id
+    statement = _join_host_configs(select(*_HOST_COLUMNS).select_from(virtual_host)).where(
+        or_(
+            *(
+                and_(configs[config_type].id.is_not(None), backend_conditions.get(config_type, true()))
+                for config_type in host_types
+            )
+        ),
+        *name_conditions,
+    )
+    if cursor is not None:
+        cursor_sort, cursor_order, key = _decode_cursor(cursor, str, str, str if sort == HostSortKey.NAME else int)
+        if (cursor_sort, cursor_order) != (sort.value, order.value):
+            raise exceptions.InvalidCursor()
+        statement = statement.where(sort_column > key if order == SortOrder.ASC else sort_column < key)
+    # one row more than the page tells whether there is a next page
+    statement = statement.order_by(sort_column.asc() if order == SortOrder.ASC else sort_column.desc()).limit(limit + 1)
+
+    # hosts are counted from the config table of each type, counting rows of the joins above costs a lookup in every
+    # config table for every host
+    counts = []
+    for config_type in host_types:
+        count_statement = select(func.count()).select_from(configs[config_type])
+        if name_conditions:
+            count_statement = count_statement.join(
+                virtual_host, virtual_host.id == configs[config_type].virtual_host_id
+            )
+        count_statement = count_statement.where(*name_conditions, backend_conditions.get(config_type, true()))
+        counts.append(count_statement.scalar_subquery())
+
+    rows = (await session.exec(statement)).all()
+    total = (await session.exec(select(sum(counts)))).scalar_one()
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        last_row = rows[-1]
+        next_cursor = _encode_cursor(
+            sort.value, order.value, last_row.virtual_host_name if sort == HostSortKey.NAME else last_row.id
+        )
+
+    return schemas.HostPage(items=await _host_summaries(rows, session), total=total, next_cursor=next_cursor)
+
+
+def _match_host_search(query: str, dialect_name: str) -> tuple[ColumnElement[bool], ColumnElement[int]]:
+    """
+    condition matching hosts of the search table which contain `query`, and the rank of matches, lower is better.
+    Ranks only depend on the row they are for, so that pages of a search stay in order while other hosts change
+    """
+    host_search = models.host_search
+    if dialect_name == "postgresql":
+        # the table is a regular one there, ILIKE uses its trigram indexes
+        pattern = "%" + query.replace("/", "//").replace("%", "/%").replace("_", "/_") + "%"
+        name_match = host_search.c.virtual_host_name.ilike(pattern, escape="/")
+        backends_match = host_search.c.backends.ilike(pattern, escape="/")
+        match = or_(name_match, backends_match)
+    else:
+        # quoted as a phrase so that the query is matched as it is, instead of as FTS5 query syntax
+        match = literal_column(models.HOST_SEARCH_TABLE).op("MATCH")('"' + query.replace('"', '""') + '"')
+        # bm25 isn't used, since it changes with every change of the index. Columns of matched rows are only
+        # compared again to tell where the match is
+        name_match = func.instr(func.lower(host_search.c.virtual_host_name), query.lower()) > 0
+        backends_match = func.instr(func.lower(host_search.c.backends), query.lower()) > 0
+
+    # matches in virtual host names rank higher than matches in backends
+    rank = -(2 * cast(name_match, Integer) + cast(backends_match, Integer))
+    return match, rank
+
+
+async def search_hosts(
+    query: str,
+    session: Annotated[AsyncSession, Depends(get_session)],
+    limit: int = DEFAULT_HOSTS_PAGE_SIZE,
+    cursor: str | None = None,
+) -> schemas.HostPage:
+    """
+    one page of hosts whose virtual host name or backends contain `query`, best matches first. Matches are found
+    through the trigram index of hosts, which is kept up to date by triggers on the tables it indexes
+    """
+    host_search = models.host_search
+    match, rank_column = _match_host_search(query, session.bind.dialect.name)
+
+    matches = select(host_search.c.rowid, rank_column.label("rank")).where(match)
+    if cursor is not None:
+        cursor_query, rank, virtual_host_id = _decode_cursor(cursor, str, int, int)
+        if cursor_query != query:
+            raise exceptions.InvalidCursor()
+        matches = matches.where(
+            or_(
+                rank_column > rank,
+                and_(rank_column == rank, host_search.c.rowid > virtual_host_id),
+            )
+        )
+    # one row more than the page tells whether there is a next page
+    matches = matches.order_by(rank_column, host_search.c.rowid).limit(limit + 1).subquery()
+
+    statement = _join_host_configs(
+        select(*_HOST_COLUMNS, matches.c.rank)
+        .select_from(matches)
+        .join(models.VirtualHost, models.VirtualHost.id == matches.c.rowid)
+    ).order_by(matches.c.rank, matches.c.rowid)
+
+    rows = (await session.exec(statement)).all()
+    total = (await session.exec(select(func.count()).select_from(host_search).where(match))).scalar_one()
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = _encode_cursor(query, rows[-1].rank, rows[-1].id)
+
+    return schemas.HostPage(items=await _host_summaries(rows, session), total=total, next_cursor=next_cursor)
+
+
+async def _apply_batch_operation(
+    operation: schemas.BatchOperation, session: AsyncSession
+) -> tuple[HostType, HostTemplateConfig]:
+    match operation:
+        case schemas.CreateReverseProxyOperation():
+            return HostType.REVERSE_PROXY, await _create_reverse_proxy_config_record(operation.config, session)
+        case schemas.UpdateReverseProxyOperation():
+            return HostType.REVERSE_PROXY, await _update_reverse_proxy_config_record(operation.config, session)
+        case schemas.DeleteReverseProxyOperation():
+            return HostType.REVERSE_PROXY, await _delete_reverse_proxy_config_record(operation.id, session)
+        case schemas.CreateLoadBalancerOperation():
+            return HostType.LOAD_BALANCER, await _create_load_balancer_config_record(operation.config, session)
+        case schemas.UpdateLoadBalancerOperation():
+            return HostType.LOAD_BALANCER, await _update_load_balancer_config_record(operation.config, session)
+        case schemas.DeleteLoadBalancerOperation():
+            return HostType.LOAD_BALANCER, await _delete_load_balancer_config_record(operation.id, session)
+        case schemas.CreateStaticFileOperation():
+            return HostType.STATIC_FILE, await _create_static_file_config_record(operation.config, session)
+        case schemas.UpdateStaticFileOperation():
+            return HostType.STATIC_FILE, await _update_static_file_config_record(operation.config, session)
+        case schemas.DeleteStaticFileOperation():
+            return HostType.STATIC_FILE, await _delete_static_file_config_record(operation.id, session)
+
+
+def _validate_batch_virtual_host_names(operations: list[schemas.BatchOperation]) -> None:
+    """
+    rejects batches in which two operations would leave different hosts with the same virtual host name, before
+    anything is written to the db. A host changed several times in the batch may keep its name
+    """
+    # hosts are updated and deleted by type and id, every create is a host of its own
+    names: dict[tuple[str, int], str] = {}
+    owners: dict[str, tuple[str, int]] = {}
+    for index, operation in enumerate(operations):
+        verb, host_type = operation.op.split("_", 1)
+        if verb == "create":
+            owner = (operation.op, index)
+        elif verb == "update":
+            owner = (host_type, operation.config.id)
+        else:
+            owner = (host_type, operation.id)
+
+        previous_name = names.pop(owner, None)
+        if previous_name is not None:
+            del owners[previous_name]
+        if verb == "delete":
+            continue
+
+        virtual_host_name = operation.config.virtual_host_name
+        if owners.get(virtual_host_name, owner) != owner:
+            raise exceptions.BatchOperationFailed(index, VirtualHostNameAlreadyExists(virtual_host_name))
+        names[owner] = virtual_host_name
+        owners[virtual_host_name] = owner
+
+
+async def apply_config_batch(
+    batch_data: schemas.ConfigBatch,
+    session: Annotated[AsyncSession, Depends(get_session)],
+    wait_for_reload: bool = False,
+) -> schemas.ConfigBatchResult:
+    """
+    applies all operations of the batch in a single transaction, writes the affected config files in one pass and
+    reloads ferron once. If any operation fails, none of them are applied
+    """
+    return await _apply_batch_operations(batch_data.operations, session, wait_for_reload)
+
+
+async def _apply_batch_operations(
+    operations: list[schemas.BatchOperation], session: AsyncSession, wait_for_reload: bool
+) -> schemas.ConfigBatchResult:
+    _validate_batch_virtual_host_names(operations)
+
+    results: list[schemas.BatchOperationResult] = []
+    # an ordered set of hosts, so that a host changed several times in the batch is only written once
+    written_hosts: dict[tuple[HostType, int], None] = {}
+    created_hosts: set[tuple[HostType, int]] = set()
+    deleted_hosts: list[tuple[HostType, int]] = []
+
+    for index, operation in enumerate(operations):
+        try:
+            host_type, config = await _apply_batch_operation(operation, session)
+        except exceptions.FerronException as e:
+            raise exceptions.BatchOperationFailed(index, e)
+
+        host = (host_type, config.id)
+        if operation.op.startswith("delete_"):
+            written_hosts.pop(host, None)
+            # a host created and deleted in the same batch never had a config file
+            if host in created_hosts:
+                created_hosts.discard(host)
+            else:
+                deleted_hosts.append(host)
+        else:
+            if operation.op.startswith("create_"):
+                created_hosts.add(host)
+            written_hosts[host] = None
+
+        results.append(schemas.BatchOperationResult(op=operation.op, config=config))
+
+    # deleted hosts are removed in the same write, a host may take the virtual host name of one deleted in the batch
+    # and would otherwise be rejected as a duplicate
+    changed = await update_host_configs_in_files(
+        [
+            (host_type, host_id, await _read_rendered_config(host_type, host_id, session))
+            for host_type, host_id in written_hosts
+        ],
+        deleted_hosts,
+    )
+
+    await session.commit()
+
+    if changed:
+        await reload_scheduler.request_reload(wait=wait_for_reload)
+
+    return schemas.ConfigBatchResult(results=results)
+
+
+def _history_row_to_schema(row: models.ConfigHistory) -> schemas.ConfigChange:
+    match ConfigChangeOperation(row.operation):
+        case ConfigChangeOperation.CREATE:
+            changes = history.diff_states(None, row.config)
+        case ConfigChangeOperation.DELETE:
+            changes = history.diff_states(row.config, None)
+        case ConfigChangeOperation.UPDATE:
+            changes = row.changes or {}
+
+    return schemas.ConfigChange(
+        id=row.id,
+        host_type=HostType(row.host_type),
+        config_id=row.config_id,
+        operation=ConfigChangeOperation(row.operation),
+        changes=changes,
+        created_at=row.created_at,
+    )
+
+
+async def read_config_history(
+    session: Annotated[AsyncSession, Depends(get_session)],
+    host_type: HostType | None = None,
+    config_id: int | None = None,
+    limit: int = DEFAULT_HISTORY_PAGE_SIZE,
+    cursor: str | None = None,
+) -> schemas.ConfigChangePage:
+    """
+    one page of changes of hosts, newest first
+    """
+    statement = select(models.ConfigHistory)
+    if host_type is not None:
+        statement = statement.where(models.ConfigHistory.host_type == host_type.value)
+    if config_id is not None:
+        statement = statement.where(models.ConfigHistory.config_id == config_id)
+    if cursor is not None:
+        (history_id,) = _decode_cursor(cursor, int)
+        statement = statement.where(models.ConfigHistory.id < history_id)
+    # one row more than the page tells whether there is a next page
+    statement = statement.order_by(models.ConfigHistory.id.desc()).limit(limit + 1)
+
+    rows = list((await session.exec(statement)).scalars().all())
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = _encode_cursor(rows[-1].id)
+
+    return schemas.ConfigChangePage(items=[_history_row_to_schema(row) for row in rows], next_cursor=next_cursor)
+
+
+async def diff_config_history(
+    from_id: int,
+    to_id: int,
+    session: Annotated[AsyncSession, Depends(get_session)],
+) -> schemas.ConfigHistoryDiff:
+    """
+    differences between configs of hosts right after change `from_id` and right after change `to_id`, which may be
+    the older one
+    """
+    for history_id in [from_id, to_id]:
+        await history.check_history_id(history_id, session)
+
+    hosts = []
+    for (host_type, config_id), (older, newer) in (
+        await history.read_changes_between(min(from_id, to_id), max(from_id, to_id), session)
+    ).items():
+        before, after = (older, newer) if from_id <= to_id else (newer, older)
+        changes = history.diff_states(before, after)
+        if not changes:
+            continue
+
+        if before is None:
+            operation = ConfigChangeOperation.CREATE
+        elif after is None:
+            operation = ConfigChangeOperation.DELETE
+        else:
+            operation = ConfigChangeOperation.UPDATE
+        hosts.append(
+            schemas.HostConfigDiff(host_type=host_type, config_id=config_id, operation=operation, changes=changes)
+        )
+
+    return schemas.ConfigHistoryDiff(from_id=from_id, to_id=to_id, hosts=hosts)
+
+
+async def rollback_config_history(
+    history_id: int,
+    session: Annotated[AsyncSession, Depends(get_session)],
+    wait_for_reload: bool = False,
+) -> schemas.ConfigBatchResult:
+    """
+    puts every host changed after change `history_id` back the way it was right after it, in a single transaction
+    with one reload. Hosts deleted since are created again with new ids. The rollback is itself recorded in the history
+    and can be rolled back too
+    """
+    latest_id = await history.check_history_id(history_id, session)
+
+    deletes, updates, creates = [], [], []
+    for (host_type, config_id), (then, now) in (
+        await history.read_changes_between(history_id, latest_id, session)
+    ).items():
+        if then is None and now is not None:
+            deletes.append({"op": f"delete_{host_type.value}", "id": config_id})
+        elif then is not None and now is None:
+            creates.append({"op": f"create_{host_type.value}", "config": then})
+        elif then != now:
+            updates.append({"op": f"update_{host_type.value}", "config": {**then, "id": config_id}})
+
+    # hosts deleted first free their virtual host names for the hosts which had them before
+    operations = [_BATCH_OPERATION_ADAPTER.validate_python(operation) for operation in [*deletes, *updates, *creates]]
+    return await _apply_batch_operations(operations, session, wait_for_reload)
+
+
+async def read_config_changes(
+    since: int, session: Annotated[AsyncSession, Depends(get_session)]
+) -> schemas.ConfigChanges:
+    """
+    hosts created, updated or deleted after revision `since`, as they are now, found in the history instead of reading
+    all hosts. Raises ChangesNotAvailable if changes since it may have been compacted away, or if it is newer than the
+    current revision, e.g. of a database restored from a backup
+    """
+    statement = select(models.ConfigRevision.revision, models.ConfigRevision.oldest_sync_revision).where(
+        models.ConfigRevision.id == 1
+    )
+    # read first, so changes made while hosts are read have newer revisions and are returned again by the next sync
+    revision, oldest_sync_revision = (await session.exec(statement)).one()
+    if not oldest_sync_revision <= since <= revision:
+        raise exceptions.ChangesNotAvailable(since)
+
+    configs = [
+        (HostType.REVERSE_PROXY, models.ReverseProxyConfig, _reverse_proxy_to_schema),
+        (HostType.LOAD_BALANCER, models.LoadBalancerConfig, _load_balancer_to_schema),
+        (HostType.STATIC_FILE, models.StaticFileConfig, _static_file_to_schema),
+    ]
+    hosts = []
+    for host_type, model, to_schema in configs:
+        changed_ids = (
+            select(models.ConfigHistory.config_id)
+            .where(models.ConfigHistory.host_type == host_type.value, models.ConfigHistory.revision > since)
+            .distinct()
+        )
+        ids = sorted((await session.exec(changed_ids)).scalars())
+        # read after the ids, so hosts created in between aren't taken for deleted
+        changed_configs = {
+            config.id: to_schema(config)
+            for config in (await session.exec(select(model).where(model.id.in_(changed_ids)))).scalars()
+        }
+
+        for config_id in ids:
+            config = changed_configs.get(config_id)
+            hosts.append(
+                schemas.HostChange(host_type=host_type, config_id=config_id, deleted=config is None, config=config)
+            )
+
+    return schemas.ConfigChanges(revision=revision, hosts=hosts)
@@ -1,15 +1,13 @@
-import asyncio
+import hashlib
 import os
 
 import aiodocker
-import aiofiles
 import jinja2
-from aiofiles import os as aiofiles_os
 
 from src.config import settings
 from src.ferron import schemas
-from src.ferron.constants import SUB_CONFIG_PATH, ConfigFileLocation, TemplateType
-from src.ferron.exceptions import FerronContainerNotFoundException, FileNotFound, TemplateConfigAndTemplateTypeMismatch
+from src.ferron.constants import HOST_TEMPLATE_TYPES, ConfigFileLocation, HostType, TemplateType
+from src.ferron.exceptions import FerronContainerNotFoundException, TemplateConfigAndTemplateTypeMismatch
 from src.ferron.schemas import (
     GlobalTemplateConfig,
     TemplateConfig,
@@ -17,15 +15,66 @@ from src.ferron.schemas import (
     UpdateReverseProxyConfig,
     UpdateStaticFileConfig,
 )
+from src.ferron.writer import ConfigMutation, RemoveHostConfig, WriteConfigFile, WriteHostConfig, config_writer
 
 _CURRENT_DIR = os.path.dirname(os.path.abspath(__file__))
 _TEMPLATES_DIR = os.path.join(_CURRENT_DIR, "templates")
 
-environment = jinja2.Environment(loader=jinja2.FileSystemLoader(_TEMPLATES_DIR), enable_async=True)
 
+def _create_environment() -> jinja2.Environment:
+    bytecode_cache = None
+    if settings.template_bytecode_cache_dir:
+        os.makedirs(settings.template_bytecode_cache_dir, exist_ok=True)
+        # compiled templates are kept on disk so that they don't have to be compiled again on every start
+        bytecode_cache = jinja2.FileSystemBytecodeCache(settings.template_bytecode_cache_dir)
+
+    # templates only change with the app, so they never have to be checked for changes
+    return jinja2.Environment(
+        loader=jinja2.FileSystemLoader(_TEMPLATES_DIR), auto_reload=False, bytecode_cache=bytecode_cache
+    )
+
+
+def _read_template_version() -> str:
+    """
+    hash of all templates, which changes whenever any of them does
+    """
+    digest = hashlib.sha256()
+    for file_name in sorted(os.listdir(_TEMPLATES_DIR)):
+        digest.update(file_name.encode())
+        with open(os.path.join(_TEMPLATES_DIR, file_name), "rb") as f:
+            digest.update(f.read())
+
+    return digest.hexdigest()
+
+
+environment = _create_environment()
+_templates: dict[TemplateType, jinja2.Template] = {}
+# configs stored in the database which were rendered by templates of another version are stale
+TEMPLATE_VERSION = _read_template_version()
+
+
+def get_template(template_type: TemplateType) -> jinja2.Template:
+    template = _templates.get(template_type)
+    if template is None:
+        template = _templates[template_type] = environment.get_template(template_type.value)
+
+    return template
+
+
+def load_templates() -> None:
+    """
+    compiles all templates, so that the first render of each one doesn't have to
+    """
+    for template_type in TemplateType:
+        get_template(template_type)
 
-async def render_template(template_type: TemplateType, template_config: TemplateConfig) -> str:
-    template = environment.get_template(template_type.value)
+
+def render_template_sync(template_type: TemplateType, template_config: TemplateConfig) -> str:
+    """
+    templates do no I/O, so rendering them doesn't need to be async. This is used directly when rendering many configs
+    at once
+    """
+    template = get_template(template_type)
 
     if template_type == TemplateType.GLOBAL_CONFIG:
         if not isinstance(template_config, GlobalTemplateConfig):
@@ -47,203 +96,126 @@ async def render_template(template_type: TemplateType, template_config: Template
         if is_h3_protocol_enabled:
             global_config["protocols"].append("h3")
 
-        text = await template.render_async(**global_config)
+        text = template.render(**global_config)
 
         return text
     elif template_type == TemplateType.REVERSE_PROXY_CONFIG:
         if not isinstance(template_config, UpdateReverseProxyConfig):
             raise TemplateConfigAndTemplateTypeMismatch(template_type, template_config)
 
-        # render_async() will ignore the id field in UpdateReverseProxyConfig
-        text = await template.render_async(**template_config.model_dump())
+        # render() will ignore the id field in UpdateReverseProxyConfig
+        text = template.render(**template_config.model_dump())
 
         return text
     elif template_type == TemplateType.LOAD_BALANCER_CONFIG:
         if not isinstance(template_config, UpdateLoadBalancerConfig):
             raise TemplateConfigAndTemplateTypeMismatch(template_type, template_config)
 
-        # render_async() will ignore the id field in UpdateLoadBalancerConfig
-        text = await template.render_async(**template_config.model_dump())
+        # render() will ignore the id field in UpdateLoadBalancerConfig
+        text = template.render(**template_config.model_dump())
 
         return text
     elif template_type == TemplateType.STATIC_FILE_CONFIG:
         if not isinstance(template_config, UpdateStaticFileConfig):
             raise TemplateConfigAndTemplateTypeMismatch(template_type, template_config)
 
-        # render_async() will ignore the id field in UpdateStaticFileConfig
-        text = await template.render_async(**template_config.model_dump())
+        # render() will ignore the id field in UpdateStaticFileConfig
+        text = template.render(**template_config.model_dump())
 
         return text
 
 
-async def write_config(path: str, text: str) -> None:
+async def render_template(template_type: TemplateType, template_config: TemplateConfig) -> str:
+    return render_template_sync(template_type, template_config)
+
+
+async def write_global_config_to_file(global_config_data: schemas.GlobalTemplateConfig) -> bool:
     """
-    atomically writes `text` to file at `path` with 644 permissions
+    helper function to write global config to config file. Returns whether any file was changed
     """
-    target_dir = os.path.dirname(path)
+    ## writing to global config
+    rendered_config = await render_template(TemplateType.GLOBAL_CONFIG, global_config_data)
 
-    await aiofiles_os.makedirs(target_dir, exist_ok=True)
+    ## global config is included in main config if it isn't included already
+    return await config_writer.submit([WriteConfigFile(ConfigFileLocation.GLOBAL_CONFIG.value, rendered_config)])
 
-    # atomic write by writing to a temp file and then atomically replacing the target file
-    ## have to temp file in the same directory as target to avoid cross-device link errors
-    async with aiofiles.tempfile.NamedTemporaryFile(mode="w+", delete=False, dir=target_dir) as temp_file:
-        await temp_file.write(text)
-        temp_file_name = temp_file.name
 
-    ## permissions are being set to 644 so that ferron can read the config files
-    await asyncio.to_thread(os.chmod, temp_file_name, 0o644)
+HostTemplateConfig = UpdateReverseProxyConfig | UpdateLoadBalancerConfig | UpdateStaticFileConfig
 
-    ## replace atomically
-    await aiofiles_os.replace(temp_file_name, path)
 
+def render_host_config(host_type: HostType, host_config: HostTemplateConfig) -> str:
+    return render_template_sync(HOST_TEMPLATE_TYPES[host_type], host_config)
 
-async def read_config(path: str) -> str:
-    try:
-        async with aiofiles.open(path, "r") as f:
-            return await f.read()
-    except FileNotFoundError:
-        raise FileNotFound(path)
 
-
-async def write_global_config_to_file(global_config_data: schemas.GlobalTemplateConfig) -> None:
+async def write_host_configs_to_files(host_configs: list[tuple[HostType, int, str]]) -> bool:
     """
-    helper function to write global config to config file
+    writes rendered configs of all `host_configs`, given as host type, id and rendered config, to files of the
+    configured layout, which are included in the main config with a single write. Files whose rendered content is
+    unchanged are left untouched. Returns whether any file was changed
     """
-    # writing to config files
-    main_config_text = await read_config(ConfigFileLocation.MAIN_CONFIG.value)
+    return await update_host_configs_in_files(host_configs, [])
 
-    ## writing to global config
-    rendered_config = await render_template(TemplateType.GLOBAL_CONFIG, global_config_data)
 
-    await write_config(ConfigFileLocation.GLOBAL_CONFIG.value, rendered_config)
-
-    ## checking if main config has include statement for global config and write to main config file if not
-    has_include_statement = False
-    for line in main_config_text.splitlines():
-        if line.strip() == f'include "{ConfigFileLocation.GLOBAL_CONFIG.value}"':
-            has_include_statement = True
-            break
+async def update_host_configs_in_files(
+    host_configs: list[tuple[HostType, int, str]], deleted_hosts: list[tuple[HostType, int]]
+) -> bool:
+    """
+    writes configs of `host_configs` like `write_host_configs_to_files()` and removes configs of `deleted_hosts` in
+    the same write, so that they are validated together. Returns whether any file was changed
+    """
+    mutations: list[ConfigMutation] = [
+        WriteHostConfig(host_type, host_id, rendered_config) for host_type, host_id, rendered_config in host_configs
+    ]
+    mutations.extend(RemoveHostConfig(host_type, host_id) for host_type, host_id in deleted_hosts)
 
-    if not has_include_statement:
-        new_main_config_text = main_config_text + f'include "{ConfigFileLocation.GLOBAL_CONFIG.value}"\n'
-        await write_config(ConfigFileLocation.MAIN_CONFIG.value, new_main_config_text)
+    return await config_writer.submit(mutations)
 
 
-async def write_reverse_proxy_config_to_file(reverse_proxy_config_data: schemas.UpdateReverseProxyConfig) -> None:
+async def delete_host_configs_from_files(hosts: list[tuple[HostType, int]]) -> None:
     """
-    helper function to write reverse proxy config to config file
+    removes configs of all `hosts` from their files. Files left empty and their include statements are removed, with
+    a single write of the main config
     """
-    main_config_text = await read_config(ConfigFileLocation.MAIN_CONFIG.value)
-
-    rendered_config = await render_template(TemplateType.REVERSE_PROXY_CONFIG, reverse_proxy_config_data)
+    await config_writer.submit([RemoveHostConfig(host_type, host_id) for host_type, host_id in hosts])
 
-    await write_config(f"{SUB_CONFIG_PATH}/{reverse_proxy_config_data.id}_reverse_proxy.kdl", rendered_config)
 
-    has_include_statement = False
-    for line in main_config_text.splitlines():
-        if line.strip() == f'include "{SUB_CONFIG_PATH}/{reverse_proxy_config_data.id}_reverse_proxy.kdl"':
-            has_include_statement = True
-            break
-
-    if not has_include_statement:
-        new_main_config_text = (
-            main_config_text + f'include "{SUB_CONFIG_PATH}/{reverse_proxy_config_data.id}_reverse_proxy.kdl"\n'
-        )
-        await write_config(ConfigFileLocation.MAIN_CONFIG.value, new_main_config_text)
+async def write_reverse_proxy_config_to_file(reverse_proxy_id: int, rendered_config: str) -> bool:
+    """
+    helper function to write rendered reverse proxy config to config file. Returns whether the file was changed
+    """
+    return await write_host_configs_to_files([(HostType.REVERSE_PROXY, reverse_proxy_id, rendered_config)])
 
 
 async def delete_reverse_proxy_config_from_file(reverse_proxy_id: int) -> None:
-    main_config_text = await read_config(ConfigFileLocation.MAIN_CONFIG.value)
+    await delete_host_configs_from_files([(HostType.REVERSE_PROXY, reverse_proxy_id)])
 
-    include_line = f'include "{SUB_CONFIG_PATH}/{reverse_proxy_id}_reverse_proxy.kdl"'
 
-    lines = [line for line in main_config_text.splitlines() if line.strip() != include_line]
-    new_main_config_text = "\n".join(lines) + ("\n" if lines else "")
-
-    await write_config(ConfigFileLocation.MAIN_CONFIG.value, new_main_config_text)
-
-    await aiofiles_os.remove(f"{SUB_CONFIG_PATH}/{reverse_proxy_id}_reverse_proxy.kdl")
-
-
-async def write_load_balancer_config_to_file(load_balancer_config_data: schemas.UpdateLoadBalancerConfig) -> None:
+async def write_load_balancer_config_to_file(load_balancer_id: int, rendered_config: str) -> bool:
     """
-    helper function to write load balancer config to config file
+    helper function to write rendered load balancer config to config file. Returns whether the file was changed
     """
-    main_config_text = await read_config(ConfigFileLocation.MAIN_CONFIG.value)
-
-    rendered_config = await render_template(TemplateType.LOAD_BALANCER_CONFIG, load_balancer_config_data)
-
-    await write_config(f"{SUB_CONFIG_PATH}/{load_balancer_config_data.id}_load_balancer.kdl", rendered_config)
-
-    has_include_statement = False
-    for line in main_config_text.splitlines():
-        if line.strip() == f'include "{SUB_CONFIG_PATH}/{load_balancer_config_data.id}_load_balancer.kdl"':
-            has_include_statement = True
-            break
-
-    if not has_include_statement:
-        new_main_config_text = (
-            main_config_text + f'include "{SUB_CONFIG_PATH}/{load_balancer_config_data.id}_load_balancer.kdl"\n'
-        )
-        await write_config(ConfigFileLocation.MAIN_CONFIG.value, new_main_config_text)
+    return await write_host_configs_to_files([(HostType.LOAD_BALANCER, load_balancer_id, rendered_config)])
 
 
 async def delete_load_balancer_config_from_file(load_balancer_id: int) -> None:
-    main_config_text = await read_config(ConfigFileLocation.MAIN_CONFIG.value)
-
-    include_line = f'include "{SUB_CONFIG_PATH}/{load_balancer_id}_load_balancer.kdl"'
-
-    lines = [line for line in main_config_text.splitlines() if line.strip() != include_line]
-    new_main_config_text = "\n".join(lines) + ("\n" if lines else "")
-
-    await write_config(ConfigFileLocation.MAIN_CONFIG.value, new_main_config_text)
+    await delete_host_configs_from_files([(HostType.LOAD_BALANCER, load_balancer_id)])
 
-    await aiofiles_os.remove(f"{SUB_CONFIG_PATH}/{load_balancer_id}_load_balancer.kdl")
 
-
-async def write_static_file_config_to_file(static_file_config_data: schemas.UpdateStaticFileConfig) -> None:
+async def write_static_file_config_to_file(static_file_id: int, rendered_config: str) -> bool:
     """
-    helper function to write static file config to config file
+    helper function to write rendered static file config to config file. Returns whether the file was changed
     """
-    main_config_text = await read_config(ConfigFileLocation.MAIN_CONFIG.value)
-
-    rendered_config = await render_template(TemplateType.STATIC_FILE_CONFIG, static_file_config_data)
-
-    await write_config(f"{SUB_CONFIG_PATH}/{static_file_config_data.id}_static_file.kdl", rendered_config)
-
-    has_include_statement = False
-    for line in main_config_text.splitlines():
-        if line.strip() == f'include "{SUB_CONFIG_PATH}/{static_file_config_data.id}_static_file.kdl"':
-            has_include_statement = True
-            break
-
-    if not has_include_statement:
-        new_main_config_text = (
-            main_config_text + f'include "{SUB_CONFIG_PATH}/{static_file_config_data.id}_static_file.kdl"\n'
-        )
-        await write_config(ConfigFileLocation.MAIN_CONFIG.value, new_main_config_text)
+    return await write_host_configs_to_files([(HostType.STATIC_FILE, static_file_id, rendered_config)])
 
 
 async def delete_static_file_config_from_file(static_file_id: int) -> None:
-    main_config_text = await read_config(ConfigFileLocation.MAIN_CONFIG.value)
-
-    include_line = f'include "{SUB_CONFIG_PATH}/{static_file_id}_static_file.kdl"'
-
-    lines = [line for line in main_config_text.splitlines() if line.strip() != include_line]
-    new_main_config_text = "\n".join(lines) + ("\n" if lines else "")
-
-    await write_config(ConfigFileLocation.MAIN_CONFIG.value, new_main_config_text)
-
-    await aiofiles_os.remove(f"{SUB_CONFIG_PATH}/{static_file_id}_static_file.kdl")
+    await delete_host_configs_from_files([(HostType.STATIC_FILE, static_file_id)])
 
 
-async def reload_ferron_service() -> None:
-    docker = aiodocker.Docker()
+async def reload_ferron_service(docker: aiodocker.Docker) -> None:
     try:
         container = await docker.containers.get(settings.ferron_container_name)
         await container.kill(signal="SIGHUP")
     except aiodocker.exceptions.DockerError as e:
         if e.status == 404:
             raise FerronContainerNotFoundException(settings.ferron_container_name)
-    finally:
-        await docker.close()
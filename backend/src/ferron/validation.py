@@ -0,0 +1,122 @@
+import os
+from collections import ChainMap
+from dataclasses import dataclass, field
+
+import ckdl
+
+from src.ferron.exceptions import InvalidConfig
+from src.ferron.layout import HostKey
+
+# a host, or the path of a config file which doesn't belong to a host like the global config
+ConfigOwner = HostKey | str
+
+
+def describe_owner(owner: ConfigOwner) -> str:
+    if isinstance(owner, str):
+        return os.path.basename(owner)
+
+    host_type, host_id = owner
+    return f"{host_type.value} {host_id}"
+
+
+def parse_config(owner: ConfigOwner, text: str) -> list[str]:
+    """
+    parses rendered config of `owner` the way Ferron will and returns names of its top level nodes, which are the
+    virtual hosts it defines
+    """
+    try:
+        # Ferron reads both KDL 1.0 and 2.0 documents
+        document = ckdl.parse(text, version="any")
+    except ckdl.ParseError:
+        raise InvalidConfig(describe_owner(owner), "it is not valid KDL")
+
+    names: list[str] = []
+    for node in document.nodes:
+        if node.name in names:
+            raise InvalidConfig(describe_owner(owner), f'host "{node.name}" is defined more than once')
+        names.append(node.name)
+
+    return names
+
+
+@dataclass
+class HostNameChanges:
+    """
+    changes to a `HostNameIndex` which have been validated but not applied yet. None marks a removed entry
+    """
+
+    names: dict[ConfigOwner, tuple[str, ...] | None] = field(default_factory=dict)
+    owners: dict[str, ConfigOwner | None] = field(default_factory=dict)
+
+    def update(self, changes: "HostNameChanges") -> None:
+        self.names.update(changes.names)
+        self.owners.update(changes.owners)
+
+
+class HostNameIndex:
+    """
+    names of the virtual hosts defined by every config file, to reject a config defining a host another one
+    already defines. It is complete once every host config has been checked with `check_all()`
+    """
+
+    def __init__(self) -> None:
+        self._names: dict[ConfigOwner, tuple[str, ...]] = {}
+        self._owners: dict[str, ConfigOwner] = {}
+
+    def check(self, configs: dict[ConfigOwner, str | None], pending: HostNameChanges | None = None) -> HostNameChanges:
+        """
+        parses every config in `configs`, where None marks a removed config, on top of the index with `pending`
+        changes. Returns the changes `configs` make to the index, which are applied with `apply()` once written.
+        Raises `InvalidConfig` if any config is invalid or defines a host defined by another config
+        """
+        changes = HostNameChanges()
+        names = ChainMap(changes.names, pending.names if pending else {}, self._names)
+        owners = ChainMap(changes.owners, pending.owners if pending else {}, self._owners)
+
+        # names are released before any of them are claimed, so that configs can swap names with each other
+        for owner in configs:
+            for name in names.get(owner) or ():
+                if owners.get(name) == owner:
+                    changes.owners[name] = None
+
+        for owner, text in configs.items():
+            if text is None:
+                changes.names[owner] = None
+                continue
+
+            new_names = parse_config(owner, text)
+            for name in new_names:
+                other_owner = owners.get(name)
+                if other_owner is not None and other_owner != owner:
+                    raise InvalidConfig(
+                        describe_owner(owner), f'host "{name}" is already defined by {describe_owner(other_owner)}'
+                    )
+                changes.owners[name] = owner
+            changes.names[owner] = tuple(new_names)
+
+        return changes
+
+    def check_all(self, configs: dict[ConfigOwner, str]) -> HostNameChanges:
+        """
+        validates `configs` as the complete set of configs, returns changes which replace the whole index
+        """
+        changes = HostNameIndex().check(dict(configs))
+        for owner in self._names:
+            changes.names.setdefault(owner, None)
+        for name in self._owners:
+            changes.owners.setdefault(name, None)
+
+        return changes
+
+    def apply(self, changes: HostNameChanges) -> None:
+        for owner, names in changes.names.items():
+            if names is None:
+                self._names.pop(owner, None)
+            else:
+                self._names[owner] = names
+
+        for name, owner in changes.owners.items():
+            if owner is None:
+                self._owners.pop(name, None)
+            else:
+                self._owners[name] = owner
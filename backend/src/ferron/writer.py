@@ -0,0 +1,562 @@
+import asyncio
+import contextlib
+import logging
+import os
+from collections.abc import AsyncIterator
+from dataclasses import dataclass
+from typing import Any
+
+import aiofiles
+from aiofiles import os as aiofiles_os
+
+from src.config import settings
+from src.ferron.constants import SUB_CONFIG_PATH, ConfigLayoutType, HostType
+from src.ferron.exceptions import GenerationsDisabled, InvalidConfig
+from src.ferron.files import current_config_hashes, hash_config, remove_configs, write_configs_if_changed
+from src.ferron.generations import GenerationStore, release_generations
+from src.ferron.layout import ConfigLayout, HostKey, get_layout, owning_layout
+from src.ferron.registry import IncludeRegistry, include_registry
+from src.ferron.validation import ConfigOwner, HostNameChanges, HostNameIndex
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class WriteConfigFile:
+    """
+    writes `text` to the config file at `path` and includes it in the main config
+    """
+
+    path: str
+    text: str
+
+
+@dataclass(frozen=True)
+class WriteHostConfig:
+    """
+    writes rendered config of a host to the file the layout keeps it in
+    """
+
+    host_type: HostType
+    host_id: int
+    text: str
+
+    @property
+    def key(self) -> HostKey:
+        return self.host_type, self.host_id
+
+
+@dataclass(frozen=True)
+class RemoveHostConfig:
+    """
+    removes config of a host from the file the layout keeps it in. Files left without hosts are removed, after their
+    include in the main config
+    """
+
+    host_type: HostType
+    host_id: int
+
+    @property
+    def key(self) -> HostKey:
+        return self.host_type, self.host_id
+
+
+ConfigMutation = WriteConfigFile | WriteHostConfig | RemoveHostConfig
+
+
+@dataclass(frozen=True)
+class HostConfigsReplaced:
+    written_count: int  # files written because their content differed
+    unchanged_count: int  # files which already had the right content
+    removed_count: int  # files which didn't belong to any host anymore
+    changed: bool  # whether any file, including the main config, was changed
+
+
+@dataclass
+class _Submission:
+    mutations: list[ConfigMutation]
+    future: asyncio.Future[Any]
+    # complete set of rendered host configs replacing everything currently on disk
+    replace_hosts: dict[HostKey, str] | None = None
+
+
+class ConfigWriter:
+    """
+    single task owning the main config and the sub config directory. Submissions are applied in order, and those
+    queued together are written in one batch with the main config written once
+    """
+
+    def __init__(
+        self,
+        registry: IncludeRegistry,
+        layout: ConfigLayout,
+        root: str,
+        max_queue_size: int,
+        max_batch_size: int,
+        generations: GenerationStore | None = None,
+    ) -> None:
+        self.registry = registry
+        self.layout = layout
+        self.root = root
+        self.max_batch_size = max_batch_size
+        self.generations = generations
+
+        # rendered configs of hosts in files shared by several hosts, read from disk the first time a file is changed
+        self._shared_files: dict[str, dict[HostKey, str]] = {}
+        # hash of the content every file written by the writer is expected to have, None for files it removed. It is
+        # complete once every host config has been written with `replace_host_configs()` or recorded as a baseline
+        self._expected_hashes: dict[str, str | None] = {}
+        self.has_baseline = False
+        self._host_names = HostNameIndex()
+        # held while a batch is being applied
+        self._apply_lock = asyncio.Lock()
+
+        self._queue: asyncio.Queue[_Submission | None] = asyncio.Queue(maxsize=max_queue_size)
+        self._task: asyncio.Task[None] | None = None
+
+    async def load(self) -> None:
+        """
+        loads includes of the main config, from the current generation if generations are enabled
+        """
+        if self.generations is not None:
+            await self.generations.load(self.registry)
+        else:
+            # generations may have been enabled before
+            await release_generations(self.root, self.registry)
+            await self.registry.load()
+
+    def start(self) -> None:
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        """
+        applies every submission already in the queue and then stops the writer
+        """
+        if self._task is None:
+            return
+
+        await self._queue.put(None)
+        await self._task
+        self._task = None
+
+    async def submit(self, mutations: list[ConfigMutation]) -> bool:
+        """
+        waits until `mutations` have been applied. Returns whether any file was changed by them. Waits for free space
+        in the queue if it is full.
+        """
+        if self._task is None:
+            raise RuntimeError("Config writer has not been started")
+
+        submission = _Submission(mutations=mutations, future=asyncio.get_running_loop().create_future())
+        await self._queue.put(submission)
+
+        return await submission.future
+
+    async def replace_host_configs(
+        self, hosts: dict[HostKey, str], mutations: list[WriteConfigFile]
+    ) -> HostConfigsReplaced:
+        """
+        makes the sub config directory hold exactly the rendered configs in `hosts`, along with `mutations`. Only files
+        whose content differs are written, files of hosts not in `hosts` are removed along with dangling includes, and
+        the main config is written at most once for the host files
+        """
+        if self._task is None:
+            raise RuntimeError("Config writer has not been started")
+
+        submission = _Submission(
+            mutations=list(mutations), future=asyncio.get_running_loop().create_future(), replace_hosts=hosts
+        )
+        await self._queue.put(submission)
+
+        return await submission.future
+
+    def expected_hashes(self) -> dict[str, str | None]:
+        return dict(self._expected_hashes)
+
+    def record_baseline(self, hashes: dict[str, str]) -> None:
+        """
+        records expected hashes of files rendered from the database. Files the writer has written or removed since are
+        kept as they are, since the writer's state is newer
+        """
+        for path, digest in hashes.items():
+            self._expected_hashes.setdefault(path, digest)
+
+        self.has_baseline = True
+
+    async def rollback_generation(self, generation: int | None = None) -> int:
+        """
+        makes `generation`, or the one before the current one, the current generation. Files then no longer match the
+        database until they are reconciled. Returns the new current generation
+        """
+        if self.generations is None:
+            raise GenerationsDisabled()
+
+        async with self.idle():
+            generation = await self.generations.rollback(generation)
+            await self.generations.load(self.registry)
+
+            # files of the generation were written from an older state of the database
+            self._shared_files = {}
+            self._expected_hashes = {}
+            self.has_baseline = False
+
+        return generation
+
+    @contextlib.asynccontextmanager
+    async def idle(self) -> AsyncIterator[None]:
+        """
+        waits until no batch is being applied and keeps the writer from applying another one until exited
+        """
+        async with self._apply_lock:
+            yield
+
+    async def _run(self) -> None:
+        stopping = False
+        while not stopping:
+            batch: list[_Submission] = []
+
+            first_submission = await self._queue.get()
+            if first_submission is None:
+                break
+            batch.append(first_submission)
+
+            while len(batch) < self.max_batch_size:
+                try:
+                    submission = self._queue.get_nowait()
+                except asyncio.QueueEmpty:
+                    break
+
+                if submission is None:
+                    stopping = True
+                    break
+                batch.append(submission)
+
+            try:
+                async with self._apply_lock:
+                    results = await self._apply(batch)
+            except Exception as e:
+                logger.error("Failed to apply config changes: %s", e)
+                # shared files may not have been written as they are held in memory, they are read again when needed
+                self._shared_files.clear()
+                for submission in batch:
+                    if not submission.future.done():
+                        submission.future.set_exception(e)
+            else:
+                for submission, changed in zip(batch, results):
+                    if not submission.future.done():
+                        submission.future.set_result(changed)
+
+    async def _apply(self, batch: list[_Submission]) -> list[Any]:
+        results: list[Any] = []
+
+        # submissions replacing every host config are applied on their own, in order with the others
+        pending: list[_Submission] = []
+        for submission in batch:
+            if submission.replace_hosts is None:
+                pending.append(submission)
+                continue
+
+            results.extend(await self._apply_mutations(pending))
+            pending = []
+
+            # replaced configs are validated as a whole, since they replace every config the index knows
+            configs: dict[ConfigOwner, str] = {**submission.replace_hosts}
+            configs.update(self._submission_configs(submission))
+            try:
+                host_names = await asyncio.to_thread(self._host_names.check_all, configs)
+            except InvalidConfig as e:
+                submission.future.set_exception(e)
+                results.append(None)
+                continue
+
+            (changed,) = await self._apply_mutations([submission], validated=True)
+            try:
+                replaced = await self._replace_host_configs(submission.replace_hosts)
+            except InvalidConfig as e:
+                submission.future.set_exception(e)
+                results.append(None)
+                continue
+            self._host_names.apply(host_names)
+            results.append(
+                HostConfigsReplaced(
+                    written_count=replaced.written_count,
+                    unchanged_count=replaced.unchanged_count,
+                    removed_count=replaced.removed_count,
+                    changed=replaced.changed or changed,
+                )
+            )
+
+        results.extend(await self._apply_mutations(pending))
+
+        return results
+
+    async def _apply_mutations(self, batch: list[_Submission], validated: bool = False) -> list[bool]:
+        if not batch:
+            return []
+
+        # every submission is validated on top of the ones before it in the batch
+        host_names = HostNameChanges()
+        valid_batch: list[_Submission] = []
+        for submission in batch:
+            if validated:
+                valid_batch.append(submission)
+                continue
+
+            try:
+                host_names.update(self._host_names.check(self._submission_configs(submission), host_names))
+            except InvalidConfig as e:
+                submission.future.set_exception(e)
+            else:
+                valid_batch.append(submission)
+
+        # final state of every file and host touched by the batch, a later mutation replaces an earlier one
+        file_mutations: dict[str, WriteConfigFile] = {}
+        host_mutations: dict[HostKey, WriteHostConfig | RemoveHostConfig] = {}
+        for submission in valid_batch:
+            for mutation in submission.mutations:
+                if isinstance(mutation, WriteConfigFile):
+                    file_mutations[mutation.path] = mutation
+                else:
+                    host_mutations.pop(mutation.key, None)
+                    host_mutations[mutation.key] = mutation
+
+        written_files: dict[str, str] = {}
+        removed_paths: list[str] = []
+
+        for path, mutation in file_mutations.items():
+            written_files[path] = mutation.text
+
+        host_mutations_by_file: dict[str, list[WriteHostConfig | RemoveHostConfig]] = {}
+        for key, mutation in host_mutations.items():
+            host_mutations_by_file.setdefault(self.layout.file_name(key), []).append(mutation)
+
+        for file_name, mutations in host_mutations_by_file.items():
+            path = self.host_file_path(file_name)
+            sections = await self._file_sections(file_name)
+
+            for mutation in mutations:
+                if isinstance(mutation, WriteHostConfig):
+                    sections[mutation.key] = mutation.text
+                else:
+                    sections.pop(mutation.key, None)
+
+            if sections:
+                written_files[path] = self.layout.render_file(file_name, sections)
+            else:
+                self._shared_files.pop(file_name, None)
+                removed_paths.append(path)
+
+        # every file included by the batch is written by it, before the main config. Includes the batch doesn't touch
+        # aren't checked here, that would cost a check of every host per batch. Drift checks report them, and
+        # reconciling writes or removes every host file
+        changed_paths: set[str] = set()
+        with self.registry.transaction():
+            for path in written_files:
+                if self.registry.add(path):
+                    changed_paths.add(path)
+            for path in removed_paths:
+                self._expected_hashes[path] = None
+                if self.registry.remove(path):
+                    changed_paths.add(path)
+
+            written_paths, removed_paths, _includes_changed = await self._commit(written_files, removed_paths)
+        changed_paths.update(written_paths)
+        changed_paths.update(removed_paths)
+        self._host_names.apply(host_names)
+
+        return [
+            any(self._mutation_path(mutation) in changed_paths for mutation in submission.mutations)
+            for submission in batch
+        ]
+
+    async def _replace_host_configs(self, hosts: dict[HostKey, str]) -> HostConfigsReplaced:
+        files: dict[str, dict[HostKey, str]] = {}
+        for key, text in hosts.items():
+            files.setdefault(self.layout.file_name(key), {})[key] = text
+
+        written_files = {
+            self.host_file_path(file_name): self.layout.render_file(file_name, sections)
+            for file_name, sections in files.items()
+        }
+
+        # host files of any layout which aren't part of `hosts`, either on disk or only included in the main config
+        stale_paths = {
+            path
+            for path in self.registry.paths()
+            if os.path.dirname(path) == self.root and owning_layout(os.path.basename(path)) is not None
+        }
+        for file_name in await aiofiles_os.listdir(self.storage_dir()):
+            if owning_layout(file_name) is not None:
+                stale_paths.add(self.host_file_path(file_name))
+        stale_paths -= {self.host_file_path(file_name) for file_name in files}
+
+        # Ferron fails to load a config including a file which doesn't exist, e.g. one removed by hand
+        missing_paths = await asyncio.to_thread(
+            self._missing_include_targets, set(self.registry.paths()) - stale_paths - set(written_files)
+        )
+        if missing_paths:
+            raise InvalidConfig(
+                os.path.basename(self.registry.path), f"included file {', '.join(missing_paths)} doesn't exist"
+            )
+
+        with self.registry.transaction():
+            for path in written_files:
+                self.registry.add(path)
+            for path in stale_paths:
+                self._expected_hashes[path] = None
+                self.registry.remove(path)
+
+            # files are compared with their content on disk, since reconciling has to repair files changed by hand
+            written_paths, removed_paths, includes_changed = await self._commit(
+                written_files, sorted(stale_paths), verify=True
+            )
+        written_count = len(written_paths)
+        unchanged_count = len(written_files) - written_count
+        removed_count = len(removed_paths)
+
+        self._shared_files = files if self.layout.shared_files else {}
+        self.has_baseline = True
+
+        return HostConfigsReplaced(
+            written_count=written_count,
+            unchanged_count=unchanged_count,
+            removed_count=removed_count,
+            changed=bool(written_count or removed_count or includes_changed),
+        )
+
+    async def _commit(
+        self, files: dict[str, str], removed_paths: list[str], verify: bool = False
+    ) -> tuple[list[str], list[str], bool]:
+        """
+        writes `files` and the main config and removes files at `removed_paths`. Returns paths of the files which were
+        written, paths of the files which were removed and whether includes of the main config changed
+        """
+        expected_hashes = {path: hash_config(text) for path, text in files.items()}
+
+        if self.generations is None:
+            self._expected_hashes.update(expected_hashes)
+            # all files are written together, before the main config which includes them
+            written_paths = await write_configs_if_changed(files)
+            # includes are removed before the files they point to, so that ferron never sees an include of a missing
+            # file
+            includes_changed = await self.registry.persist()
+            return written_paths, await remove_configs(removed_paths), includes_changed
+
+        # files of the current generation are compared with what the writer gave them, or read back if `verify`
+        if verify:
+            current_hashes = await current_config_hashes([self.storage_path(path) for path in files])
+            changed_files = {
+                path: text
+                for path, text in files.items()
+                if current_hashes[self.storage_path(path)] != expected_hashes[path]
+            }
+        else:
+            changed_files = {
+                path: text for path, text in files.items() if self._expected_hashes.get(path) != expected_hashes[path]
+            }
+        self._expected_hashes.update(expected_hashes)
+
+        existing_removed_paths = [
+            path for path in removed_paths if await aiofiles_os.path.exists(self.storage_path(path))
+        ]
+        includes_changed = self.registry.dirty
+
+        if not changed_files and not existing_removed_paths and not includes_changed:
+            return [], [], False
+
+        await self.generations.commit(changed_files, existing_removed_paths, self.registry)
+        self.registry.mark_persisted()
+
+        return list(changed_files), existing_removed_paths, includes_changed
+
+    def _missing_include_targets(self, paths: set[str]) -> list[str]:
+        return sorted(
+            path
+            for path in paths
+            if not os.path.exists(self.storage_path(path) if os.path.dirname(path) == self.root else path)
+        )
+
+    @staticmethod
+    def _submission_configs(submission: _Submission) -> dict[ConfigOwner, str | None]:
+        """
+        rendered configs of a submission by their owner, None for removed host configs
+        """
+        configs: dict[ConfigOwner, str | None] = {}
+        for mutation in submission.mutations:
+            if isinstance(mutation, WriteConfigFile):
+                configs[mutation.path] = mutation.text
+            elif isinstance(mutation, WriteHostConfig):
+                configs[mutation.key] = mutation.text
+            else:
+                configs[mutation.key] = None
+
+        return configs
+
+    def storage_dir(self) -> str:
+        """
+        directory the files are currently in, which is the current generation if generations are enabled
+        """
+        if self.generations is None or self.generations.current is None:
+            return self.root
+
+        return self.generations.generation_dir(self.generations.current)
+
+    def storage_path(self, path: str) -> str:
+        """
+        path where the file at `path` directly under `root` currently is
+        """
+        if self.generations is None:
+            return path
+
+        return self.generations.storage_path(path)
+
+    def main_config(self) -> tuple[str, str]:
+        """
+        path and expected content of the main config holding the includes
+        """
+        if self.generations is None or self.generations.current is None:
+            return self.registry.path, self.registry.render()
+
+        return (
+            self.storage_path(os.path.join(self.root, "main.kdl")),
+            self.generations.render_main_config(self.registry, self.generations.current),
+        )
+
+    def host_file_path(self, file_name: str) -> str:
+        return os.path.join(self.root, file_name)
+
+    def _mutation_path(self, mutation: ConfigMutation) -> str:
+        if isinstance(mutation, WriteConfigFile):
+            return mutation.path
+
+        return self.host_file_path(self.layout.file_name(mutation.key))
+
+    async def _file_sections(self, file_name: str) -> dict[HostKey, str]:
+        if not self.layout.shared_files:
+            return {}
+
+        sections = self._shared_files.get(file_name)
+        if sections is None:
+            try:
+                async with aiofiles.open(self.storage_path(self.host_file_path(file_name)), "r") as f:
+                    sections = self.layout.parse_file(file_name, await f.read())
+            except FileNotFoundError:
+                sections = {}
+
+            self._shared_files[file_name] = sections
+
+        return sections
+
+
+config_writer = ConfigWriter(
+    include_registry,
+    get_layout(ConfigLayoutType(settings.config_layout), settings.config_layout_shard_count),
+    SUB_CONFIG_PATH,
+    max_queue_size=settings.config_writer_queue_size,
+    max_batch_size=settings.config_writer_max_batch_size,
+    generations=(
+        GenerationStore(SUB_CONFIG_PATH, keep=settings.config_generations_keep)
+        if settings.config_generations_enabled
+        else None
+    ),
+)
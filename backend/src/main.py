@@ -1,4 +1,6 @@
 import asyncio
+import functools
+import logging
 import os
 from collections.abc import AsyncIterator
 from contextlib import asynccontextmanager
@@ -11,19 +13,41 @@ from slowapi.errors import RateLimitExceeded
 from sqlmodel.ext.asyncio.session import AsyncSession as SQLModelAsyncSession
 from starlette.requests import Request
 from starlette.responses import JSONResponse
+from uvicorn.logging import DefaultFormatter
 
 from src.auth.router import router as auth_router
+from src.clients import create_docker_client, create_http_client
 from src.config import settings
-from src.database import engine, run_migrations
+from src.database import engine, lock_config_files, read_sqlite_pragmas, run_migrations, unlock_config_files
 from src.exceptions import RateLimitExceededCustomException
-from src.ferron.constants import ConfigFileLocation
+from src.ferron.constants import SUB_CONFIG_PATH, ConfigFileLocation
+from src.ferron.drift import drift_detector
+from src.ferron.layout import migrate_layout
+from src.ferron.reconcile import reconcile_configs
+from src.ferron.registry import include_registry
+from src.ferron.reload import reload_scheduler
 from src.ferron.router import router as config_router
+from src.ferron.utils import load_templates, reload_ferron_service
+from src.ferron.writer import config_writer
 from src.management.router import router as management_router
 from src.service import create_ferron_global_config, rate_limiter
 
+logger = logging.getLogger(__name__)
+
+# uvicorn only configures its own loggers, messages of the app are logged the same way next to them
+_app_log_handler = logging.StreamHandler()
+_app_log_handler.setFormatter(DefaultFormatter("%(levelprefix)s %(message)s"))
+_app_logger = logging.getLogger("src")
+_app_logger.setLevel(logging.INFO)
+_app_logger.addHandler(_app_log_handler)
+_app_logger.propagate = False
+
 
 @asynccontextmanager
-async def lifespan(_app: FastAPI) -> AsyncIterator[None]:
+async def lifespan(app: FastAPI) -> AsyncIterator[None]:
+    # config files are written by a single instance, starting a second one against the same database fails here
+    config_files_lock = await lock_config_files(engine)
+
     # have to create it since main.kdl is expected to be present on every start
     # this won't modify the file if it already exists
     async with aiofiles.open(ConfigFileLocation.MAIN_CONFIG.value, "a"):
@@ -32,6 +56,19 @@ async def lifespan(_app: FastAPI) -> AsyncIterator[None]:
     # permissions are being set to 644 so that ferron can read the config files
     await asyncio.to_thread(os.chmod, ConfigFileLocation.MAIN_CONFIG.value, 0o644)
 
+    # includes of main.kdl are read once here, after this they are only changed through the registry
+    await config_writer.load()
+
+    # host configs written with a different layout than the configured one are moved to it. Generations are only
+    # changed by the writer, reconciling moves them to the configured layout instead
+    moved_count = 0
+    if config_writer.generations is None:
+        moved_count = await migrate_layout(config_writer.layout, SUB_CONFIG_PATH, include_registry)
+    if moved_count:
+        logger.info("Moved %d host configs to the %s layout", moved_count, config_writer.layout.layout_type.value)
+
+    config_writer.start()
+
     # include the main config file in /etc/ferron.kdl if it hasn't been included already
     async with aiofiles.open("/etc/ferron.kdl", "r") as f:
         content = await f.read()
@@ -48,12 +85,59 @@ async def lifespan(_app: FastAPI) -> AsyncIterator[None]:
 
     await asyncio.to_thread(run_migrations)
 
+    if engine.dialect.name == "sqlite":
+        sqlite_pragmas = await read_sqlite_pragmas()
+        logger.info("SQLite settings: %s", ", ".join(f"{name}={value}" for name, value in sqlite_pragmas.items()))
+    else:
+        logger.info(
+            "Database: %s, pool of %d connections and up to %d more",
+            engine.dialect.name,
+            settings.database_pool_size,
+            settings.database_max_overflow,
+        )
+
+    # templates are compiled once here instead of on the first request rendering each of them
+    await asyncio.to_thread(load_templates)
+
+    app.state.docker_client = create_docker_client()
+    app.state.http_client = create_http_client()
+
+    reload_scheduler.start(functools.partial(reload_ferron_service, app.state.docker_client))
+    if moved_count:
+        await reload_scheduler.request_reload()
+
     # check if ferron global configuration exists, if not then create a default one
     async with SQLModelAsyncSession(engine) as session:
         await create_ferron_global_config(session)
 
+        # rebuilds config files which were lost or changed while the app wasn't running
+        if settings.reconcile_on_startup:
+            reconcile_result = await reconcile_configs(session)
+            logger.info(
+                "Reconciled %d hosts, %d rendered again: %d files written, %d removed, %d unchanged in %.0f ms",
+                reconcile_result.hosts,
+                reconcile_result.hosts_rendered,
+                reconcile_result.files_written,
+                reconcile_result.files_removed,
+                reconcile_result.files_unchanged,
+                reconcile_result.timings.total_ms,
+            )
+
+    drift_detector.start()
+
     yield
 
+    await drift_detector.stop()
+    # changes still waiting to be written are written before the final reload
+    await config_writer.stop()
+    await reload_scheduler.stop()
+
+    await app.state.http_client.aclose()
+    await app.state.docker_client.close()
+
+    if config_files_lock is not None:
+        await unlock_config_files(config_files_lock)
+
 
 origins = ["http://localhost:5173", "http://localhost:3000"]
 app = FastAPI(
@@ -1,6 +1,10 @@
+from typing import Annotated
+
+import httpx
 from fastapi import APIRouter, Depends
 
 from src.auth.dependencies import get_current_user
+from src.clients import get_http_client
 from src.exceptions import InvalidTokenException
 from src.management import schemas, service
 from src.management.exceptions import GitHubAPIException, GitHubAPIMalformedResponseException, VersionParseException
@@ -37,8 +41,10 @@ async def get_current_version() -> schemas.VersionResponse:
         generate_error_response(VersionParseException),
     ),
 )
-async def get_latest_version() -> schemas.LatestVersionResponse:
-    return await service.get_latest_version()
+async def get_latest_version(
+    http_client: Annotated[httpx.AsyncClient, Depends(get_http_client)],
+) -> schemas.LatestVersionResponse:
+    return await service.get_latest_version(http_client)
 
 
 @version_router.get(
@@ -50,8 +56,10 @@ async def get_latest_version() -> schemas.LatestVersionResponse:
         generate_error_response(VersionParseException),
     ),
 )
-async def check_update_available() -> schemas.UpdateAvailableResponse:
-    return await service.check_update_available()
+async def check_update_available(
+    http_client: Annotated[httpx.AsyncClient, Depends(get_http_client)],
+) -> schemas.UpdateAvailableResponse:
+    return await service.check_update_available(http_client)
 
 
 router.include_router(version_router)
@@ -20,7 +20,7 @@ def get_current_version() -> schemas.VersionResponse:
     return schemas.VersionResponse(version=version)
 
 
-async def get_latest_version() -> schemas.LatestVersionResponse:
+async def get_latest_version(http_client: httpx.AsyncClient) -> schemas.LatestVersionResponse:
     global _latest_version_cache
 
     if _latest_version_cache is not None:
@@ -31,15 +31,13 @@ async def get_latest_version() -> schemas.LatestVersionResponse:
 
     # is only run when cache is stale or doesn't exist
     try:
-        async with httpx.AsyncClient() as client:
-            response = await client.get(
-                GITHUB_API_URL,
-                headers={"Accept": "application/vnd.github+json"},  # this specific header is because of
-                # https://docs.github.com/en/rest/releases/releases?apiVersion=2022-11-28#get-the-latest-release--parameters
-                timeout=2.0,
-            )
-            response.raise_for_status()
-            data = response.json()
+        response = await http_client.get(
+            GITHUB_API_URL,
+            headers={"Accept": "application/vnd.github+json"},  # this specific header is because of
+            # https://docs.github.com/en/rest/releases/releases?apiVersion=2022-11-28#get-the-latest-release--parameters
+        )
+        response.raise_for_status()
+        data = response.json()
     except httpx.HTTPStatusError as e:
         raise GitHubAPIException(f"GitHub API returned status {e.response.status_code}") from e
     except httpx.RequestError as e:
@@ -68,9 +66,9 @@ async def get_latest_version() -> schemas.LatestVersionResponse:
     return latest_version_response
 
 
-async def check_update_available() -> schemas.UpdateAvailableResponse:
+async def check_update_available(http_client: httpx.AsyncClient) -> schemas.UpdateAvailableResponse:
     current_version_response = get_current_version()
-    latest_version_response = await get_latest_version()
+    latest_version_response = await get_latest_version(http_client)
 
     update_available = latest_version_response.version > current_version_response.version
 
@@ -0,0 +1,148 @@
+from collections.abc import AsyncGenerator
+from typing import Any
+from unittest import mock
+
+import pytest
+from sqlalchemy import select
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from src.ferron import models, schemas, service
+from src.ferron.constants import HostType
+from src.ferron.exceptions import BatchOperationFailed
+
+
+@pytest.fixture
+def write_files() -> AsyncGenerator[mock.AsyncMock, None]:
+    with mock.patch.object(service, "update_host_configs_in_files", mock.AsyncMock(return_value=True)) as write_files:
+        yield write_files
+
+
+@pytest.fixture
+def request_reload() -> AsyncGenerator[mock.AsyncMock, None]:
+    with mock.patch.object(service.reload_scheduler, "request_reload", mock.AsyncMock()) as request_reload:
+        yield request_reload
+
+
+def batch(*operations: dict[str, Any]) -> schemas.ConfigBatch:
+    return schemas.ConfigBatch.model_validate({"operations": operations})
+
+
+def reverse_proxy(name: str, **fields: Any) -> dict[str, Any]:  # noqa: ANN401
+    return {"virtual_host_name": name, "backend_url": "http://backend", **fields}
+
+
+async def read_virtual_host_names(session: AsyncSession) -> dict[int, str]:
+    rows = (await session.exec(select(models.ReverseProxyConfig))).scalars().all()
+    return {row.id: row.virtual_host_name for row in rows}
+
+
+async def create(session: AsyncSession, *names: str) -> None:
+    for name in names:
+        config = schemas.CreateReverseProxyConfig(**reverse_proxy(name))
+        await service._create_reverse_proxy_config_record(config, session)
+    await session.commit()
+
+
+@pytest.mark.asyncio
+async def test_operations_are_applied_with_one_write_and_reload(
+    session: AsyncSession, write_files: mock.AsyncMock, request_reload: mock.AsyncMock
+) -> None:
+    await create(session, "a.example.com", "b.example.com")
+
+    result = await service.apply_config_batch(
+        batch(
+            {"op": "create_reverse_proxy", "config": reverse_proxy("c.example.com")},
+            {"op": "update_reverse_proxy", "config": reverse_proxy("a2.example.com", id=1)},
+            {"op": "delete_reverse_proxy", "id": 2},
+            {"op": "create_static_file", "config": {"virtual_host_name": "b.example.com", "static_files_dir": "/srv"}},
+        ),
+        session,
+    )
+
+    assert [operation.op for operation in result.results] == [
+        "create_reverse_proxy",
+        "update_reverse_proxy",
+        "delete_reverse_proxy",
+        "create_static_file",
+    ]
+    assert await read_virtual_host_names(session) == {1: "a2.example.com", 3: "c.example.com"}
+
+    write_files.assert_awaited_once()
+    written_hosts, deleted_hosts = write_files.await_args.args
+    assert [(host_type, host_id) for host_type, host_id, _rendered_config in written_hosts] == [
+        (HostType.REVERSE_PROXY, 3),
+        (HostType.REVERSE_PROXY, 1),
+        (HostType.STATIC_FILE, 1),
+    ]
+    # files are written with the configs stored with the hosts
+    rendered_config = (await session.get(models.ReverseProxyConfig, 1)).rendered_kdl
+    assert "a2.example.com" in rendered_config
+    assert written_hosts[1][2] == rendered_config
+    assert deleted_hosts == [(HostType.REVERSE_PROXY, 2)]
+    request_reload.assert_awaited_once()
+
+
+@pytest.mark.asyncio
+async def test_failing_operation_rolls_back_the_batch(
+    session: AsyncSession, write_files: mock.AsyncMock, request_reload: mock.AsyncMock
+) -> None:
+    await create(session, "a.example.com")
+
+    with pytest.raises(BatchOperationFailed) as error:
+        await service.apply_config_batch(
+            batch(
+                {"op": "update_reverse_proxy", "config": reverse_proxy("a2.example.com", id=1)},
+                {"op": "delete_reverse_proxy", "id": 5},
+            ),
+            session,
+        )
+    await session.rollback()
+
+    assert error.value.detail["index"] == 1
+    assert error.value.detail["error"]["error_code"] == "config_not_found"
+    assert await read_virtual_host_names(session) == {1: "a.example.com"}
+    write_files.assert_not_awaited()
+    request_reload.assert_not_awaited()
+
+
+@pytest.mark.asyncio
+async def test_host_created_and_deleted_in_a_batch_is_never_written(
+    session: AsyncSession, write_files: mock.AsyncMock, request_reload: mock.AsyncMock
+) -> None:
+    await service.apply_config_batch(
+        batch(
+            {"op": "create_reverse_proxy", "config": reverse_proxy("a.example.com")},
+            {"op": "delete_reverse_proxy", "id": 1},
+        ),
+        session,
+    )
+
+    assert await read_virtual_host_names(session) == {}
+    write_files.assert_awaited_once_with([], [])
+
+
+@pytest.mark.asyncio
+async def test_host_changed_twice_may_keep_its_name(
+    session: AsyncSession, write_files: mock.AsyncMock, request_reload: mock.AsyncMock
+) -> None:
+    await create(session, "a.example.com", "b.example.com")
+
+    await service.apply_config_batch(
+        batch(
+            {"op": "update_reverse_proxy", "config": reverse_proxy("a.example.com", id=1, cache=True)},
+            {"op": "update_reverse_proxy", "config": reverse_proxy("a.example.com", id=1, cache_max_age=60)},
+        ),
+        session,
+    )
+    assert await read_virtual_host_names(session) == {1: "a.example.com", 2: "b.example.com"}
+
+    # but two hosts can't end up with the same one
+    with pytest.raises(BatchOperationFailed) as error:
+        await service.apply_config_batch(
+            batch(
+                {"op": "update_reverse_proxy", "config": reverse_proxy("c.example.com", id=1)},
+                {"op": "update_reverse_proxy", "config": reverse_proxy("c.example.com", id=2)},
+            ),
+            session,
+        )
+    assert error.value.detail["index"] == 1
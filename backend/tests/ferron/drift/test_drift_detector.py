@@ -0,0 +1,48 @@
+from pathlib import Path
+
+import pytest
+
+from src.ferron.constants import HostType
+from src.ferron.drift import DriftDetector
+from src.ferron.layout import PerHostLayout
+from src.ferron.registry import IncludeRegistry
+from src.ferron.writer import ConfigWriter
+
+
+@pytest.mark.asyncio
+async def test_check_reports_drift(tmp_path: Path) -> None:
+    registry = IncludeRegistry(str(tmp_path / "main.kdl"))
+    await registry.load()
+    writer = ConfigWriter(registry, PerHostLayout(), str(tmp_path), max_queue_size=10, max_batch_size=10)
+    writer.start()
+
+    await writer.replace_host_configs(
+        {
+            (HostType.REVERSE_PROXY, 1): "a\n",
+            (HostType.REVERSE_PROXY, 2): "b\n",
+            (HostType.STATIC_FILE, 3): "c\n",
+        },
+        [],
+    )
+
+    detector = DriftDetector(writer, interval_seconds=0, auto_repair=False)
+
+    report = await detector.check()
+    assert report.has_drift is False
+    assert report.files_checked == 4
+
+    (tmp_path / "1_reverse_proxy.kdl").write_text("edited by hand\n")
+    (tmp_path / "3_static_file.kdl").unlink()
+    (tmp_path / "4_load_balancer.kdl").write_text("left behind\n")
+
+    report = await detector.check()
+    await writer.stop()
+
+    assert report.has_drift is True
+    assert report.modified == [str(tmp_path / "1_reverse_proxy.kdl")]
+    assert report.missing == [str(tmp_path / "3_static_file.kdl")]
+    assert report.orphaned == [str(tmp_path / "4_load_balancer.kdl")]
+    assert report.dangling_includes == []
+    assert report.main_config_modified is False
+    assert report.repaired is False
+    assert detector.last_report == report
@@ -0,0 +1,58 @@
+from pathlib import Path
+
+import pytest
+
+from src.ferron.files import remove_config, write_config_if_changed
+
+
+@pytest.mark.asyncio
+async def test_writes_new_file(tmp_path: Path) -> None:
+    path = tmp_path / "1_reverse_proxy.kdl"
+
+    assert await write_config_if_changed(str(path), "text") is True
+
+    assert path.read_text() == "text"
+    assert path.stat().st_mode & 0o777 == 0o644
+
+
+@pytest.mark.asyncio
+async def test_skips_unchanged_content(tmp_path: Path) -> None:
+    path = tmp_path / "1_reverse_proxy.kdl"
+    await write_config_if_changed(str(path), "text")
+    inode = path.stat().st_ino
+
+    assert await write_config_if_changed(str(path), "text") is False
+    # file wasn't replaced
+    assert path.stat().st_ino == inode
+
+
+@pytest.mark.asyncio
+async def test_writes_changed_content(tmp_path: Path) -> None:
+    path = tmp_path / "1_reverse_proxy.kdl"
+    await write_config_if_changed(str(path), "text")
+
+    assert await write_config_if_changed(str(path), "new text") is True
+
+    assert path.read_text() == "new text"
+
+
+@pytest.mark.asyncio
+async def test_rewrites_file_edited_by_hand(tmp_path: Path) -> None:
+    path = tmp_path / "1_reverse_proxy.kdl"
+    await write_config_if_changed(str(path), "text")
+
+    path.write_text("edited by hand")
+
+    assert await write_config_if_changed(str(path), "text") is True
+
+    assert path.read_text() == "text"
+
+
+@pytest.mark.asyncio
+async def test_writes_removed_file_again(tmp_path: Path) -> None:
+    path = tmp_path / "1_reverse_proxy.kdl"
+    await write_config_if_changed(str(path), "text")
+    await remove_config(str(path))
+
+    assert await write_config_if_changed(str(path), "text") is True
+    assert path.exists()
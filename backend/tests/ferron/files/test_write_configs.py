@@ -0,0 +1,49 @@
+import os
+from pathlib import Path
+
+import pytest
+
+from src.ferron.files import remove_configs, write_configs, write_configs_if_changed
+
+
+@pytest.mark.asyncio
+async def test_writes_all_files_of_a_batch(tmp_path: Path) -> None:
+    file_names = [f"{i}_reverse_proxy.kdl" for i in range(5)]
+
+    await write_configs({str(tmp_path / file_name): f"text {file_name}" for file_name in file_names})
+
+    for file_name in file_names:
+        assert (tmp_path / file_name).read_text() == f"text {file_name}"
+        assert (tmp_path / file_name).stat().st_mode & 0o777 == 0o644
+    # no temp files are left behind
+    assert sorted(os.listdir(tmp_path)) == sorted(file_names)
+
+
+@pytest.mark.asyncio
+async def test_only_changed_files_are_written(tmp_path: Path) -> None:
+    first = str(tmp_path / "1_reverse_proxy.kdl")
+    second = str(tmp_path / "2_reverse_proxy.kdl")
+    await write_configs({first: "a", second: "b"})
+
+    assert await write_configs_if_changed({first: "a", second: "changed"}) == [second]
+
+
+@pytest.mark.asyncio
+async def test_failed_batch_leaves_no_temp_files(tmp_path: Path) -> None:
+    written = str(tmp_path / "1_reverse_proxy.kdl")
+    # a directory can't be replaced by a file
+    (tmp_path / "2_reverse_proxy.kdl").mkdir()
+
+    with pytest.raises(OSError):
+        await write_configs({written: "a", str(tmp_path / "2_reverse_proxy.kdl"): "b"})
+
+    assert sorted(os.listdir(tmp_path)) == ["1_reverse_proxy.kdl", "2_reverse_proxy.kdl"]
+
+
+@pytest.mark.asyncio
+async def test_remove_configs_returns_existing_files(tmp_path: Path) -> None:
+    path = str(tmp_path / "1_reverse_proxy.kdl")
+    await write_configs({path: "a"})
+
+    assert await remove_configs([path, str(tmp_path / "2_reverse_proxy.kdl")]) == [path]
+    assert os.listdir(tmp_path) == []
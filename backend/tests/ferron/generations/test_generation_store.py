@@ -0,0 +1,119 @@
+import os
+from pathlib import Path
+
+import pytest
+
+from src.ferron.constants import HostType
+from src.ferron.exceptions import GenerationNotFound
+from src.ferron.generations import GenerationStore
+from src.ferron.layout import PerHostLayout
+from src.ferron.registry import IncludeRegistry
+from src.ferron.writer import ConfigWriter, RemoveHostConfig, WriteHostConfig
+
+
+async def start_writer(tmp_path: Path, keep: int = 5) -> ConfigWriter:
+    writer = ConfigWriter(
+        IncludeRegistry(str(tmp_path / "main.kdl")),
+        PerHostLayout(),
+        str(tmp_path),
+        max_queue_size=1000,
+        max_batch_size=100,
+        generations=GenerationStore(str(tmp_path), keep=keep),
+    )
+    await writer.load()
+    writer.start()
+    return writer
+
+
+@pytest.mark.asyncio
+async def test_existing_files_are_adopted_into_first_generation(tmp_path: Path) -> None:
+    host_file = tmp_path / "1_reverse_proxy.kdl"
+    host_file.write_text("a\n")
+    (tmp_path / "main.kdl").write_text(f'include "{host_file}"\n')
+
+    writer = await start_writer(tmp_path)
+    await writer.stop()
+
+    assert writer.generations.current == 1
+    assert sorted(os.listdir(tmp_path / "current")) == ["1_reverse_proxy.kdl", "main.kdl"]
+    assert not host_file.exists()
+    assert (tmp_path / "main.kdl").read_text() == f'include "{tmp_path / "current" / "main.kdl"}"\n'
+    assert (tmp_path / "current" / "main.kdl").read_text() == (
+        f'include "{tmp_path / "generations" / "gen-1" / "1_reverse_proxy.kdl"}"\n'
+    )
+    assert list(writer.registry.paths()) == [str(host_file)]
+
+
+@pytest.mark.asyncio
+async def test_commit_links_unchanged_files(tmp_path: Path) -> None:
+    writer = await start_writer(tmp_path)
+
+    await writer.submit(
+        [WriteHostConfig(HostType.REVERSE_PROXY, 1, "a\n"), WriteHostConfig(HostType.STATIC_FILE, 2, "b\n")]
+    )
+    assert await writer.submit([WriteHostConfig(HostType.REVERSE_PROXY, 1, "c\n")]) is True
+    # nothing changed, so no generation is created
+    assert await writer.submit([WriteHostConfig(HostType.REVERSE_PROXY, 1, "c\n")]) is False
+    await writer.stop()
+
+    first_dir = tmp_path / "generations" / "gen-2"
+    second_dir = tmp_path / "generations" / "gen-3"
+    assert writer.generations.current == 3
+    assert (first_dir / "1_reverse_proxy.kdl").read_text() == "a\n"
+    assert (second_dir / "1_reverse_proxy.kdl").read_text() == "c\n"
+    assert os.stat(first_dir / "2_static_file.kdl").st_ino == os.stat(second_dir / "2_static_file.kdl").st_ino
+    assert (tmp_path / "current" / "main.kdl").read_text() == (
+        f'include "{second_dir / "1_reverse_proxy.kdl"}"\ninclude "{second_dir / "2_static_file.kdl"}"\n'
+    )
+
+
+@pytest.mark.asyncio
+async def test_old_generations_are_collected(tmp_path: Path) -> None:
+    writer = await start_writer(tmp_path, keep=2)
+
+    for i in range(5):
+        await writer.submit([WriteHostConfig(HostType.REVERSE_PROXY, 1, f"// {i}\n")])
+    await writer.stop()
+
+    assert sorted(os.listdir(tmp_path / "generations")) == ["gen-5", "gen-6"]
+
+
+@pytest.mark.asyncio
+async def test_rollback_restores_previous_generation(tmp_path: Path) -> None:
+    writer = await start_writer(tmp_path)
+
+    await writer.submit([WriteHostConfig(HostType.REVERSE_PROXY, 1, "a\n")])
+    await writer.submit([RemoveHostConfig(HostType.REVERSE_PROXY, 1)])
+    assert not (tmp_path / "current" / "1_reverse_proxy.kdl").exists()
+
+    assert await writer.rollback_generation() == 2
+    assert (tmp_path / "current" / "1_reverse_proxy.kdl").read_text() == "a\n"
+    assert list(writer.registry.paths()) == [str(tmp_path / "1_reverse_proxy.kdl")]
+    assert writer.has_baseline is False
+
+    # the next change is made on top of the generation which was rolled back to
+    await writer.submit([WriteHostConfig(HostType.STATIC_FILE, 2, "b\n")])
+    await writer.stop()
+
+    assert writer.generations.current == 4
+    assert (tmp_path / "current" / "1_reverse_proxy.kdl").read_text() == "a\n"
+
+    with pytest.raises(GenerationNotFound):
+        await writer.rollback_generation(100)
+
+
+@pytest.mark.asyncio
+async def test_disabling_generations_moves_files_back(tmp_path: Path) -> None:
+    writer = await start_writer(tmp_path)
+    await writer.submit([WriteHostConfig(HostType.REVERSE_PROXY, 1, "a\n")])
+    await writer.stop()
+
+    registry = IncludeRegistry(str(tmp_path / "main.kdl"))
+    writer = ConfigWriter(registry, PerHostLayout(), str(tmp_path), max_queue_size=1000, max_batch_size=100)
+    await writer.load()
+
+    assert (tmp_path / "1_reverse_proxy.kdl").read_text() == "a\n"
+    assert (tmp_path / "main.kdl").read_text() == f'include "{tmp_path / "1_reverse_proxy.kdl"}"\n'
+    assert not (tmp_path / "current").exists()
+    assert not (tmp_path / "generations").exists()
+    assert list(registry.paths()) == [str(tmp_path / "1_reverse_proxy.kdl")]
@@ -0,0 +1,63 @@
+import pytest
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from src.ferron import history, schemas, service
+from src.ferron.constants import HostType
+from src.ferron.exceptions import ChangesNotAvailable
+
+
+async def create(session: AsyncSession, name: str) -> schemas.UpdateReverseProxyConfig:
+    config = await service._create_reverse_proxy_config_record(
+        schemas.CreateReverseProxyConfig(virtual_host_name=name, backend_url="http://backend"), session
+    )
+    await session.commit()
+    return config
+
+
+@pytest.mark.asyncio
+async def test_only_hosts_changed_since_are_returned(session: AsyncSession) -> None:
+    unchanged = await create(session, "a.example.com")
+    updated = await create(session, "b.example.com")
+    deleted = await create(session, "c.example.com")
+    since = await service.read_config_revision(session)
+
+    updated = await service._update_reverse_proxy_config_record(updated.model_copy(update={"cache": True}), session)
+    await service._delete_reverse_proxy_config_record(deleted.id, session)
+    await session.commit()
+    static_file = await service._create_static_file_config_record(
+        schemas.CreateStaticFileConfig(virtual_host_name="d.example.com", static_files_dir="/srv/www"), session
+    )
+    await session.commit()
+
+    changes = await service.read_config_changes(since, session)
+
+    assert changes.revision == await service.read_config_revision(session)
+    assert changes.hosts == [
+        schemas.HostChange(host_type=HostType.REVERSE_PROXY, config_id=updated.id, deleted=False, config=updated),
+        schemas.HostChange(host_type=HostType.REVERSE_PROXY, config_id=deleted.id, deleted=True, config=None),
+        schemas.HostChange(host_type=HostType.STATIC_FILE, config_id=static_file.id, deleted=False, config=static_file),
+    ]
+    assert (HostType.REVERSE_PROXY, unchanged.id) not in [(host.host_type, host.config_id) for host in changes.hosts]
+
+    assert (await service.read_config_changes(changes.revision, session)).hosts == []
+
+
+@pytest.mark.asyncio
+async def test_revisions_whose_changes_are_gone_are_rejected(session: AsyncSession) -> None:
+    await create(session, "a.example.com")
+    since = await service.read_config_revision(session)
+    await create(session, "b.example.com")
+    await create(session, "c.example.com")
+
+    with pytest.raises(ChangesNotAvailable):
+        await service.read_config_changes(await service.read_config_revision(session) + 1, session)
+
+    await history.compact_config_history(session, keep=1)
+    await session.commit()
+
+    with pytest.raises(ChangesNotAvailable):
+        await service.read_config_changes(since, session)
+
+    # changes of the revision of the newest change compacted away are all known to clients which synced at it
+    changes = await service.read_config_changes(await service.read_config_revision(session) - 2, session)
+    assert [host.config_id for host in changes.hosts] == [3]
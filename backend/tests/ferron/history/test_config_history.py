@@ -0,0 +1,156 @@
+from collections.abc import Generator
+from unittest import mock
+
+import pytest
+from sqlalchemy import select
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from src.config import settings
+from src.ferron import history, models, schemas, service
+from src.ferron.constants import ConfigChangeOperation, HostType
+from src.ferron.exceptions import HistoryEntryNotFound
+
+
+@pytest.fixture(autouse=True)
+def without_files() -> Generator[None, None, None]:
+    # rollbacks write config files and reload ferron, which tests don't have
+    with (
+        mock.patch.object(service, "update_host_configs_in_files", return_value=False),
+        mock.patch.object(service.reload_scheduler, "request_reload"),
+    ):
+        yield
+
+
+async def create(session: AsyncSession, name: str) -> schemas.UpdateReverseProxyConfig:
+    config = await service._create_reverse_proxy_config_record(
+        schemas.CreateReverseProxyConfig(virtual_host_name=name, backend_url="http://backend"), session
+    )
+    await session.commit()
+    return config
+
+
+async def update(session: AsyncSession, config: schemas.UpdateReverseProxyConfig, **fields: object) -> None:
+    await service._update_reverse_proxy_config_record(config.model_copy(update=fields), session)
+    await session.commit()
+
+
+async def latest_id(session: AsyncSession) -> int:
+    return await history.check_history_id(0, session)
+
+
+async def read_virtual_host_names(session: AsyncSession) -> dict[int, str]:
+    rows = (await session.exec(select(models.ReverseProxyConfig))).scalars().all()
+    return {row.id: row.virtual_host_name for row in rows}
+
+
+@pytest.mark.asyncio
+async def test_changes_are_recorded_newest_first(session: AsyncSession) -> None:
+    config = await create(session, "a.example.com")
+    await update(session, config, cache=True)
+    await update(session, config, cache=True)  # saving without changes is no change
+    await service._delete_reverse_proxy_config_record(config.id, session)
+    await session.commit()
+
+    page = await service.read_config_history(session, limit=2)
+    assert [change.operation for change in page.items] == [ConfigChangeOperation.DELETE, ConfigChangeOperation.UPDATE]
+    assert page.items[1].changes == {"cache": (False, True)}
+
+    page = await service.read_config_history(session, host_type=HostType.REVERSE_PROXY, cursor=page.next_cursor)
+    assert [change.operation for change in page.items] == [ConfigChangeOperation.CREATE]
+    assert page.items[0].changes["virtual_host_name"] == (None, "a.example.com")
+    assert page.next_cursor is None
+
+
+@pytest.mark.asyncio
+async def test_configs_are_rebuilt_between_snapshots(session: AsyncSession, monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(settings, "config_history_snapshot_interval", 3)
+    config = await create(session, "a.example.com")
+    for max_age in range(1, 8):
+        await update(session, config, cache_max_age=max_age)
+
+    rows = (await session.exec(select(models.ConfigHistory).order_by(models.ConfigHistory.id))).scalars().all()
+    # the create, then a whole config every 3 changes
+    assert [row.config is not None for row in rows] == [True, False, False, True, False, False, True, False]
+
+    for history_id in range(2, 8):
+        diff = await service.diff_config_history(history_id, history_id + 1, session)
+        assert diff.hosts[0].changes == {"cache_max_age": (history_id - 1, history_id)}
+
+    diff = await service.diff_config_history(8, 2, session)
+    assert diff.hosts[0].changes == {"cache_max_age": (7, 1)}
+
+
+@pytest.mark.asyncio
+async def test_compaction_keeps_configs_rebuildable(session: AsyncSession) -> None:
+    first = await create(session, "a.example.com")
+    second = await create(session, "b.example.com")
+    for max_age in range(1, 5):
+        await update(session, first, cache_max_age=max_age)
+    await update(session, second, cache=True)
+
+    assert await history.compact_config_history(session, keep=3) == 4
+    await session.commit()
+
+    with pytest.raises(HistoryEntryNotFound):
+        await history.check_history_id(3, session)
+
+    diff = await service.diff_config_history(4, 7, session)
+    changes = {host.config_id: host.changes for host in diff.hosts}
+    assert changes == {first.id: {"cache_max_age": (2, 4)}, second.id: {"cache": (False, True)}}
+
+
+@pytest.mark.asyncio
+async def test_compaction_is_triggered_when_ids_are_skipped(session: AsyncSession) -> None:
+    config = await create(session, "a.example.com")
+    with mock.patch.object(settings, "config_history_keep", 2), mock.patch.object(history, "COMPACT_EVERY", 2):
+        for max_age in range(1, 10):
+            # changes which are rolled back skip ids on PostgreSQL, all changes kept have odd ids there
+            await service._update_reverse_proxy_config_record(config.model_copy(update={"cache": True}), session)
+            await session.rollback()
+            await update(session, config, cache_max_age=max_age)
+
+    rows = (await session.exec(select(models.ConfigHistory.id))).scalars().all()
+    assert len(rows) <= 3
+    assert max(rows) - min(rows) < 3
+
+
+@pytest.mark.asyncio
+async def test_rollback_restores_hosts(session: AsyncSession) -> None:
+    # created first so that the host created after it is deleted doesn't get its id on SQLite
+    deleted = await create(session, "b.example.com")
+    kept = await create(session, "a.example.com")
+    history_id = await latest_id(session)
+
+    await update(session, kept, virtual_host_name="c.example.com")
+    await service._delete_reverse_proxy_config_record(deleted.id, session)
+    await session.commit()
+    await create(session, "b2.example.com")
+
+    result = await service.rollback_config_history(history_id, session)
+
+    assert [operation.op for operation in result.results] == [
+        "delete_reverse_proxy",
+        "update_reverse_proxy",
+        "create_reverse_proxy",
+    ]
+    virtual_host_names = await read_virtual_host_names(session)
+    assert virtual_host_names[kept.id] == "a.example.com"
+    # hosts deleted since are created again with new ids
+    assert sorted(virtual_host_names.values()) == ["a.example.com", "b.example.com"]
+
+    # the rollback is in the history too, and only the id of the recreated host differs from the state rolled back to
+    diff = await service.diff_config_history(history_id, await latest_id(session), session)
+    recreated_id = next(id for id, name in virtual_host_names.items() if name == "b.example.com")
+    assert {(host.operation, host.config_id) for host in diff.hosts} == {
+        (ConfigChangeOperation.DELETE, deleted.id),
+        (ConfigChangeOperation.CREATE, recreated_id),
+    }
+
+
+@pytest.mark.asyncio
+async def test_unknown_history_entries_are_rejected(session: AsyncSession) -> None:
+    await service.diff_config_history(0, 0, session)
+
+    await create(session, "a.example.com")
+    with pytest.raises(HistoryEntryNotFound):
+        await service.rollback_config_history(2, session)
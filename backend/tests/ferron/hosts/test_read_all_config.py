@@ -0,0 +1,38 @@
+import pytest
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from src.ferron import schemas, service
+
+
+@pytest.mark.asyncio
+async def test_rows_serialize_like_schemas(session: AsyncSession) -> None:
+    reverse_proxy = schemas.CreateReverseProxyConfig(
+        virtual_host_name="a.example.com", backend_url="http://backend:8080", preserve_host_header=True
+    )
+    load_balancer = schemas.CreateLoadBalancerConfig(
+        virtual_host_name="b.example.com", backend_urls=["http://lb-1", "https://lb-2:8443/app"], cache=True
+    )
+    static_file = schemas.CreateStaticFileConfig(virtual_host_name="c.example.com", static_files_dir="/srv/www")
+    await service._create_reverse_proxy_config_record(reverse_proxy, session)
+    await service._create_load_balancer_config_record(load_balancer, session)
+    await service._create_static_file_config_record(static_file, session)
+    await session.commit()
+
+    cases = [
+        (service.read_all_reverse_proxy_config, schemas.UpdateReverseProxyConfig, reverse_proxy),
+        (service.read_all_load_balancer_config, schemas.UpdateLoadBalancerConfig, load_balancer),
+        (service.read_all_static_file_config, schemas.UpdateStaticFileConfig, static_file),
+    ]
+    for read_all, schema, config in cases:
+        body = service.config_rows_response(await read_all(session)).body
+        expected = schema(**config.model_dump(), id=1).model_dump_json()
+
+        # byte for byte what serializing the schema gives
+        assert body == f"[{expected}]".encode()
+
+
+def test_response_keeps_headers_of_dependencies() -> None:
+    response = service.config_rows_response([], {"ETag": '"3"'})
+
+    assert response.headers["ETag"] == '"3"'
+    assert response.body == b"[]"
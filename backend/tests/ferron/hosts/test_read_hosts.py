@@ -0,0 +1,78 @@
+import pytest
+import pytest_asyncio
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from src.ferron import models, service
+from src.ferron.constants import HostSortKey, HostType, SortOrder
+from src.ferron.exceptions import InvalidCursor
+
+
+@pytest_asyncio.fixture(autouse=True)
+async def hosts(session: AsyncSession) -> None:
+    for i in range(1, 10):
+        virtual_host = models.VirtualHost(virtual_host_name=f"host-{i}.example.com")
+        match i % 3:
+            case 0:
+                virtual_host.reverse_proxy_config = models.ReverseProxyConfig(backend_url=f"http://backend-{i}:8080")
+            case 1:
+                virtual_host.load_balancer_config = models.LoadBalancerConfig(
+                    backend_urls_relationship=[
+                        models.LoadBalancerBackendURL(virtual_host=virtual_host, backend_url=f"http://lb-{i}-{j}")
+                        for j in range(2)
+                    ]
+                )
+            case 2:
+                virtual_host.static_file_config = models.StaticFileConfig(static_files_dir=f"/srv/www/{i}")
+        session.add(virtual_host)
+    await session.commit()
+
+
+@pytest.mark.asyncio
+async def test_pages_cover_every_host_once(session: AsyncSession) -> None:
+    names = []
+    cursor = None
+    while True:
+        page = await service.read_hosts(session, limit=4, cursor=cursor)
+        assert page.total == 9
+        names += [host.virtual_host_name for host in page.items]
+        cursor = page.next_cursor
+        if cursor is None:
+            break
+
+    assert names == sorted(f"host-{i}.example.com" for i in range(1, 10))
+
+
+@pytest.mark.asyncio
+async def test_descending_order_by_creation(session: AsyncSession) -> None:
+    page = await service.read_hosts(session, sort=HostSortKey.CREATED, order=SortOrder.DESC, limit=2)
+    next_page = await service.read_hosts(
+        session, sort=HostSortKey.CREATED, order=SortOrder.DESC, limit=2, cursor=page.next_cursor
+    )
+
+    assert [host.virtual_host_name for host in page.items + next_page.items] == [
+        f"host-{i}.example.com" for i in range(9, 5, -1)
+    ]
+
+
+@pytest.mark.asyncio
+async def test_filters(session: AsyncSession) -> None:
+    load_balancers = await service.read_hosts(session, host_type=HostType.LOAD_BALANCER)
+    assert load_balancers.total == 3
+    assert load_balancers.items[0].backend_urls == ["http://lb-1-0", "http://lb-1-1"]
+
+    by_prefix = await service.read_hosts(session, name_prefix="host-2")
+    assert [(host.type, host.static_files_dir) for host in by_prefix.items] == [(HostType.STATIC_FILE, "/srv/www/2")]
+
+    by_backend = await service.read_hosts(session, backend="lb-4-")
+    assert [host.virtual_host_name for host in by_backend.items] == ["host-4.example.com"]
+    assert (await service.read_hosts(session, backend="backend-6")).items[0].type == HostType.REVERSE_PROXY
+
+
+@pytest.mark.asyncio
+async def test_cursor_of_another_sort_is_rejected(session: AsyncSession) -> None:
+    page = await service.read_hosts(session, limit=1)
+
+    with pytest.raises(InvalidCursor):
+        await service.read_hosts(session, sort=HostSortKey.CREATED, cursor=page.next_cursor)
+    with pytest.raises(InvalidCursor):
+        await service.read_hosts(session, cursor="not a cursor")
@@ -0,0 +1,97 @@
+import pytest
+import pytest_asyncio
+from sqlalchemy import delete, update
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from src.ferron import models, service
+from src.ferron.constants import HostType
+from src.ferron.exceptions import InvalidCursor
+
+
+@pytest_asyncio.fixture(autouse=True)
+async def hosts(session: AsyncSession) -> None:
+    session.add(
+        models.VirtualHost(
+            virtual_host_name="shop.example.com",
+            reverse_proxy_config=models.ReverseProxyConfig(backend_url="http://shop-backend:8080"),
+        )
+    )
+    virtual_host = models.VirtualHost(virtual_host_name="api.example.org")
+    virtual_host.load_balancer_config = models.LoadBalancerConfig(
+        backend_urls_relationship=[
+            models.LoadBalancerBackendURL(virtual_host=virtual_host, backend_url=f"http://api-{i}:9000")
+            for i in range(2)
+        ]
+    )
+    session.add(virtual_host)
+    session.add(
+        models.VirtualHost(
+            virtual_host_name="docs.example.com",
+            static_file_config=models.StaticFileConfig(static_files_dir="/srv/shop-docs"),
+        )
+    )
+    await session.commit()
+
+
+@pytest.mark.asyncio
+async def test_matches_in_names_rank_first(session: AsyncSession) -> None:
+    page = await service.search_hosts("shop", session)
+
+    assert page.total == 2
+    assert [host.virtual_host_name for host in page.items] == ["shop.example.com", "docs.example.com"]
+    assert page.items[0].backend_urls == ["http://shop-backend:8080"]
+
+
+@pytest.mark.asyncio
+async def test_search_is_kept_in_sync(session: AsyncSession) -> None:
+    assert (await service.search_hosts("API-1", session)).items[0].type == HostType.LOAD_BALANCER
+
+    await session.exec(delete(models.LoadBalancerBackendURL).where(models.LoadBalancerBackendURL.id == 2))
+    await session.exec(
+        update(models.VirtualHost)
+        .where(models.VirtualHost.virtual_host_name == "docs.example.com")
+        .values(virtual_host_name="manual.example.com")
+    )
+    await session.exec(delete(models.VirtualHost).where(models.VirtualHost.virtual_host_name == "shop.example.com"))
+    await session.commit()
+
+    assert (await service.search_hosts("api-1", session)).total == 0
+    assert (await service.search_hosts("api-0", session)).total == 1
+    assert [host.virtual_host_name for host in (await service.search_hosts("example", session)).items] == [
+        "api.example.org",
+        "manual.example.com",
+    ]
+
+
+@pytest.mark.asyncio
+async def test_pages(session: AsyncSession) -> None:
+    page = await service.search_hosts("example", session, limit=2)
+    next_page = await service.search_hosts("example", session, limit=2, cursor=page.next_cursor)
+
+    assert len({host.virtual_host_name for host in page.items + next_page.items}) == 3
+    assert next_page.next_cursor is None
+
+    with pytest.raises(InvalidCursor):
+        await service.search_hosts("shop", session, cursor=page.next_cursor)
+
+
+@pytest.mark.asyncio
+async def test_pages_are_stable_while_hosts_change(session: AsyncSession) -> None:
+    page = await service.search_hosts("shop", session, limit=1)
+
+    # hosts added between pages change the statistics of the index, but not the order of hosts already matched
+    for i in range(5):
+        session.add(
+            models.VirtualHost(
+                virtual_host_name=f"shop-{i}.example.net",
+                static_file_config=models.StaticFileConfig(static_files_dir=f"/srv/{i}"),
+            )
+        )
+    await session.commit()
+    next_page = await service.search_hosts("shop", session, limit=10, cursor=page.next_cursor)
+
+    assert [host.virtual_host_name for host in page.items] == ["shop.example.com"]
+    assert [host.virtual_host_name for host in next_page.items] == [
+        *(f"shop-{i}.example.net" for i in range(5)),
+        "docs.example.com",
+    ]
@@ -0,0 +1,75 @@
+import os
+from pathlib import Path
+
+import pytest
+
+from src.ferron.constants import HostType
+from src.ferron.layout import (
+    MonolithicLayout,
+    PerHostLayout,
+    ShardedLayout,
+    migrate_layout,
+    parse_shared_file,
+    render_shared_file,
+)
+from src.ferron.registry import IncludeRegistry
+
+
+def test_shared_file_round_trip() -> None:
+    sections = {
+        (HostType.STATIC_FILE, 3): '"c.example.com" {\n}\n',
+        (HostType.REVERSE_PROXY, 1): '"a.example.com" {\n    proxy "http://a/"\n}',
+    }
+
+    text = render_shared_file(sections)
+
+    assert parse_shared_file(text) == {
+        (HostType.REVERSE_PROXY, 1): '"a.example.com" {\n    proxy "http://a/"\n}\n',
+        (HostType.STATIC_FILE, 3): '"c.example.com" {\n}\n',
+    }
+    # parsed sections render to the same file, so an unchanged host doesn't rewrite its file
+    assert render_shared_file(parse_shared_file(text)) == text
+
+
+def test_sharded_layout_is_stable() -> None:
+    layout = ShardedLayout(8)
+    file_names = {layout.file_name((HostType.REVERSE_PROXY, host_id)) for host_id in range(1000)}
+
+    assert file_names == {f"shard_{shard}.kdl" for shard in range(8)}
+    assert layout.file_name((HostType.REVERSE_PROXY, 42)) == ShardedLayout(8).file_name((HostType.REVERSE_PROXY, 42))
+
+
+def test_layouts_own_their_files() -> None:
+    assert PerHostLayout().owns("12_load_balancer.kdl")
+    assert not PerHostLayout().owns("global.kdl")
+    assert ShardedLayout(4).owns("shard_7.kdl")
+    assert MonolithicLayout().owns("hosts.kdl")
+    assert not MonolithicLayout().owns("main.kdl")
+
+
+@pytest.mark.asyncio
+async def test_migrate_between_layouts(tmp_path: Path) -> None:
+    (tmp_path / "1_reverse_proxy.kdl").write_text("a\n")
+    (tmp_path / "2_static_file.kdl").write_text("b\n")
+    (tmp_path / "global.kdl").write_text("g\n")
+    main_config = tmp_path / "main.kdl"
+    main_config.write_text(
+        f'include "{tmp_path / "global.kdl"}"\n'
+        f'include "{tmp_path / "1_reverse_proxy.kdl"}"\n'
+        f'include "{tmp_path / "2_static_file.kdl"}"\n'
+    )
+
+    registry = IncludeRegistry(str(main_config))
+    await registry.load()
+
+    assert await migrate_layout(MonolithicLayout(), str(tmp_path), registry) == 2
+    assert sorted(os.listdir(tmp_path)) == ["global.kdl", "hosts.kdl", "main.kdl"]
+    assert main_config.read_text() == f'include "{tmp_path / "global.kdl"}"\ninclude "{tmp_path / "hosts.kdl"}"\n'
+
+    # nothing to move once every host is where the layout expects it
+    assert await migrate_layout(MonolithicLayout(), str(tmp_path), registry) == 0
+
+    assert await migrate_layout(PerHostLayout(), str(tmp_path), registry) == 2
+    assert (tmp_path / "1_reverse_proxy.kdl").read_text() == "a\n"
+    assert (tmp_path / "2_static_file.kdl").read_text() == "b\n"
+    assert not (tmp_path / "hosts.kdl").exists()
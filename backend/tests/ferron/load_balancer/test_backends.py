@@ -0,0 +1,136 @@
+from unittest import mock
+
+import pytest
+import pytest_asyncio
+from pydantic import HttpUrl
+from sqlalchemy import select
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from src.ferron import models, schemas, service
+from src.ferron.constants import LOAD_BALANCER_BACKEND_POSITION_STEP
+from src.ferron.exceptions import ConfigNotFound, LoadBalancerBackendAlreadyExists
+
+
+@pytest_asyncio.fixture(autouse=True)
+async def load_balancer(session: AsyncSession) -> None:
+    await service._create_load_balancer_config_record(
+        schemas.CreateLoadBalancerConfig(
+            virtual_host_name="example.com", backend_urls=["http://a", "http://b", "http://c"]
+        ),
+        session,
+    )
+    await session.commit()
+
+
+async def read_backends(session: AsyncSession) -> dict[str, tuple[int, int]]:
+    """
+    id and position of every backend by url, in order
+    """
+    statement = select(models.LoadBalancerBackendURL).order_by(
+        models.LoadBalancerBackendURL.position, models.LoadBalancerBackendURL.id
+    )
+    return {
+        str(backend.backend_url): (backend.id, backend.position)
+        for backend in (await session.exec(statement)).scalars()
+    }
+
+
+async def update(session: AsyncSession, backend_urls: list[str]) -> schemas.UpdateLoadBalancerConfig:
+    config = await service._update_load_balancer_config_record(
+        schemas.UpdateLoadBalancerConfig(id=1, virtual_host_name="example.com", backend_urls=backend_urls), session
+    )
+    await session.commit()
+    return config
+
+
+@pytest.mark.asyncio
+async def test_update_changes_only_changed_backends(session: AsyncSession) -> None:
+    before = await read_backends(session)
+
+    config = await update(session, ["http://a", "http://b", "http://d"])
+    after = await read_backends(session)
+
+    assert [str(url) for url in config.backend_urls] == ["http://a/", "http://b/", "http://d/"]
+    assert after["http://a/"] == before["http://a/"]
+    assert after["http://b/"] == before["http://b/"]
+    assert "http://c/" not in after
+
+
+@pytest.mark.asyncio
+async def test_reordered_backends_keep_their_order(session: AsyncSession) -> None:
+    before = await read_backends(session)
+
+    config = await update(session, ["http://c", "http://a", "http://b"])
+    after = await read_backends(session)
+
+    assert [str(url) for url in config.backend_urls] == ["http://c/", "http://a/", "http://b/"]
+    assert list(after) == ["http://c/", "http://a/", "http://b/"]
+    # only the moved backend changes, and keeps its row
+    assert after["http://a/"] == before["http://a/"]
+    assert after["http://b/"] == before["http://b/"]
+    assert after["http://c/"][0] == before["http://c/"][0]
+
+    # the same order again is no change
+    await update(session, ["http://c", "http://a", "http://b"])
+    assert await read_backends(session) == after
+
+
+@pytest.mark.asyncio
+async def test_removing_first_backend_keeps_the_others(session: AsyncSession) -> None:
+    before = await read_backends(session)
+
+    with (
+        mock.patch.object(service, "write_load_balancer_config_to_file", mock.AsyncMock(return_value=True)),
+        mock.patch.object(service.reload_scheduler, "request_reload", mock.AsyncMock()),
+    ):
+        await service.remove_load_balancer_backend(1, HttpUrl("http://a"), session)
+
+    assert await read_backends(session) == {url: before[url] for url in ["http://b/", "http://c/"]}
+
+
+@pytest.mark.asyncio
+async def test_backends_are_inserted_between_others(session: AsyncSession) -> None:
+    before = await read_backends(session)
+
+    config = await update(session, ["http://a", "http://d", "http://b", "http://c"])
+    after = await read_backends(session)
+
+    assert [str(url) for url in config.backend_urls] == ["http://a/", "http://d/", "http://b/", "http://c/"]
+    assert {url: after[url] for url in before} == before
+
+    # more backends than there is room for between two positions space every backend out again
+    urls = ["http://a", *(f"http://x{i}" for i in range(LOAD_BALANCER_BACKEND_POSITION_STEP)), "http://b", "http://c"]
+    config = await update(session, urls)
+    assert [str(url) for url in config.backend_urls] == [str(HttpUrl(url)) for url in urls]
+    assert [backend_id for backend_id, _position in (await read_backends(session)).values()][-2:] == [
+        before["http://b/"][0],
+        before["http://c/"][0],
+    ]
+
+
+@pytest.mark.asyncio
+async def test_duplicate_backends_are_kept(session: AsyncSession) -> None:
+    config = await update(session, ["http://a", "http://a", "http://b"])
+
+    assert [str(url) for url in config.backend_urls] == ["http://a/", "http://a/", "http://b/"]
+
+
+@pytest.mark.asyncio
+async def test_add_and_remove_backend(session: AsyncSession) -> None:
+    with (
+        mock.patch.object(service, "write_load_balancer_config_to_file", mock.AsyncMock(return_value=True)),
+        mock.patch.object(service.reload_scheduler, "request_reload", mock.AsyncMock()),
+    ):
+        config = await service.add_load_balancer_backend(
+            1, schemas.LoadBalancerBackend(backend_url="http://d"), session
+        )
+        assert [str(url) for url in config.backend_urls] == ["http://a/", "http://b/", "http://c/", "http://d/"]
+
+        with pytest.raises(LoadBalancerBackendAlreadyExists):
+            await service.add_load_balancer_backend(1, schemas.LoadBalancerBackend(backend_url="http://a/"), session)
+
+        config = await service.remove_load_balancer_backend(1, HttpUrl("http://b"), session)
+        assert [str(url) for url in config.backend_urls] == ["http://a/", "http://c/", "http://d/"]
+
+        with pytest.raises(ConfigNotFound):
+            await service.remove_load_balancer_backend(1, HttpUrl("http://b"), session)
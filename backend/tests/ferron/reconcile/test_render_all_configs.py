@@ -0,0 +1,70 @@
+import pytest
+from sqlalchemy import select, update
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from src.ferron import models, schemas, service
+from src.ferron.constants import HostType
+from src.ferron.files import hash_config
+from src.ferron.reconcile import render_all_configs
+from src.ferron.utils import TEMPLATE_VERSION, render_host_config
+
+
+@pytest.mark.asyncio
+async def test_stored_configs_are_read_and_stale_ones_rendered_again(session: AsyncSession) -> None:
+    reverse_proxy = await service._create_reverse_proxy_config_record(
+        schemas.CreateReverseProxyConfig(virtual_host_name="a.example.com", backend_url="http://backend"), session
+    )
+    load_balancer = await service._create_load_balancer_config_record(
+        schemas.CreateLoadBalancerConfig(virtual_host_name="b.example.com", backend_urls=["http://a", "http://b"]),
+        session,
+    )
+    await session.commit()
+    expected = {
+        (HostType.REVERSE_PROXY, reverse_proxy.id): render_host_config(HostType.REVERSE_PROXY, reverse_proxy),
+        (HostType.LOAD_BALANCER, load_balancer.id): render_host_config(HostType.LOAD_BALANCER, load_balancer),
+    }
+
+    # configs are rendered and stored when hosts are written
+    rendered = await render_all_configs(session)
+    assert rendered.hosts == expected
+    assert rendered.hashes == {key: hash_config(text) for key, text in expected.items()}
+    assert rendered.rendered_count == 0
+
+    # as if the templates had changed since the load balancer was written
+    await session.exec(update(models.LoadBalancerConfig).values(rendered_kdl="stale", template_version="old"))
+    await session.commit()
+
+    rendered = await render_all_configs(session)
+    assert rendered.hosts == expected
+    assert rendered.rendered_count == 1
+
+    row = (await session.exec(select(models.LoadBalancerConfig))).scalar_one()
+    await session.refresh(row)
+    assert (row.rendered_kdl, row.template_version) == (
+        expected[(HostType.LOAD_BALANCER, load_balancer.id)],
+        TEMPLATE_VERSION,
+    )
+    assert (await render_all_configs(session)).rendered_count == 0
+
+
+@pytest.mark.asyncio
+async def test_configs_rendered_without_storing_leave_the_database_unchanged(session: AsyncSession) -> None:
+    config = await service._create_reverse_proxy_config_record(
+        schemas.CreateReverseProxyConfig(virtual_host_name="a.example.com", backend_url="http://backend"), session
+    )
+    await session.commit()
+    await session.exec(update(models.ReverseProxyConfig).values(rendered_kdl="stale", template_version="old"))
+    await session.commit()
+    revision = await service.read_config_revision(session)
+
+    rendered = await render_all_configs(session, store=False)
+    assert rendered.hosts == {
+        (HostType.REVERSE_PROXY, config.id): render_host_config(HostType.REVERSE_PROXY, config),
+    }
+    assert rendered.rendered_count == 1
+
+    await session.rollback()
+    row = (await session.exec(select(models.ReverseProxyConfig))).scalar_one()
+    await session.refresh(row)
+    assert (row.rendered_kdl, row.template_version) == ("stale", "old")
+    assert await service.read_config_revision(session) == revision
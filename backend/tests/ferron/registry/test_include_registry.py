@@ -0,0 +1,90 @@
+from pathlib import Path
+
+import pytest
+
+from src.ferron.registry import IncludeRegistry
+
+
+@pytest.mark.asyncio
+async def test_load_reads_existing_includes(tmp_path: Path) -> None:
+    main_config = tmp_path / "main.kdl"
+    main_config.write_text('include "/etc/a.kdl"\n\ninclude "/etc/b.kdl"\n')
+
+    registry = IncludeRegistry(str(main_config))
+    await registry.load()
+
+    assert "/etc/a.kdl" in registry
+    assert "/etc/b.kdl" in registry
+    assert "/etc/c.kdl" not in registry
+    assert registry.paths() == ["/etc/a.kdl", "/etc/b.kdl"]
+
+
+@pytest.mark.asyncio
+async def test_load_missing_file(tmp_path: Path) -> None:
+    registry = IncludeRegistry(str(tmp_path / "main.kdl"))
+    await registry.load()
+
+    assert len(registry) == 0
+
+
+@pytest.mark.asyncio
+async def test_changes_are_persisted_in_one_write(tmp_path: Path) -> None:
+    main_config = tmp_path / "main.kdl"
+    main_config.write_text('include "/etc/a.kdl"\n')
+
+    registry = IncludeRegistry(str(main_config))
+    await registry.load()
+
+    assert registry.add("/etc/b.kdl") is True
+    assert registry.add("/etc/c.kdl") is True
+    assert registry.add("/etc/a.kdl") is False
+    assert registry.remove("/etc/a.kdl") is True
+    assert registry.remove("/etc/a.kdl") is False
+
+    # nothing is written until persisted
+    assert main_config.read_text() == 'include "/etc/a.kdl"\n'
+
+    assert await registry.persist() is True
+    assert main_config.read_text() == 'include "/etc/b.kdl"\ninclude "/etc/c.kdl"\n'
+
+    assert await registry.persist() is False
+
+
+@pytest.mark.asyncio
+async def test_other_lines_are_kept(tmp_path: Path) -> None:
+    main_config = tmp_path / "main.kdl"
+    main_config.write_text('// managed by ferron proxy manager\ninclude "/etc/a.kdl"\n')
+
+    registry = IncludeRegistry(str(main_config))
+    await registry.load()
+    registry.add("/etc/b.kdl")
+    await registry.persist()
+
+    assert main_config.read_text() == (
+        '// managed by ferron proxy manager\ninclude "/etc/a.kdl"\ninclude "/etc/b.kdl"\n'
+    )
+
+
+@pytest.mark.asyncio
+async def test_failed_transaction_is_undone(tmp_path: Path) -> None:
+    main_config = tmp_path / "main.kdl"
+    main_config.write_text('include "/etc/a.kdl"\n')
+
+    registry = IncludeRegistry(str(main_config))
+    await registry.load()
+
+    with pytest.raises(OSError), registry.transaction():
+        registry.add("/etc/b.kdl")
+        registry.remove("/etc/a.kdl")
+        raise OSError()
+
+    assert registry.paths() == ["/etc/a.kdl"]
+    assert registry.dirty is False
+
+    # persisted changes are kept
+    with pytest.raises(OSError), registry.transaction():
+        registry.add("/etc/b.kdl")
+        await registry.persist()
+        raise OSError()
+
+    assert registry.paths() == ["/etc/a.kdl", "/etc/b.kdl"]
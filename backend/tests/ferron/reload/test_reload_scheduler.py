@@ -0,0 +1,78 @@
+import asyncio
+
+import pytest
+
+from src.ferron.reload import ReloadScheduler
+
+
+class FakeReload:
+    def __init__(self, error: Exception | None = None) -> None:
+        self.calls = 0
+        self.error = error
+
+    async def __call__(self) -> None:
+        self.calls += 1
+        if self.error:
+            raise self.error
+
+
+@pytest.mark.asyncio
+async def test_requests_within_window_are_coalesced() -> None:
+    fake_reload = FakeReload()
+    scheduler = ReloadScheduler(window_seconds=0.05)
+    scheduler.start(fake_reload)
+
+    for _ in range(300):
+        await scheduler.request_reload()
+    await scheduler.request_reload(wait=True)
+
+    assert fake_reload.calls == 1
+    assert scheduler.requested_count == 301
+    assert scheduler.issued_count == 1
+
+
+@pytest.mark.asyncio
+async def test_request_after_reload_starts_new_window() -> None:
+    fake_reload = FakeReload()
+    scheduler = ReloadScheduler(window_seconds=0.01)
+    scheduler.start(fake_reload)
+
+    await scheduler.request_reload(wait=True)
+    await scheduler.request_reload(wait=True)
+
+    assert fake_reload.calls == 2
+    assert scheduler.stats().issued == 2
+
+
+@pytest.mark.asyncio
+async def test_waiting_callers_get_reload_error() -> None:
+    fake_reload = FakeReload(error=RuntimeError("container not found"))
+    scheduler = ReloadScheduler(window_seconds=0.01)
+    scheduler.start(fake_reload)
+
+    await scheduler.request_reload()
+    with pytest.raises(RuntimeError, match="container not found"):
+        await scheduler.request_reload(wait=True)
+
+    assert scheduler.issued_count == 0
+    assert scheduler.failed_count == 1
+
+
+@pytest.mark.asyncio
+async def test_stop_issues_pending_reload() -> None:
+    fake_reload = FakeReload()
+    scheduler = ReloadScheduler(window_seconds=60)
+    scheduler.start(fake_reload)
+
+    await scheduler.request_reload()
+    await asyncio.wait_for(scheduler.stop(), timeout=1)
+
+    assert fake_reload.calls == 1
+
+
+@pytest.mark.asyncio
+async def test_request_before_start_raises() -> None:
+    scheduler = ReloadScheduler(window_seconds=0)
+
+    with pytest.raises(RuntimeError):
+        await scheduler.request_reload()
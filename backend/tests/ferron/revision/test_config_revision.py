@@ -0,0 +1,45 @@
+import pytest
+from sqlalchemy.ext.asyncio import create_async_engine
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from src.ferron import models, service
+from src.ferron.dependencies import etag_matches
+
+
+@pytest.mark.asyncio
+async def test_every_write_changes_revision(migrated_database_url: str) -> None:
+    engine = create_async_engine(migrated_database_url)
+    async with AsyncSession(engine, expire_on_commit=False) as session:
+        revisions = [await service.read_config_revision(session)]
+
+        virtual_host = models.VirtualHost(
+            virtual_host_name="example.com",
+            static_file_config=models.StaticFileConfig(static_files_dir="/srv/www"),
+        )
+        session.add(virtual_host)
+        await session.commit()
+        revisions.append(await service.read_config_revision(session))
+
+        virtual_host.static_file_config.use_spa = True
+        await session.commit()
+        revisions.append(await service.read_config_revision(session))
+
+        await session.delete(virtual_host)
+        await session.commit()
+        revisions.append(await service.read_config_revision(session))
+
+        # reads don't change it
+        await service.read_all_static_file_config(session)
+        revisions.append(await service.read_config_revision(session))
+
+    await engine.dispose()
+
+    assert revisions[0] < revisions[1] < revisions[2] < revisions[3] == revisions[4]
+
+
+def test_etag_matches() -> None:
+    assert etag_matches('"3"', '"3"')
+    assert etag_matches('"3"', 'W/"3"')
+    assert etag_matches('"3"', '"1", "3"')
+    assert etag_matches('"3"', "*")
+    assert not etag_matches('"3"', '"31"')
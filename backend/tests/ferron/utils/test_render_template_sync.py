@@ -0,0 +1,31 @@
+import pytest
+
+from src.ferron.constants import TemplateType
+from src.ferron.schemas import GlobalTemplateConfig, UpdateStaticFileConfig
+from src.ferron.utils import get_template, load_templates, render_template, render_template_sync
+
+
+@pytest.mark.asyncio
+async def test_sync_render_matches_async_render() -> None:
+    template_config = GlobalTemplateConfig(default_http_port=8080, is_h3_protocol_enabled=True)
+
+    assert render_template_sync(TemplateType.GLOBAL_CONFIG, template_config) == await render_template(
+        TemplateType.GLOBAL_CONFIG, template_config
+    )
+
+
+def test_templates_are_compiled_once() -> None:
+    load_templates()
+
+    for template_type in TemplateType:
+        assert get_template(template_type) is get_template(template_type)
+
+
+def test_static_file_render() -> None:
+    text = render_template_sync(
+        TemplateType.STATIC_FILE_CONFIG,
+        UpdateStaticFileConfig(id=1, virtual_host_name="example.com", static_files_dir="/srv/www"),
+    )
+
+    assert '"example.com" {' in text
+    assert 'root "/srv/www"' in text
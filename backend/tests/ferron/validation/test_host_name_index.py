@@ -0,0 +1,73 @@
+import pytest
+
+from src.ferron.constants import HostType, TemplateType
+from src.ferron.exceptions import InvalidConfig
+from src.ferron.schemas import GlobalTemplateConfig, UpdateStaticFileConfig
+from src.ferron.utils import render_template_sync
+from src.ferron.validation import HostNameIndex, parse_config
+
+
+def test_rendered_templates_are_valid() -> None:
+    global_config = render_template_sync(TemplateType.GLOBAL_CONFIG, GlobalTemplateConfig(is_h3_protocol_enabled=True))
+    static_file_config = render_template_sync(
+        TemplateType.STATIC_FILE_CONFIG,
+        UpdateStaticFileConfig(id=1, virtual_host_name="example.com", static_files_dir="/srv/www", use_spa=True),
+    )
+
+    assert parse_config("/etc/global.kdl", global_config) == ["*"]
+    assert parse_config((HostType.STATIC_FILE, 1), static_file_config) == ["example.com"]
+
+
+def test_quote_in_value_is_rejected() -> None:
+    text = render_template_sync(
+        TemplateType.STATIC_FILE_CONFIG,
+        UpdateStaticFileConfig(id=1, virtual_host_name="example.com", static_files_dir='/srv/"www'),
+    )
+
+    with pytest.raises(InvalidConfig):
+        parse_config((HostType.STATIC_FILE, 1), text)
+
+
+def test_host_defined_twice_in_one_config_is_rejected() -> None:
+    with pytest.raises(InvalidConfig):
+        parse_config((HostType.REVERSE_PROXY, 1), '"a.com" {\n}\n"a.com" {\n}\n')
+
+
+def test_host_defined_by_another_config_is_rejected() -> None:
+    index = HostNameIndex()
+    index.apply(index.check({(HostType.REVERSE_PROXY, 1): '"a.com" {\n}\n'}))
+
+    with pytest.raises(InvalidConfig):
+        index.check({(HostType.STATIC_FILE, 2): '"a.com" {\n}\n'})
+
+    # the same host may be written again, and its name is free once it is removed
+    index.check({(HostType.REVERSE_PROXY, 1): '"a.com" {\n}\n'})
+    index.apply(index.check({(HostType.REVERSE_PROXY, 1): None}))
+    index.check({(HostType.STATIC_FILE, 2): '"a.com" {\n}\n'})
+
+
+def test_hosts_can_swap_names() -> None:
+    index = HostNameIndex()
+    index.apply(
+        index.check({(HostType.REVERSE_PROXY, 1): '"a.com" {\n}\n', (HostType.REVERSE_PROXY, 2): '"b.com" {\n}\n'})
+    )
+
+    index.check({(HostType.REVERSE_PROXY, 1): '"b.com" {\n}\n', (HostType.REVERSE_PROXY, 2): '"a.com" {\n}\n'})
+
+
+def test_pending_changes_are_checked() -> None:
+    index = HostNameIndex()
+    pending = index.check({(HostType.REVERSE_PROXY, 1): '"a.com" {\n}\n'})
+
+    with pytest.raises(InvalidConfig):
+        index.check({(HostType.STATIC_FILE, 2): '"a.com" {\n}\n'}, pending)
+
+
+def test_check_all_replaces_index() -> None:
+    index = HostNameIndex()
+    index.apply(index.check({(HostType.REVERSE_PROXY, 1): '"a.com" {\n}\n'}))
+
+    index.apply(index.check_all({(HostType.STATIC_FILE, 2): '"a.com" {\n}\n'}))
+
+    with pytest.raises(InvalidConfig):
+        index.check({(HostType.REVERSE_PROXY, 1): '"a.com" {\n}\n'})
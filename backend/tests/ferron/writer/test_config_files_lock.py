@@ -0,0 +1,27 @@
+import pytest
+from sqlalchemy.ext.asyncio import create_async_engine
+
+from src.database import lock_config_files, unlock_config_files
+
+
+@pytest.mark.asyncio
+async def test_only_one_instance_locks_config_files(migrated_database_url: str) -> None:
+    engine = create_async_engine(migrated_database_url)
+    other_engine = create_async_engine(migrated_database_url)
+
+    lock = await lock_config_files(engine)
+    if engine.dialect.name == "sqlite":
+        assert lock is None
+    else:
+        assert lock is not None
+        with pytest.raises(RuntimeError):
+            await lock_config_files(other_engine)
+
+        # another instance can take it once it's released
+        await unlock_config_files(lock)
+        other_lock = await lock_config_files(other_engine)
+        assert other_lock is not None
+        await unlock_config_files(other_lock)
+
+    await engine.dispose()
+    await other_engine.dispose()
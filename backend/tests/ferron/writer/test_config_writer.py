@@ -0,0 +1,192 @@
+import asyncio
+import os
+from pathlib import Path
+
+import pytest
+
+from src.ferron.constants import HostType
+from src.ferron.exceptions import InvalidConfig
+from src.ferron.layout import ConfigLayout, MonolithicLayout, PerHostLayout
+from src.ferron.registry import IncludeRegistry
+from src.ferron.writer import ConfigWriter, RemoveHostConfig, WriteConfigFile, WriteHostConfig
+
+
+async def start_writer(tmp_path: Path, max_queue_size: int = 1000, layout: ConfigLayout | None = None) -> ConfigWriter:
+    registry = IncludeRegistry(str(tmp_path / "main.kdl"))
+    await registry.load()
+
+    writer = ConfigWriter(
+        registry,
+        layout or PerHostLayout(),
+        str(tmp_path),
+        max_queue_size=max_queue_size,
+        max_batch_size=100,
+    )
+    writer.start()
+    return writer
+
+
+@pytest.mark.asyncio
+async def test_concurrent_submissions_keep_every_include(tmp_path: Path) -> None:
+    writer = await start_writer(tmp_path, max_queue_size=5)
+
+    files = [tmp_path / f"{i}.kdl" for i in range(50)]
+    results = await asyncio.gather(*(writer.submit([WriteConfigFile(str(file), f"// {file}\n")]) for file in files))
+    await writer.stop()
+
+    assert all(results)
+    assert (tmp_path / "main.kdl").read_text() == "".join(f'include "{file}"\n' for file in files)
+    for file in files:
+        assert file.read_text() == f"// {file}\n"
+
+
+@pytest.mark.asyncio
+async def test_unchanged_write_is_reported(tmp_path: Path) -> None:
+    writer = await start_writer(tmp_path)
+    path = str(tmp_path / "a.kdl")
+
+    assert await writer.submit([WriteConfigFile(path, "a\n")]) is True
+    assert await writer.submit([WriteConfigFile(path, "a\n")]) is False
+    assert await writer.submit([WriteConfigFile(path, "b\n")]) is True
+
+    await writer.stop()
+
+
+@pytest.mark.asyncio
+async def test_remove_drops_include_and_file(tmp_path: Path) -> None:
+    writer = await start_writer(tmp_path)
+
+    await writer.submit([WriteHostConfig(HostType.REVERSE_PROXY, 1, "a\n")])
+    assert (tmp_path / "1_reverse_proxy.kdl").read_text() == "a\n"
+
+    assert await writer.submit([RemoveHostConfig(HostType.REVERSE_PROXY, 1)]) is True
+    assert await writer.submit([RemoveHostConfig(HostType.REVERSE_PROXY, 1)]) is False
+
+    await writer.stop()
+
+    assert not (tmp_path / "1_reverse_proxy.kdl").exists()
+    assert (tmp_path / "main.kdl").read_text() == ""
+
+
+@pytest.mark.asyncio
+async def test_latest_mutation_of_a_host_wins_within_a_batch(tmp_path: Path) -> None:
+    writer = await start_writer(tmp_path)
+
+    await asyncio.gather(
+        writer.submit([WriteHostConfig(HostType.STATIC_FILE, 1, "a\n")]),
+        writer.submit([RemoveHostConfig(HostType.STATIC_FILE, 1)]),
+        writer.submit([WriteHostConfig(HostType.STATIC_FILE, 1, "b\n")]),
+    )
+    await writer.stop()
+
+    assert (tmp_path / "1_static_file.kdl").read_text() == "b\n"
+    assert (tmp_path / "main.kdl").read_text() == f'include "{tmp_path / "1_static_file.kdl"}"\n'
+
+
+@pytest.mark.asyncio
+async def test_shared_file_keeps_other_hosts(tmp_path: Path) -> None:
+    writer = await start_writer(tmp_path, layout=MonolithicLayout())
+
+    await writer.submit([WriteHostConfig(HostType.REVERSE_PROXY, 1, "a")])
+    await writer.submit([WriteHostConfig(HostType.LOAD_BALANCER, 2, "b")])
+    assert await writer.submit([WriteHostConfig(HostType.REVERSE_PROXY, 1, "a")]) is False
+    await writer.submit([RemoveHostConfig(HostType.REVERSE_PROXY, 1)])
+
+    assert (tmp_path / "hosts.kdl").read_text() == "// ferron-proxy-manager host load_balancer 2\nb\n"
+
+    await writer.submit([RemoveHostConfig(HostType.LOAD_BALANCER, 2)])
+    await writer.stop()
+
+    assert not (tmp_path / "hosts.kdl").exists()
+    assert (tmp_path / "main.kdl").read_text() == ""
+
+
+@pytest.mark.asyncio
+async def test_submit_before_start_fails(tmp_path: Path) -> None:
+    writer = ConfigWriter(
+        IncludeRegistry(str(tmp_path / "main.kdl")),
+        PerHostLayout(),
+        str(tmp_path),
+        max_queue_size=1,
+        max_batch_size=1,
+    )
+
+    with pytest.raises(RuntimeError):
+        await writer.submit([WriteConfigFile(str(tmp_path / "a.kdl"), "a\n")])
+
+
+@pytest.mark.asyncio
+async def test_replace_host_configs(tmp_path: Path) -> None:
+    writer = await start_writer(tmp_path)
+
+    await writer.submit(
+        [
+            WriteHostConfig(HostType.REVERSE_PROXY, 1, "a\n"),
+            WriteHostConfig(HostType.REVERSE_PROXY, 2, "b\n"),
+        ]
+    )
+    # left behind by a failed delete
+    (tmp_path / "3_static_file.kdl").write_text("orphan\n")
+    (tmp_path / "2_reverse_proxy.kdl").write_text("edited by hand\n")
+
+    replaced = await writer.replace_host_configs(
+        {(HostType.REVERSE_PROXY, 1): "a\n", (HostType.REVERSE_PROXY, 2): "b\n"},
+        [WriteConfigFile(str(tmp_path / "global.kdl"), "g\n")],
+    )
+    await writer.stop()
+
+    assert replaced.written_count == 1
+    assert replaced.unchanged_count == 1
+    assert replaced.removed_count == 1
+    assert replaced.changed is True
+    assert (tmp_path / "2_reverse_proxy.kdl").read_text() == "b\n"
+    assert not (tmp_path / "3_static_file.kdl").exists()
+    assert (tmp_path / "main.kdl").read_text() == "".join(
+        f'include "{tmp_path / file_name}"\n'
+        for file_name in ("1_reverse_proxy.kdl", "2_reverse_proxy.kdl", "global.kdl")
+    )
+
+
+@pytest.mark.asyncio
+async def test_invalid_config_fails_only_its_submission(tmp_path: Path) -> None:
+    writer = await start_writer(tmp_path)
+    await writer.submit([WriteHostConfig(HostType.REVERSE_PROXY, 1, '"a.com" {\n}\n')])
+
+    results = await asyncio.gather(
+        writer.submit([WriteHostConfig(HostType.REVERSE_PROXY, 2, '"b.com" {\n    root "/srv/"www"\n}\n')]),
+        writer.submit([WriteHostConfig(HostType.STATIC_FILE, 3, '"a.com" {\n}\n')]),
+        writer.submit([WriteHostConfig(HostType.STATIC_FILE, 4, '"c.com" {\n}\n')]),
+        return_exceptions=True,
+    )
+    await writer.stop()
+
+    assert isinstance(results[0], InvalidConfig)
+    assert isinstance(results[1], InvalidConfig)
+    assert results[2] is True
+    assert sorted(os.listdir(tmp_path)) == ["1_reverse_proxy.kdl", "4_static_file.kdl", "main.kdl"]
+
+
+@pytest.mark.asyncio
+async def test_missing_include_target_doesnt_fail_other_submissions(tmp_path: Path) -> None:
+    writer = await start_writer(tmp_path)
+    await writer.submit([WriteHostConfig(HostType.REVERSE_PROXY, 1, "a\n")])
+    os.remove(tmp_path / "1_reverse_proxy.kdl")
+
+    assert await writer.submit([WriteHostConfig(HostType.REVERSE_PROXY, 2, "b\n")]) is True
+    assert await writer.submit([RemoveHostConfig(HostType.REVERSE_PROXY, 1)]) is True
+    await writer.stop()
+
+    assert (tmp_path / "main.kdl").read_text() == f'include "{tmp_path / "2_reverse_proxy.kdl"}"\n'
+
+
+@pytest.mark.asyncio
+async def test_failed_write_leaves_includes_unchanged(tmp_path: Path) -> None:
+    writer = await start_writer(tmp_path)
+    (tmp_path / "file").write_text("")
+
+    with pytest.raises(NotADirectoryError):
+        await writer.submit([WriteConfigFile(str(tmp_path / "file" / "a.kdl"), "a\n")])
+    assert await writer.submit([WriteHostConfig(HostType.REVERSE_PROXY, 1, "b\n")]) is True
+    await writer.stop()
+
+    assert (tmp_path / "main.kdl").read_text() == f'include "{tmp_path / "1_reverse_proxy.kdl"}"\n'